@@ -0,0 +1,432 @@
+from dataclasses import dataclass, asdict
+import electricity_lib as ec_lib
+import taipower_analyze_lib as analyze_lib
+import data_quality_lib
+from result_cache_lib import ResultCache, hash_file, make_cache_key
+
+_MISSING = object()
+
+
+@dataclass
+class AnalysisResult:
+    raw_contract_volume: dict
+    new_contract_volume: dict
+    contract_monthly_basic_price: dict
+    new_monthly_basic_price: dict
+    monthly_data: object
+    yearly_profit: object
+
+
+class PipelineStage:
+    """
+    分析流程中的一個階段，鍵值由上游鍵值與本階段讀取的參數決定，
+    命中快取時不會讀取或計算上游結果。結果已在記憶體中 (例如共享陣列) 的階段
+    設定 use_cache=False，只提供鍵值給下游，不讀寫快取
+    """
+
+    def __init__(self,
+                 cache: ResultCache,
+                 name,
+                 params: dict,
+                 inputs: list,
+                 compute,
+                 use_cache=True):
+        self.cache = cache if use_cache else None
+        self.name = name
+        self.inputs = inputs
+        self.compute = compute
+        self.key = make_cache_key(name, params,
+                                  [stage.key for stage in inputs])
+        self._value = _MISSING
+
+    def get(self):
+        if self._value is _MISSING:
+            hit = False
+            if self.cache is not None:
+                hit, value = self.cache.get(self.key)
+            if not hit:
+                value = self.compute(*[stage.get() for stage in self.inputs])
+                if self.cache is not None:
+                    self.cache.put(self.key, value)
+            self._value = value
+        return self._value
+
+
+def select_params(analysis_params: analyze_lib.AnalysisParameters,
+                  field_list):
+    """
+    取出某階段實際讀取的參數
+    :param analysis_params: 分析參數
+    :param field_list: 參數名稱列表
+    :return: 參數字典
+    """
+    params = asdict(analysis_params)
+    return {field: params[field] for field in field_list}
+
+
+def build_ingest_params(meter_data_path,
+                        meter_usage_cols: analyze_lib.MeterUsageColumns):
+    """
+    讀取電表資料階段的參數，共享陣列也以此計算識別碼
+    :param meter_data_path: 電表資料路徑
+    :param meter_usage_cols: 用電欄位名稱
+    :return: 參數字典
+    """
+    return {
+        "file_hash": hash_file(meter_data_path),
+        "drop_cols": analyze_lib.DEFAULT_DROP_COLS,
+        "sum_cols": analyze_lib.SUM_COLS,
+        "component_cols": analyze_lib.COLD_STORAGE_COLS + [analyze_lib.PV_COL],
+        "fill_policy": data_quality_lib.FILL_POLICY.value,
+        "duplicate_keep": data_quality_lib.DUPLICATE_KEEP,
+        "meter_usage_cols": asdict(meter_usage_cols),
+    }
+
+
+def hash_meter_data(meter_data):
+    """
+    計算已整理數據的內容雜湊值，沒有共享陣列識別碼時使用
+    :param meter_data: 已整理的數據
+    :return: sha256 雜湊字串
+    """
+    import hashlib
+    import pandas as pd
+
+    digest = hashlib.sha256(
+        pd.util.hash_pandas_object(meter_data, index=False).to_numpy())
+    digest.update(str(list(meter_data.columns)).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def group_monthly_data(priced_data, hourly_dr_data,
+                       meter_usage_cols: analyze_lib.MeterUsageColumns,
+                       elec_price_cols: analyze_lib.ElectricPriceColumns):
+    """
+    合併月度用電、電價與需量反應數據
+    :param priced_data: 含電價欄位的15分鐘數據
+    :param hourly_dr_data: 每小時的 DR 量&價格
+    :return: 月度數據
+    """
+    monthly_dr_price = analyze_lib.group_all_data_in_freq(
+        hourly_dr_data, "ME", meter_usage_cols, elec_price_cols)
+    monthly_data = analyze_lib.group_all_data_withour_dr_in_freq(
+        priced_data, "ME", meter_usage_cols, elec_price_cols)
+    monthly_data[meter_usage_cols.dr_volume_col] = monthly_dr_price[
+        meter_usage_cols.dr_volume_col]
+    monthly_data[elec_price_cols.demand_price_col] = monthly_dr_price[
+        elec_price_cols.demand_price_col]
+    return monthly_data
+
+
+def build_analysis_stages(
+    meter_data_path,
+    meter_contract_path,
+    analysis_params: analyze_lib.AnalysisParameters,
+    cache: ResultCache = None,
+    meter_usage_cols: analyze_lib.MeterUsageColumns = None,
+    elec_price_cols: analyze_lib.ElectricPriceColumns = None,
+    calendar_cols: analyze_lib.CalendarColumns = None,
+    yearly_profit_cols: analyze_lib.YearlyProfitColumns = None,
+    tariff_schedule=None,
+    meter_data=None,
+    calendar_features=None,
+    meter_data_key=None,
+):
+    """
+    建立分析流程的各個階段
+    :param meter_data_path: 電表資料路徑
+    :param meter_contract_path: 合約資料路徑
+    :param analysis_params: 分析參數
+    :param cache: 結果快取，None 表示不使用快取
+    :param tariff_schedule: tariff_lib.TariffSchedule，None 表示使用內建電價
+    :param meter_data: 已整理的數據 (例如 shared_data_lib 的共享陣列)，None 表示讀取電表資料
+    :param calendar_features: 已計算的日曆特徵，None 表示依參數計算
+    :param meter_data_key: meter_data 的識別碼 (shared_data_lib 發布時計算)，
+        None 表示以數據內容計算
+    :return: 階段名稱對應 PipelineStage 的字典
+    """
+    meter_usage_cols = meter_usage_cols or analyze_lib.MeterUsageColumns()
+    elec_price_cols = elec_price_cols or analyze_lib.ElectricPriceColumns()
+    calendar_cols = calendar_cols or analyze_lib.CalendarColumns()
+    yearly_profit_cols = yearly_profit_cols or analyze_lib.YearlyProfitColumns(
+    )
+    elec_params = analysis_params.build_electric_parameters()
+    elec_price_params = analysis_params.build_electric_price_parameters()
+    column_params = {
+        "meter_usage_cols": asdict(meter_usage_cols),
+        "elec_price_cols": asdict(elec_price_cols),
+        "calendar_cols": asdict(calendar_cols),
+    }
+
+    if meter_data is None:
+        ingest = PipelineStage(
+            cache,
+            "ingest",
+            {
+                **build_ingest_params(meter_data_path, meter_usage_cols),
+                **column_params,
+            },
+            [],
+            lambda: analyze_lib.load_meter_data(meter_data_path,
+                                                meter_usage_cols),
+        )
+    else:
+        # 數據已在記憶體中，不讀取電表檔案也不寫入快取，以識別碼作為鍵值
+        ingest = PipelineStage(
+            cache,
+            "shared_ingest",
+            {
+                "meter_data_key": meter_data_key
+                or hash_meter_data(meter_data),
+                **column_params,
+            },
+            [],
+            lambda: meter_data,
+            use_cache=False,
+        )
+    raw_contract = PipelineStage(
+        cache,
+        "raw_contract",
+        {"file_hash": hash_file(meter_contract_path)},
+        [],
+        lambda: analyze_lib.load_meter_contract(meter_contract_path),
+    )
+    if tariff_schedule is None:
+        calendar = PipelineStage(
+            cache,
+            "calendar",
+            {
+                "holidays": ec_lib.get_holiday_source(),
+                "raw_elec_type_dict": elec_params.raw_elec_type_dict,
+                "elec_type_dict": elec_params.elec_type_dict,
+                "release_hour_dict": elec_params.release_hour_dict,
+                "charge_hour_dict": elec_params.charge_hour_dict,
+            },
+            [ingest],
+            lambda data: (calendar_features
+                          if calendar_features is not None else analyze_lib.
+                          cal_calendar_features(data, meter_usage_cols,
+                                                calendar_cols, elec_params)),
+            use_cache=calendar_features is None,
+        )
+    else:
+        calendar = PipelineStage(
+            cache,
+            "tariff_calendar",
+            {
+                "holidays": ec_lib.get_holiday_source(),
+                "tariff": tariff_schedule.fingerprint(),
+                **select_params(analysis_params, [
+                    "raw_contract_type",
+                    "contract_type",
+                    "release_type",
+                    "charge_type",
+                ]),
+            },
+            [ingest],
+            lambda data: (calendar_features
+                          if calendar_features is not None else
+                          tariff_schedule.cal_calendar_features(
+                              data, meter_usage_cols, calendar_cols,
+                              analysis_params)),
+            use_cache=calendar_features is None,
+        )
+    dispatch = PipelineStage(
+        cache,
+        "dispatch",
+        select_params(analysis_params, [
+            "release_type",
+            "charge_type",
+            "device_number",
+            "battery_buffer",
+            "battery_dod",
+            "charge_loss",
+            "absorb_pv_surplus",
+        ]),
+        [ingest, calendar],
+        lambda data, features: analyze_lib.process_battery_usage_vectorized(
+            data, features, meter_usage_cols, calendar_cols, analysis_params)[
+                0],
+    )
+
+    def compute_pricing(data, features):
+        # 只新增電價欄位，不複製充放電結果
+        data = data.copy(deep=False)
+        if tariff_schedule is None:
+            price_columns = analyze_lib.cal_elec_price_vectorized(
+                data, features, meter_usage_cols, calendar_cols,
+                elec_price_params)
+        else:
+            price_columns = tariff_schedule.cal_elec_price(
+                data, features, meter_usage_cols, calendar_cols,
+                analysis_params)
+        (
+            data[elec_price_cols.elec_charge_price_col],
+            data[elec_price_cols.elec_charge_price_with_battery_col],
+        ) = price_columns
+        return data
+
+    if tariff_schedule is None:
+        pricing_params = {
+            "raw_charge_price_dict": elec_price_params.raw_charge_price_dict,
+            "new_charge_price_dict": elec_price_params.new_charge_price_dict,
+        }
+    else:
+        pricing_params = {
+            "tariff":
+            tariff_schedule.fingerprint(),
+            **select_params(analysis_params,
+                            ["raw_contract_type", "contract_type"]),
+        }
+    pricing = PipelineStage(
+        cache,
+        "pricing",
+        pricing_params,
+        [dispatch, calendar],
+        compute_pricing,
+    )
+    dr = PipelineStage(
+        cache,
+        "dr",
+        select_params(analysis_params, [
+            "device_number",
+            "battery_buffer",
+            "dr_avg_price",
+            "dr_reaction_freq",
+            "dr_energy_price",
+        ]),
+        [pricing],
+        lambda data: analyze_lib.cal_hourly_dr_price_vectorized(
+            data, meter_usage_cols, elec_price_cols, analysis_params),
+    )
+    monthly = PipelineStage(
+        cache,
+        "monthly",
+        {},
+        [pricing, dr],
+        lambda data, hourly_dr_data: group_monthly_data(
+            data, hourly_dr_data, meter_usage_cols, elec_price_cols),
+    )
+
+    def cal_monthly_basic_price(data, contract_volume, contract_type,
+                                contract_price_dict):
+        if tariff_schedule is None:
+            return analyze_lib.cal_monthly_basic_price(
+                contract_volume, contract_price_dict)
+        # 依各月份適用的電價表版本計算基本電費
+        return tariff_schedule.cal_monthly_basic_price(
+            contract_volume, contract_type, data[meter_usage_cols.time_col])
+
+    def compute_contract(data, features, raw_contract_volume):
+        new_contract_volume = analyze_lib.cal_new_contract_volume_vectorized(
+            data, features, meter_usage_cols, calendar_cols, analysis_params,
+            raw_contract_volume)
+        return {
+            "new_contract_volume":
+            new_contract_volume,
+            "contract_monthly_basic_price":
+            cal_monthly_basic_price(data, raw_contract_volume,
+                                    analysis_params.raw_contract_type,
+                                    elec_price_params.raw_contract_price_dict),
+            "new_monthly_basic_price":
+            cal_monthly_basic_price(data, new_contract_volume,
+                                    analysis_params.contract_type,
+                                    elec_price_params.contract_price_dict),
+        }
+
+    if tariff_schedule is None:
+        contract_price_params = {
+            "raw_contract_price_dict":
+            elec_price_params.raw_contract_price_dict,
+            "contract_price_dict": elec_price_params.contract_price_dict,
+        }
+    else:
+        contract_price_params = {
+            "tariff": tariff_schedule.fingerprint(),
+            **select_params(analysis_params, ["raw_contract_type"]),
+        }
+    contract = PipelineStage(
+        cache,
+        "contract",
+        {
+            **select_params(analysis_params,
+                            ["contract_type", "new_contract_buffer"]),
+            **contract_price_params,
+        },
+        [dispatch, calendar, raw_contract],
+        compute_contract,
+    )
+    yearly_profit = PipelineStage(
+        cache,
+        "yearly_profit",
+        select_params(analysis_params, [
+            "device_number",
+            "battery_buffer",
+            "battery_decay",
+            "kwh_price",
+        ]),
+        [monthly, contract],
+        lambda monthly_data, contract_result: analyze_lib.
+        cal_year_profit_vectorized(
+            monthly_data,
+            contract_result["contract_monthly_basic_price"],
+            contract_result["new_monthly_basic_price"],
+            elec_price_cols,
+            yearly_profit_cols,
+            analysis_params,
+        ),
+    )
+    return {
+        "ingest": ingest,
+        "raw_contract": raw_contract,
+        "calendar": calendar,
+        "dispatch": dispatch,
+        "pricing": pricing,
+        "dr": dr,
+        "monthly": monthly,
+        "contract": contract,
+        "yearly_profit": yearly_profit,
+    }
+
+
+def run_analysis(
+    meter_data_path,
+    meter_contract_path,
+    analysis_params: analyze_lib.AnalysisParameters = None,
+    cache: ResultCache = None,
+    tariff_schedule=None,
+    meter_data=None,
+    calendar_features=None,
+    meter_data_key=None,
+):
+    """
+    執行完整分析流程，只重新計算參數或輸入有變動的階段
+    :param meter_data_path: 電表資料路徑
+    :param meter_contract_path: 合約資料路徑
+    :param analysis_params: 分析參數
+    :param cache: 結果快取，None 表示不使用快取
+    :param tariff_schedule: tariff_lib.TariffSchedule，None 表示使用內建電價
+    :param meter_data: 已整理的數據，None 表示讀取電表資料
+    :param calendar_features: 已計算的日曆特徵，None 表示依參數計算
+    :param meter_data_key: meter_data 的識別碼，None 表示以數據內容計算
+    :return: 分析結果
+    """
+    analysis_params = analysis_params or analyze_lib.AnalysisParameters()
+    stages = build_analysis_stages(meter_data_path,
+                                   meter_contract_path,
+                                   analysis_params,
+                                   cache,
+                                   tariff_schedule=tariff_schedule,
+                                   meter_data=meter_data,
+                                   calendar_features=calendar_features,
+                                   meter_data_key=meter_data_key)
+    contract_result = stages["contract"].get()
+    return AnalysisResult(
+        raw_contract_volume=stages["raw_contract"].get(),
+        new_contract_volume=contract_result["new_contract_volume"],
+        contract_monthly_basic_price=contract_result[
+            "contract_monthly_basic_price"],
+        new_monthly_basic_price=contract_result["new_monthly_basic_price"],
+        monthly_data=stages["monthly"].get(),
+        yearly_profit=stages["yearly_profit"].get(),
+    )
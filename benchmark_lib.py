@@ -0,0 +1,88 @@
+import json
+import subprocess
+import sys
+
+# 模組載入時間上限 (毫秒)
+IMPORT_TIME_BUDGET_MS = 100
+# 每個模組以新的直譯器重複量測的次數
+IMPORT_TIME_REPEAT = 5
+# 需要快速載入的模組
+LAZY_IMPORT_MODULES = ("electricity_lib", "taipower_analyze_lib")
+# 載入後不應出現的模組 (代表有網路或大型套件的副作用)
+HEAVY_MODULES = ("requests", "pandas", "numpy", "matplotlib")
+
+_IMPORT_TIME_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module_name}
+seconds = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": seconds,
+    "loaded": [name for name in {heavy_modules!r} if name in sys.modules],
+}}))
+"""
+
+
+def measure_import_time(module_name,
+                        repeat=IMPORT_TIME_REPEAT,
+                        heavy_modules=HEAVY_MODULES):
+    """
+    以新的直譯器量測模組載入時間，取多次量測的最小值
+    :param module_name: 模組名稱
+    :param repeat: 量測次數
+    :param heavy_modules: 檢查是否被一併載入的模組
+    :return: (載入毫秒數, 被一併載入的模組列表)
+    """
+    script = _IMPORT_TIME_SCRIPT.format(module_name=module_name,
+                                        heavy_modules=tuple(heavy_modules))
+    seconds_list, loaded = [], []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", script],
+                                capture_output=True,
+                                text=True,
+                                check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        seconds_list.append(result["seconds"])
+        loaded = result["loaded"]
+    return min(seconds_list) * 1000, loaded
+
+
+def check_import_budget(module_names=LAZY_IMPORT_MODULES,
+                        budget_ms=IMPORT_TIME_BUDGET_MS,
+                        repeat=IMPORT_TIME_REPEAT):
+    """
+    檢查模組載入時間是否在預算內，且沒有載入網路或大型套件
+    :param module_names: 模組名稱列表
+    :param budget_ms: 載入時間上限 (毫秒)
+    :param repeat: 量測次數
+    :return: [(模組名稱, 載入毫秒數, 被一併載入的模組列表, 是否通過)]
+    """
+    result = []
+    for module_name in module_names:
+        import_ms, loaded = measure_import_time(module_name, repeat)
+        result.append(
+            (module_name, import_ms, loaded, import_ms <= budget_ms
+             and not loaded))
+    return result
+
+
+def assert_import_budget(module_names=LAZY_IMPORT_MODULES,
+                         budget_ms=IMPORT_TIME_BUDGET_MS,
+                         repeat=IMPORT_TIME_REPEAT):
+    """
+    模組載入超過預算或有副作用時拋出 RuntimeError
+    """
+    failed = [
+        f"{module_name}: {import_ms:.1f} ms, 載入 {loaded}"
+        for module_name, import_ms, loaded, passed in check_import_budget(
+            module_names, budget_ms, repeat) if not passed
+    ]
+    if failed:
+        raise RuntimeError(f"模組載入超過 {budget_ms} ms 預算或有副作用: " +
+                           "; ".join(failed))
+
+
+if __name__ == "__main__":
+    for module_name, import_ms, loaded, passed in check_import_budget():
+        print(f"{module_name}\t{import_ms:.1f} ms\t"
+              f"{'ok' if passed else 'over budget'}\t{loaded}")
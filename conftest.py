@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+import pytest
+import electricity_lib as ec_lib
+import taipower_analyze_lib as analyze_lib
+import tariff_lib
+
+# 測試用的假日: 週末與元旦，不需下載假日表
+TEST_HOLIDAY_RANGE = ("2024-01-01", "2025-12-31")
+
+
+@pytest.fixture(autouse=True)
+def fixed_holidays(monkeypatch):
+    days = pd.date_range(*TEST_HOLIDAY_RANGE)
+    holidays = [
+        day.strftime("%Y%m%d") for day in days
+        if day.weekday() >= 5 or (day.month, day.day) == (1, 1)
+    ]
+    monkeypatch.setattr(ec_lib, "get_taiwan_holiday",
+                        lambda: holidays + [[]])
+
+
+def build_meter_data(start="2024-07-01", days=3, freq="15min", seed=0):
+    """
+    產生整理後格式的合成數據，白天用電較高
+    """
+    cols = analyze_lib.MeterUsageColumns()
+    date_times = pd.date_range(start,
+                               periods=days * (pd.Timedelta(days=1) //
+                                               pd.Timedelta(freq)),
+                               freq=freq)
+    interval_hours = pd.Timedelta(freq) / pd.Timedelta(hours=1)
+    hours = date_times.hour.to_numpy() + date_times.minute.to_numpy() / 60
+    rng = np.random.default_rng(seed)
+    demand_kw = 300 + 200 * np.clip(np.sin((hours - 6) / 12 * np.pi), 0,
+                                    None) + rng.uniform(0, 50, len(hours))
+    return pd.DataFrame({
+        cols.time_col: date_times,
+        cols.usage_col: demand_kw * interval_hours,
+    })
+
+
+def build_raw_meter_data(start="2024-06-26", days=10, freq="15min", seed=0):
+    """
+    產生原始電表欄位格式 (需量 kW) 的合成數據，跨月份
+    """
+    data = build_meter_data(start, days, freq, seed)
+    cols = analyze_lib.MeterUsageColumns()
+    demand_kw = (data[cols.usage_col] /
+                 (pd.Timedelta(freq) / pd.Timedelta(hours=1))).to_numpy()
+    raw_data = pd.DataFrame({cols.time_col: data[cols.time_col]})
+    for col in analyze_lib.SUM_COLS:
+        raw_data[col] = demand_kw
+    return raw_data
+
+
+@pytest.fixture
+def meter_files(tmp_path):
+    """
+    寫出原始電表資料 (Excel 與 CSV) 與合約資料
+    :return: (電表 Excel 路徑, 電表 CSV 路徑, 合約路徑)
+    """
+    raw_data = build_raw_meter_data()
+    meter_data_path = str(tmp_path / "meter.xlsx")
+    meter_csv_path = str(tmp_path / "meter.csv")
+    meter_contract_path = str(tmp_path / "contract.xlsx")
+    raw_data.to_excel(meter_data_path, index=False)
+    raw_data.to_csv(meter_csv_path, index=False)
+    pd.DataFrame({
+        "UsuallyContract": [600],
+        "NoSummerOrHalfRushContract": [0],
+        "SaturdayHalfContract": [0],
+        "NoRushContract": [0],
+    }).to_excel(meter_contract_path, index=False)
+    return meter_data_path, meter_csv_path, meter_contract_path
+
+
+@pytest.fixture
+def meter_data_factory():
+    return build_meter_data
+
+
+@pytest.fixture
+def raw_meter_data_factory():
+    return build_raw_meter_data
+
+
+@pytest.fixture
+def meter_data():
+    return build_meter_data()
+
+
+@pytest.fixture
+def calendar_features(meter_data):
+    return analyze_lib.cal_calendar_features(
+        meter_data, analyze_lib.MeterUsageColumns(),
+        analyze_lib.CalendarColumns(),
+        analyze_lib.AnalysisParameters().build_electric_parameters())
+
+
+@pytest.fixture
+def two_edition_schedule():
+    """
+    2024-07-01 起流動電價 1.5 倍、基本電價 2 倍且夏月期間不同的兩版電價表
+    """
+    first = tariff_lib.build_default_tariff_table("first")
+    second = tariff_lib.TariffTable.from_dict(first.to_dict())
+    second.version = "second"
+    second.effective_from = pd.Timestamp("2024-07-01")
+    second.summer_start, second.summer_end = "06-01", "09-30"
+    second.contracts = {
+        contract_type: {
+            **contract, "charge_price": {
+                season: {
+                    usage_type: price * 1.5
+                    for usage_type, price in season_price.items()
+                }
+                for season, season_price in contract["charge_price"].items()
+            },
+            "contract_price": {
+                season: {
+                    usage_type: price * 2
+                    for usage_type, price in season_price.items()
+                }
+                for season, season_price in contract["contract_price"].items()
+            }
+        }
+        for contract_type, contract in first.contracts.items()
+    }
+    return tariff_lib.TariffSchedule([first, second])
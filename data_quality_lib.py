@@ -0,0 +1,201 @@
+from dataclasses import dataclass, field
+from enum import Enum
+import numpy as np
+import pandas as pd
+
+
+class FillPolicy(str, Enum):
+    NONE = "不補值"
+    ZERO = "補零"
+    INTERPOLATE = "線性內插"
+    PREVIOUS_DAY = "前一日"
+
+
+# 缺漏時段的預設補值方式，前一日同時段沒有資料時改用線性內插
+FILL_POLICY = FillPolicy.PREVIOUS_DAY
+# 同一時間有多筆資料時保留第一筆
+DUPLICATE_KEEP = "first"
+
+
+@dataclass
+class DataQualityColumns:
+    gap_start_col: str = "缺漏開始"
+    gap_end_col: str = "缺漏結束"
+    missing_count_col: str = "缺漏筆數"
+
+
+@dataclass
+class DataQualityReport:
+    """
+    資料間隔、重複時間與缺漏時段的檢查結果
+    """
+    interval: pd.Timedelta
+    row_count: int = 0
+    duplicate_count: int = 0
+    off_grid_count: int = 0
+    gap_count: int = 0
+    missing_count: int = 0
+    fill_policy: FillPolicy = FILL_POLICY
+    gaps: pd.DataFrame = field(default_factory=pd.DataFrame)
+
+    @property
+    def interval_hours(self):
+        return self.interval / pd.Timedelta(hours=1)
+
+    @property
+    def is_regular(self):
+        return (self.duplicate_count == 0 and self.off_grid_count == 0
+                and self.gap_count == 0)
+
+    def summary(self):
+        """
+        :return: 可直接輸出的檢查摘要
+        """
+        return {
+            "資料間隔 (分鐘)": self.interval / pd.Timedelta(minutes=1),
+            "原始筆數": self.row_count,
+            "重複筆數": self.duplicate_count,
+            "未對齊筆數": self.off_grid_count,
+            "缺漏段數": self.gap_count,
+            "缺漏筆數": self.missing_count,
+            "補值方式": self.fill_policy.value,
+        }
+
+
+def _as_nanoseconds(date_times):
+    return pd.DatetimeIndex(date_times).as_unit("ns").asi8
+
+
+def detect_interval(date_times):
+    """
+    以相鄰時間差的眾數判斷資料間隔，重複時間與缺漏不影響結果
+    :param date_times: 時間欄位
+    :return: 資料間隔，少於兩個不同時間時為 None
+    """
+    values = np.unique(_as_nanoseconds(date_times))
+    if len(values) < 2:
+        return None
+    diffs, counts = np.unique(np.diff(values), return_counts=True)
+    return pd.Timedelta(int(diffs[counts.argmax()]), unit="ns")
+
+
+def _snap_to_grid(values, interval_ns):
+    """
+    將時間對齊到間隔 interval_ns 的時間格，時間格起點為第一筆時間向下取整，
+    第一筆時間未對齊時不會讓整段時間格偏移
+    """
+    start = values[0] - values[0] % interval_ns
+    steps = np.floor_divide(values - start + interval_ns // 2, interval_ns)
+    return start + steps * interval_ns
+
+
+def check_data_quality(date_times,
+                       interval=None,
+                       fill_policy: FillPolicy = FILL_POLICY,
+                       quality_cols: DataQualityColumns = None):
+    """
+    向量化檢查資料間隔、重複時間、未對齊時間格的筆數與缺漏時段，不修改數據
+    :param date_times: 時間欄位
+    :param interval: 資料間隔，None 表示由 detect_interval 判斷
+    :param fill_policy: 記錄在檢查結果中的補值方式
+    :param quality_cols: 缺漏時段表的欄位名稱
+    :return: DataQualityReport
+    """
+    quality_cols = quality_cols or DataQualityColumns()
+    interval = interval or detect_interval(date_times)
+    if interval is None:
+        raise ValueError("資料不足兩個不同時間，無法判斷資料間隔")
+    values = np.sort(_as_nanoseconds(date_times))
+    interval_ns = pd.Timedelta(interval).value
+    snapped = _snap_to_grid(values, interval_ns)
+    is_duplicate = np.r_[False, snapped[1:] == snapped[:-1]]
+    unique_values = snapped[~is_duplicate]
+    diffs = np.diff(unique_values)
+    is_gap = diffs > interval_ns
+    gaps = pd.DataFrame({
+        quality_cols.gap_start_col:
+        pd.to_datetime(unique_values[:-1][is_gap] + interval_ns),
+        quality_cols.gap_end_col:
+        pd.to_datetime(unique_values[1:][is_gap] - interval_ns),
+        quality_cols.missing_count_col:
+        diffs[is_gap] // interval_ns - 1,
+    })
+    return DataQualityReport(
+        interval=pd.Timedelta(interval),
+        row_count=len(values),
+        duplicate_count=int(is_duplicate.sum()),
+        off_grid_count=int((snapped != values).sum()),
+        gap_count=int(is_gap.sum()),
+        missing_count=int(gaps[quality_cols.missing_count_col].sum()),
+        fill_policy=fill_policy,
+        gaps=gaps,
+    )
+
+
+def _fill_previous_day(values, is_filled, steps_per_day):
+    """
+    缺漏筆數以前一日同時段的數值補上，缺漏超過一天時繼續往前找
+    """
+    rows = np.flatnonzero(is_filled)
+    source = rows - steps_per_day
+    while True:
+        chained = (source >= 0) & is_filled[np.maximum(source, 0)]
+        if not chained.any():
+            break
+        source[chained] -= steps_per_day
+    valid = source >= 0
+    values[rows[valid]] = values[source[valid]]
+    return rows[~valid]
+
+
+def regularize_meter_data(data,
+                          time_col,
+                          interval=None,
+                          fill_policy: FillPolicy = FILL_POLICY,
+                          quality_cols: DataQualityColumns = None):
+    """
+    將數據整理為規則間隔的時間序列: 時間對齊時間格、移除重複時間，
+    並依補值方式補上缺漏時段，只有補上的筆數會被修改
+    :param data: 整理後的數據
+    :param time_col: 時間欄位名稱
+    :param interval: 資料間隔，None 表示由 detect_interval 判斷
+    :param fill_policy: 缺漏時段的補值方式
+    :param quality_cols: 缺漏時段表的欄位名稱
+    :return: (規則間隔的數據, DataQualityReport)
+    """
+    fill_policy = FillPolicy(fill_policy)
+    report = check_data_quality(data[time_col], interval, fill_policy,
+                                quality_cols)
+    if report.is_regular:
+        return data, report
+    interval_ns = report.interval.value
+    data = data.sort_values(by=[time_col], kind="stable")
+    values = _as_nanoseconds(data[time_col])
+    data[time_col] = pd.to_datetime(
+        _snap_to_grid(values, interval_ns))
+    data = data.drop_duplicates(subset=[time_col], keep=DUPLICATE_KEEP)
+    if fill_policy == FillPolicy.NONE or report.gap_count == 0:
+        return data.reset_index(drop=True), report
+
+    grid = pd.date_range(data[time_col].iloc[0],
+                         data[time_col].iloc[-1],
+                         freq=report.interval)
+    is_filled = ~grid.isin(data[time_col])
+    data = data.set_index(time_col).reindex(grid)
+    data.index.name = time_col
+    numeric_cols = data.select_dtypes(include="number").columns
+    numeric_values = data[numeric_cols].to_numpy(dtype=float, copy=True)
+    if fill_policy == FillPolicy.ZERO:
+        numeric_values[is_filled] = 0.0
+    else:
+        rows = np.flatnonzero(is_filled)
+        if fill_policy == FillPolicy.PREVIOUS_DAY:
+            rows = _fill_previous_day(
+                numeric_values, is_filled,
+                pd.Timedelta(days=1) // report.interval)
+        if len(rows) > 0:
+            interpolated = pd.DataFrame(numeric_values).interpolate(
+                limit_area="inside").to_numpy()
+            numeric_values[rows] = interpolated[rows]
+    data[numeric_cols] = numeric_values
+    return data.reset_index(), report
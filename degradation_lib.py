@@ -0,0 +1,279 @@
+import warnings
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+import electricity_lib as ec_lib
+import taipower_analyze_lib as analyze_lib
+
+# 電池循環壽命設定: 100% 放電深度下的循環次數與深度指數
+CYCLE_LIFE = 6000
+CYCLE_LIFE_EXPONENT = 1.3
+# 循環壽命用盡時的剩餘容量比例
+END_OF_LIFE_RATIO = 0.7
+# 每年日曆老化比例
+CALENDAR_FADE = 0.005
+PROFIT_YEARS = 20
+# 容量與循環損耗的固定點迭代: 各年度容量變化小於容許值或達到最大次數時停止
+FADE_TOLERANCE = 1e-4
+MAX_FADE_PASSES = 5
+
+
+@dataclass
+class DegradationColumns:
+    year_col: str = "年度"
+    capacity_ratio_col: str = "容量比例"
+    battery_kwh_col: str = "電池容量"
+    battery_kw_col: str = "電池功率"
+    equivalent_cycles_col: str = "等效循環數"
+    damage_col: str = "循環損耗"
+
+
+def find_reversals(series):
+    """
+    取出序列的轉折點 (含頭尾)，平坦區段視為同一點
+    :param series: 數值序列
+    :return: 轉折點數值
+    """
+    series = np.asarray(series, dtype=float)
+    diff = np.diff(series)
+    moving = np.flatnonzero(diff != 0)
+    if len(moving) == 0:
+        return series[:1]
+    direction = np.sign(diff[moving])
+    turning = moving[1:][direction[1:] != direction[:-1]]
+    return np.concatenate(([series[0]], series[turning], [series[-1]]))
+
+
+def count_rainflow_cycles(series):
+    """
+    以 ASTM E1049 雨流計數法計算循環
+    :param series: 電池容量序列
+    :return: (循環幅度, 循環次數)，半循環的次數為 0.5
+    """
+    stack = []
+    ranges, counts = [], []
+    for point in find_reversals(series):
+        stack.append(point)
+        while len(stack) >= 3:
+            current_range = abs(stack[-1] - stack[-2])
+            previous_range = abs(stack[-2] - stack[-3])
+            if current_range < previous_range:
+                break
+            ranges.append(previous_range)
+            if len(stack) == 3:
+                counts.append(0.5)
+                stack.pop(0)
+            else:
+                counts.append(1.0)
+                last_point = stack.pop()
+                del stack[-2:]
+                stack.append(last_point)
+    for i in range(len(stack) - 1):
+        ranges.append(abs(stack[i + 1] - stack[i]))
+        counts.append(0.5)
+    return np.array(ranges), np.array(counts)
+
+
+def cal_cycle_damage(battery_kwh_series, battery_kwh, year_ratio=1.0):
+    """
+    計算電池容量序列的年度循環損耗與等效循環數
+    :param battery_kwh_series: 模擬的電池容量序列
+    :param battery_kwh: 當年度電池容量
+    :param year_ratio: 將序列長度換算為一年的比例
+    :return: (循環損耗, 等效循環數)
+    """
+    ranges, counts = count_rainflow_cycles(battery_kwh_series)
+    depth = ranges / battery_kwh
+    damage = (counts * depth**CYCLE_LIFE_EXPONENT).sum() / CYCLE_LIFE
+    equivalent_cycles = (counts * depth).sum()
+    return damage * year_ratio, equivalent_cycles * year_ratio
+
+
+def cal_capacity_ratio(yearly_damage, years=PROFIT_YEARS):
+    """
+    由每年度的循環損耗累計推算每年度的剩餘容量比例，第一年為 1
+    :param yearly_damage: 每年度循環損耗 (years,)，純量表示每年相同
+    :param years: 年數
+    :return: 容量比例陣列
+    """
+    yearly_damage = np.broadcast_to(
+        np.asarray(yearly_damage, dtype=float), (years, ))
+    yearly_fade = yearly_damage * (1 - END_OF_LIFE_RATIO) + CALENDAR_FADE
+    return np.clip(1.0 - np.concatenate(([0.0], np.cumsum(yearly_fade[:-1]))),
+                   0.0, 1.0)
+
+
+def _masked_max(values, mask):
+    if not mask.any():
+        return np.full(values.shape[1], np.nan)
+    return np.nanmax(values[mask], axis=0)
+
+
+def _group_hourly(values, hour_index, hour_count, how):
+    result = np.empty((hour_count, values.shape[1]))
+    row_count = np.bincount(hour_index, minlength=hour_count)
+    for col in range(values.shape[1]):
+        result[:, col] = np.bincount(hour_index,
+                                     weights=values[:, col],
+                                     minlength=hour_count)
+    if how == "mean":
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result = result / row_count[:, None]
+    return result
+
+
+def simulate_degradation(
+    priced_data,
+    calendar_features,
+    raw_contract: dict,
+    analysis_params: analyze_lib.AnalysisParameters = None,
+    meter_usage_cols: analyze_lib.MeterUsageColumns = None,
+    elec_price_cols: analyze_lib.ElectricPriceColumns = None,
+    calendar_cols: analyze_lib.CalendarColumns = None,
+    yearly_profit_cols: analyze_lib.YearlyProfitColumns = None,
+    degradation_cols: DegradationColumns = None,
+    years=PROFIT_YEARS,
+):
+    """
+    以模擬的充放電循環推算每年度容量衰退，並以批次方式重新模擬每一年度。
+    先以第一年度的循環損耗推算初始容量，之後由每年度模擬的循環損耗重新累計容量並再模擬，
+    直到容量收斂，回傳的容量與循環損耗彼此一致。達到最大次數仍未收斂時發出警告，
+    回傳最後一次模擬使用的容量與該次模擬的循環損耗
+    :param priced_data: 含充放電與電價欄位的數據 (第一年度)
+    :param calendar_features: cal_calendar_features 的結果
+    :param raw_contract: 原合約容量
+    :param analysis_params: 分析參數
+    :param years: 年數
+    :return: (年度效益, 年度容量)
+    """
+    analysis_params = analysis_params or analyze_lib.AnalysisParameters()
+    cols = meter_usage_cols or analyze_lib.MeterUsageColumns()
+    elec_price_cols = elec_price_cols or analyze_lib.ElectricPriceColumns()
+    calendar_cols = calendar_cols or analyze_lib.CalendarColumns()
+    yearly_profit_cols = (yearly_profit_cols
+                          or analyze_lib.YearlyProfitColumns())
+    degradation_cols = degradation_cols or DegradationColumns()
+    elec_price_params = analysis_params.build_electric_price_parameters()
+
+    date_times = pd.DatetimeIndex(priced_data[cols.time_col])
+    year_ratio = 365 * 24 * 3600 / max(
+        (date_times.max() - date_times.min()).total_seconds(), 1.0)
+    base_damage, _ = cal_cycle_damage(
+        priced_data[cols.battery_kwh_col].to_numpy(),
+        analysis_params.battery_kwh, year_ratio)
+    capacity_ratio = cal_capacity_ratio(base_damage, years)
+    usage = priced_data[cols.usage_col].to_numpy()
+    interval_hours = analyze_lib.get_interval_hours(priced_data, cols)
+    surplus_kwh = analyze_lib.get_surplus_kwh(priced_data, cols,
+                                              analysis_params)
+
+    for fade_pass in range(MAX_FADE_PASSES):
+        battery_kwh = analysis_params.battery_kwh * capacity_ratio
+        battery_kw = analysis_params.battery_kw * capacity_ratio
+        # 所有年度一次批次模擬
+        charge_kw, release_kw = analyze_lib.cal_default_power_vectorized(
+            calendar_features, calendar_cols, analysis_params, battery_kwh,
+            battery_kw)
+        (battery_power, soc, usage_with_battery, charge_kwh, release_kwh,
+         _) = analyze_lib.simulate_battery_dispatch(
+             usage,
+             charge_kw,
+             release_kw,
+             battery_kwh,
+             battery_kw,
+             analysis_params.battery_dod,
+             analysis_params.charge_loss,
+             surplus_kwh=surplus_kwh,
+             interval_hours=interval_hours,
+         )
+        damage, equivalent_cycles = np.array([
+            cal_cycle_damage(soc[:, year], battery_kwh[year], year_ratio)
+            if battery_kwh[year] > 0 else (0.0, 0.0) for year in range(years)
+        ]).T
+        # 由本次模擬的循環損耗重新累計容量，與模擬使用的容量一致時停止
+        next_capacity_ratio = cal_capacity_ratio(damage, years)
+        converged = np.abs(next_capacity_ratio -
+                           capacity_ratio).max() < FADE_TOLERANCE
+        # 最後一次不更新容量，避免回傳的容量與模擬結果不一致
+        if converged or fade_pass == MAX_FADE_PASSES - 1:
+            break
+        capacity_ratio = next_capacity_ratio
+    if not converged:
+        warnings.warn(
+            f"容量衰退模擬在 {MAX_FADE_PASSES} 次內未收斂，"
+            f"容量最大差異 "
+            f"{np.abs(next_capacity_ratio - capacity_ratio).max():.2e}",
+            RuntimeWarning)
+
+    # 尖離峰套利利潤
+    new_price = ec_lib.price_dict_to_matrix(
+        elec_price_params.new_charge_price_dict)[
+            calendar_features[calendar_cols.season_col].to_numpy(),
+            calendar_features[calendar_cols.usage_type_col].to_numpy()]
+    charge_profit = (
+        priced_data[elec_price_cols.elec_charge_price_col].sum() -
+        ((usage[:, None] - charge_kwh - release_kwh) *
+         new_price[:, None]).sum(axis=0))
+
+    # 需量反應價金
+    hour_codes, hour_index = np.unique(
+        date_times.floor("h").to_numpy(), return_inverse=True)
+    hour_index = hour_index.reshape(-1)
+    _, dr_price = analyze_lib.cal_dr_volume_and_price_vectorized(
+        _group_hourly(usage_with_battery, hour_index, len(hour_codes), "sum"),
+        _group_hourly(battery_power, hour_index, len(hour_codes), "mean"),
+        _group_hourly(soc, hour_index, len(hour_codes), "mean"),
+        analysis_params,
+        battery_kw,
+    )
+    dr_profit = dr_price.sum(axis=0)
+
+    # 基本電價差利潤
+    is_expensive = analyze_lib.is_expensive_hour_vectorized(
+        calendar_features, calendar_cols, analysis_params.contract_type)
+    is_summer = calendar_features[calendar_cols.season_col].to_numpy(
+    ) == ec_lib.SEASON_TYPE_LIST.index(ec_lib.SeasonType.SUMMER)
+    max_nonexpensive = _masked_max(usage_with_battery, ~is_expensive)
+    if (analysis_params.contract_type ==
+            ec_lib.ContractType.HIGH_PRESSURE_THREE_PHASE):
+        max_peak = _masked_max(usage_with_battery, is_expensive & is_summer)
+        max_semi_peak = _masked_max(usage_with_battery,
+                                    is_expensive & ~is_summer)
+    else:
+        max_peak = _masked_max(usage_with_battery, is_expensive)
+        max_semi_peak = np.zeros(years)
+    contract_monthly_basic_price = analyze_lib.cal_monthly_basic_price(
+        raw_contract, elec_price_params.raw_contract_price_dict)
+    contract_profit = np.empty(years)
+    for year in range(years):
+        new_contract_volume = analyze_lib.cal_new_contract_volume_from_max(
+            max_peak[year],
+            max_semi_peak[year],
+            max_nonexpensive[year],
+            analysis_params.contract_type,
+            raw_contract,
+            analysis_params.new_contract_buffer,
+            interval_hours,
+        )
+        new_monthly_basic_price = analyze_lib.cal_monthly_basic_price(
+            new_contract_volume, elec_price_params.contract_price_dict)
+        contract_profit[year] = sum(contract_monthly_basic_price[key] -
+                                    new_monthly_basic_price[key]
+                                    for key in contract_monthly_basic_price)
+
+    building_cost = -(analysis_params.battery_kwh /
+                      analysis_params.battery_buffer *
+                      analysis_params.kwh_price)
+    yearly_profit = analyze_lib.build_year_profit_table(
+        charge_profit, contract_profit, dr_profit, building_cost,
+        yearly_profit_cols)
+
+    capacity = pd.DataFrame({
+        degradation_cols.year_col: [f"第 {i} 年" for i in range(1, years + 1)],
+        degradation_cols.capacity_ratio_col: capacity_ratio,
+        degradation_cols.battery_kwh_col: battery_kwh,
+        degradation_cols.battery_kw_col: battery_kw,
+        degradation_cols.equivalent_cycles_col: equivalent_cycles,
+        degradation_cols.damage_col: damage,
+    })
+    return yearly_profit, capacity
@@ -0,0 +1,241 @@
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+import electricity_lib as ec_lib
+import taipower_analyze_lib as analyze_lib
+
+# 隨機事件設定
+DR_EVENTS_PER_YEAR = 10
+DR_EVENT_HOURS = 2
+DR_EVENT_START_HOURS = (13, 19)
+DR_EVENT_MONTHS = (5, 6, 7, 8, 9, 10)
+# 事件未達投標量時每度罰款
+DR_SHORTFALL_PRICE = 0.0
+# 每批同時模擬的事件日曆數量
+DR_CALENDAR_BATCH = 100
+
+
+@dataclass
+class DREventColumns:
+    start_col: str = "開始時間"
+    end_col: str = "結束時間"
+
+
+@dataclass
+class DRSimulationColumns:
+    event_count_col: str = "事件次數"
+    event_hours_col: str = "事件時數"
+    bid_kwh_col: str = "投標電量"
+    delivered_kwh_col: str = "實際放電量"
+    capacity_price_col: str = "容量價金"
+    energy_price_col: str = "電能價金"
+    shortfall_price_col: str = "未達標罰款"
+    bill_increase_col: str = "電費增加"
+    net_profit_col: str = "需量反應淨收益"
+
+
+def load_event_calendar(file_path,
+                        date_times,
+                        event_cols: DREventColumns = None):
+    """
+    讀取 CSV 事件日曆，每列一個事件 [開始時間, 結束時間)
+    :param file_path: 事件日曆路徑
+    :param date_times: 數據的日期時間序列
+    :param event_cols: 事件欄位名稱
+    :return: 事件時段布林陣列 (T, 1)
+    """
+    event_cols = event_cols or DREventColumns()
+    events = pd.read_csv(file_path,
+                         parse_dates=[event_cols.start_col, event_cols.end_col])
+    date_times = pd.DatetimeIndex(date_times).to_numpy()
+    event_mask = np.zeros(len(date_times), dtype=bool)
+    for start, end in zip(events[event_cols.start_col],
+                          events[event_cols.end_col]):
+        event_mask |= (date_times >= start.to_datetime64()) & (
+            date_times < end.to_datetime64())
+    return event_mask[:, None]
+
+
+def generate_event_calendars(
+    date_times,
+    day_type_codes,
+    calendar_count,
+    seed=None,
+    events_per_year=DR_EVENTS_PER_YEAR,
+    event_hours=DR_EVENT_HOURS,
+    start_hours=DR_EVENT_START_HOURS,
+    event_months=DR_EVENT_MONTHS,
+):
+    """
+    以固定亂數種子產生多組事件日曆，事件只發生在指定月份的工作日
+    :param date_times: 數據的日期時間序列
+    :param day_type_codes: 日期類型編碼
+    :param calendar_count: 日曆數量
+    :param seed: 亂數種子
+    :param events_per_year: 每年平均事件次數
+    :param event_hours: 每次事件時數
+    :param start_hours: 事件開始小時範圍 (含頭尾)
+    :param event_months: 可能發生事件的月份
+    :return: 事件時段布林陣列 (T, calendar_count)
+    """
+    rng = np.random.default_rng(seed)
+    date_times = pd.DatetimeIndex(date_times)
+    days, day_index = np.unique(date_times.normalize().to_numpy(),
+                                return_inverse=True)
+    day_index = day_index.reshape(-1)
+    days = pd.DatetimeIndex(days)
+    workday_code = ec_lib.DAY_TYPE_LIST.index(ec_lib.DayType.WORKDAY)
+    is_workday = np.zeros(len(days), dtype=bool)
+    is_workday[day_index[day_type_codes == workday_code]] = True
+    is_candidate = is_workday & np.isin(days.month, event_months)
+
+    span_years = len(days) / 365
+    event_count = np.minimum(
+        rng.poisson(events_per_year * span_years, calendar_count),
+        is_candidate.sum())
+    # 以亂數排序選出每組日曆的事件日
+    ranks = np.where(is_candidate[:, None],
+                     rng.random((len(days), calendar_count)), np.inf)
+    ranks = ranks.argsort(axis=0).argsort(axis=0)
+    start_hour = np.where(
+        ranks < event_count[None, :],
+        rng.integers(start_hours[0],
+                     start_hours[1] + 1,
+                     size=(len(days), calendar_count)),
+        -1,
+    )
+    row_start = start_hour[day_index]
+    row_hour = (date_times.hour.to_numpy() +
+                date_times.minute.to_numpy() / 60)[:, None]
+    return ((row_start >= 0) & (row_hour >= row_start)
+            & (row_hour < row_start + event_hours))
+
+
+def cal_row_bid_kw(priced_data, meter_usage_cols: analyze_lib.
+                   MeterUsageColumns, elec_price_cols: analyze_lib.
+                   ElectricPriceColumns,
+                   analysis_params: analyze_lib.AnalysisParameters):
+    """
+    將每小時的需量投標量對應回每筆數據的投標功率
+    :param priced_data: 含充放電與電價欄位的數據
+    :return: (每筆投標功率, 每小時 DR 數據)
+    """
+    hourly_data = analyze_lib.cal_hourly_dr_price_vectorized(
+        priced_data, meter_usage_cols, elec_price_cols, analysis_params)
+    hourly_bid_kw = hourly_data.set_index(
+        meter_usage_cols.time_col)[meter_usage_cols.dr_volume_col] * 1000
+    row_hours = priced_data[meter_usage_cols.time_col].dt.floor("h")
+    return (hourly_bid_kw.reindex(row_hours).fillna(0.0).to_numpy(),
+            hourly_data)
+
+
+def simulate_dr_events(
+    priced_data,
+    calendar_features,
+    event_mask,
+    analysis_params: analyze_lib.AnalysisParameters = None,
+    meter_usage_cols: analyze_lib.MeterUsageColumns = None,
+    elec_price_cols: analyze_lib.ElectricPriceColumns = None,
+    calendar_cols: analyze_lib.CalendarColumns = None,
+    dr_cols: DRSimulationColumns = None,
+    shortfall_price=DR_SHORTFALL_PRICE,
+    calendar_batch=DR_CALENDAR_BATCH,
+):
+    """
+    在電池狀態引擎中模擬每組事件日曆的實際放電，計算需量反應收益分布
+    :param priced_data: 含充放電與電價欄位的數據
+    :param calendar_features: cal_calendar_features 的結果
+    :param event_mask: 事件時段布林陣列 (T, N)
+    :param analysis_params: 分析參數
+    :param shortfall_price: 未達投標量每度罰款
+    :param calendar_batch: 每批同時模擬的日曆數量
+    :return: 每組日曆的需量反應收益
+    """
+    analysis_params = analysis_params or analyze_lib.AnalysisParameters()
+    meter_usage_cols = meter_usage_cols or analyze_lib.MeterUsageColumns()
+    elec_price_cols = elec_price_cols or analyze_lib.ElectricPriceColumns()
+    calendar_cols = calendar_cols or analyze_lib.CalendarColumns()
+    dr_cols = dr_cols or DRSimulationColumns()
+
+    bid_kw, hourly_data = cal_row_bid_kw(priced_data, meter_usage_cols,
+                                         elec_price_cols, analysis_params)
+    capacity_price = (hourly_data[meter_usage_cols.dr_volume_col].sum() *
+                      analysis_params.dr_avg_price)
+    battery_kwh = np.array([analysis_params.battery_kwh])
+    battery_kw = np.array([analysis_params.battery_kw])
+    charge_kw, release_kw = analyze_lib.cal_default_power_vectorized(
+        calendar_features, calendar_cols, analysis_params, battery_kwh,
+        battery_kw)
+    usage = priced_data[meter_usage_cols.usage_col].to_numpy()
+    interval_hours = analyze_lib.get_interval_hours(priced_data,
+                                                    meter_usage_cols)
+    surplus_kwh = analyze_lib.get_surplus_kwh(priced_data, meter_usage_cols,
+                                              analysis_params)
+    new_price = ec_lib.price_dict_to_matrix(
+        analysis_params.build_electric_price_parameters().
+        new_charge_price_dict)[
+            calendar_features[calendar_cols.season_col].to_numpy(),
+            calendar_features[calendar_cols.usage_type_col].to_numpy()]
+    baseline_bill = priced_data[
+        elec_price_cols.elec_charge_price_with_battery_col].sum()
+
+    event_mask = np.asarray(event_mask, dtype=bool)
+    result_list = []
+    for start in range(0, event_mask.shape[1], calendar_batch):
+        batch_mask = event_mask[:, start:start + calendar_batch]
+        event_kw = np.where(batch_mask, bid_kw[:, None], 0.0)
+        (battery_power, _, _, charge_kwh, release_kwh,
+         _) = analyze_lib.simulate_battery_dispatch(
+             usage,
+             charge_kw,
+             release_kw,
+             battery_kwh,
+             battery_kw,
+             analysis_params.battery_dod,
+             analysis_params.charge_loss,
+             event_kw=event_kw,
+             surplus_kwh=surplus_kwh,
+             interval_hours=interval_hours,
+         )
+        bid_kwh = (event_kw * interval_hours).sum(axis=0)
+        delivered_kwh = (np.where(event_kw > 0, battery_power, 0.0).clip(
+            min=0) * interval_hours).sum(axis=0)
+        shortfall_kwh = np.maximum(bid_kwh - delivered_kwh, 0.0)
+        bill = ((usage[:, None] - charge_kwh - release_kwh) *
+                new_price[:, None]).sum(axis=0)
+        energy_price = delivered_kwh * analysis_params.dr_energy_price
+        shortfall = shortfall_kwh * shortfall_price
+        bill_increase = bill - baseline_bill
+        result_list.append(
+            pd.DataFrame({
+                dr_cols.event_count_col: (batch_mask[1:] & ~batch_mask[:-1]
+                                          ).sum(axis=0) + batch_mask[0],
+                dr_cols.event_hours_col:
+                batch_mask.sum(axis=0) * interval_hours,
+                dr_cols.bid_kwh_col:
+                bid_kwh,
+                dr_cols.delivered_kwh_col:
+                delivered_kwh,
+                dr_cols.capacity_price_col:
+                capacity_price,
+                dr_cols.energy_price_col:
+                energy_price,
+                dr_cols.shortfall_price_col:
+                shortfall,
+                dr_cols.bill_increase_col:
+                bill_increase,
+                dr_cols.net_profit_col:
+                capacity_price + energy_price - shortfall - bill_increase,
+            }))
+    return pd.concat(result_list, ignore_index=True)
+
+
+def summarize_dr_profit(dr_result,
+                        percentiles=(0.05, 0.25, 0.5, 0.75, 0.95)):
+    """
+    統計需量反應收益分布
+    :param dr_result: simulate_dr_events 的結果
+    :param percentiles: 百分位數
+    :return: 統計表
+    """
+    return dr_result.describe(percentiles=list(percentiles))
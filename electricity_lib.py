@@ -1,19 +1,56 @@
 from enum import Enum
 from datetime import datetime
-import requests
-import pandas as pd
+from functools import lru_cache
+
+
+# 假日表來源，{year} 代入西元年
+HOLIDAY_SOURCE_URL = (
+    "https://cdn.jsdelivr.net/gh/ruyut/TaiwanCalendar/data/{year}.json")
 
 
 def get_holiday_list(year):
-    url = f"https://cdn.jsdelivr.net/gh/ruyut/TaiwanCalendar/data/{year}.json"
+    import requests
+
+    url = HOLIDAY_SOURCE_URL.format(year=year)
     response = requests.get(url)
     response_json = response.json()
     holiday_list = [item["date"] for item in response_json if item["isHoliday"]]
     return holiday_list
 
 
-taiwan_holiday = get_holiday_list(datetime.now().year)
-taiwan_holiday.append(get_holiday_list(datetime.now().year - 1))
+@lru_cache(maxsize=None)
+def get_taiwan_holiday():
+    """
+    第一次使用時才下載假日表，之後回傳同一個列表
+    :return: 今年假日列表，最後一個元素為去年的假日列表
+    """
+    year, last_year = get_holiday_years()
+    taiwan_holiday = get_holiday_list(year)
+    taiwan_holiday.append(get_holiday_list(last_year))
+    return taiwan_holiday
+
+
+def get_holiday_years():
+    """
+    get_taiwan_holiday 下載的年份，不需下載即可作為快取鍵值
+    :return: (今年, 去年)
+    """
+    return datetime.now().year, datetime.now().year - 1
+
+
+def get_holiday_source():
+    """
+    假日表的來源與年份，快取鍵值使用此結果，命中快取時不會下載假日表
+    :return: 來源與年份字典
+    """
+    return {"url": HOLIDAY_SOURCE_URL, "years": list(get_holiday_years())}
+
+
+def __getattr__(name):
+    # 相容舊的 ec_lib.taiwan_holiday 用法，存取時才下載假日表
+    if name == "taiwan_holiday":
+        return get_taiwan_holiday()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class ContractType(str, Enum):
@@ -49,6 +86,15 @@ class DayType(str, Enum):
     HOLIDAY = "週日與節假日"
 
 
+# 內建電價表的夏月期間 (月-日)
+SUMMER_START = "05-16"
+SUMMER_END = "10-15"
+# 向量化計算時使用的整數編碼順序
+SEASON_TYPE_LIST = list(SeasonType)
+USAGE_TYPE_LIST = list(UsageType)
+DAY_TYPE_LIST = list(DayType)
+
+
 def get_release_hour_dict(contract_type: ContractType, release_type: ReleaseType):
     if contract_type == ContractType.HIGH_PRESSURE_THREE_PHASE:
         if release_type == ReleaseType.AVERAGE:
@@ -207,7 +253,7 @@ def get_charge_price_dict(contract_type):
 def get_day_type(pd_timestamp):
     date_obj = pd_timestamp.strftime("%Y%m%d")
     day_type = DayType.WORKDAY
-    if date_obj in taiwan_holiday:
+    if date_obj in get_taiwan_holiday():
         if pd_timestamp.weekday() == 5:
             day_type = DayType.SATURDAY
         else:
@@ -222,6 +268,7 @@ def get_usage_type_from_dict(datetime, electric_type_dict: dict):
     :param eletric_type_dict: 用電參數
     :return: 用電類型
     """
+    import pandas as pd
     result_type = UsageType.OFF_PEAK
     daily_type_dict = electric_type_dict.get(
         SeasonType.SUMMER if is_summer(datetime) else SeasonType.NONSUMMER
@@ -253,6 +300,142 @@ def get_usage_type_from_dict(datetime, electric_type_dict: dict):
     return result_type
 
 
+def time_list_to_ns(time_list):
+    """
+    將 "HH:MM:SS" 時間列表轉為當日經過的奈秒數
+    :param time_list: 時間字串列表
+    :return: 奈秒陣列
+    """
+    import pandas as pd
+    return (pd.to_timedelta(time_list).to_numpy().astype("int64"))
+
+
+def get_time_of_day_ns(date_times):
+    """
+    取得每筆時間在當日經過的奈秒數
+    :param date_times: 日期時間序列
+    :return: 奈秒陣列
+    """
+    import pandas as pd
+    date_times = pd.DatetimeIndex(date_times)
+    return (date_times - date_times.normalize()).to_numpy().astype("int64")
+
+
+def is_summer_vectorized(date_times):
+    """
+    向量化版 is_summer
+    :param date_times: 日期時間序列
+    :return: 是否為夏月的布林陣列
+    """
+    import pandas as pd
+    date_times = pd.DatetimeIndex(date_times)
+    month = date_times.month.to_numpy()
+    day = date_times.day.to_numpy()
+    return (((month > 5) | ((month == 5) & (day >= 16)))
+            & ((month < 10) | ((month == 10) & (day <= 15))))
+
+
+def get_season_codes(date_times):
+    """
+    取得季節編碼，對應 SEASON_TYPE_LIST
+    :param date_times: 日期時間序列
+    :return: 季節編碼陣列
+    """
+    import numpy as np
+    return np.where(is_summer_vectorized(date_times),
+                    SEASON_TYPE_LIST.index(SeasonType.SUMMER),
+                    SEASON_TYPE_LIST.index(SeasonType.NONSUMMER)).astype(
+                        np.int8)
+
+
+def get_day_type_codes(date_times):
+    """
+    向量化版 get_day_type，回傳對應 DAY_TYPE_LIST 的編碼
+    :param date_times: 日期時間序列
+    :return: 日期類型編碼陣列
+    """
+    import numpy as np
+    import pandas as pd
+    date_times = pd.DatetimeIndex(date_times)
+    days = date_times.normalize()
+    unique_days, inverse = np.unique(days.to_numpy(), return_inverse=True)
+    unique_days = pd.DatetimeIndex(unique_days)
+    is_holiday = np.isin(
+        np.asarray(unique_days.strftime("%Y%m%d")),
+        [day for day in get_taiwan_holiday() if isinstance(day, str)])
+    is_saturday = unique_days.weekday.to_numpy() == 5
+    unique_codes = np.where(
+        is_holiday,
+        np.where(is_saturday, DAY_TYPE_LIST.index(DayType.SATURDAY),
+                 DAY_TYPE_LIST.index(DayType.HOLIDAY)),
+        DAY_TYPE_LIST.index(DayType.WORKDAY),
+    ).astype(np.int8)
+    return unique_codes[inverse.reshape(-1)]
+
+
+def _in_time_windows(time_of_day_ns, time_list):
+    import numpy as np
+    in_window = np.zeros(len(time_of_day_ns), dtype=bool)
+    if not time_list:
+        return in_window
+    bounds = time_list_to_ns(time_list)
+    for i in range(0, len(bounds), 2):
+        in_window |= (bounds[i] <= time_of_day_ns) & (time_of_day_ns
+                                                      <= bounds[i + 1])
+    return in_window
+
+
+def get_usage_type_codes(date_times,
+                         electric_type_dict: dict,
+                         season_codes=None,
+                         day_type_codes=None):
+    """
+    向量化版 get_usage_type_from_dict，回傳對應 USAGE_TYPE_LIST 的編碼
+    :param date_times: 日期時間序列
+    :param electric_type_dict: 用電參數
+    :param season_codes: 預先計算的季節編碼
+    :param day_type_codes: 預先計算的日期類型編碼
+    :return: 用電類型編碼陣列
+    """
+    import numpy as np
+    if season_codes is None:
+        season_codes = get_season_codes(date_times)
+    if day_type_codes is None:
+        day_type_codes = get_day_type_codes(date_times)
+    time_of_day_ns = get_time_of_day_ns(date_times)
+    result = np.full(len(time_of_day_ns),
+                     USAGE_TYPE_LIST.index(UsageType.OFF_PEAK),
+                     dtype=np.int8)
+    is_workday = day_type_codes == DAY_TYPE_LIST.index(DayType.WORKDAY)
+    is_saturday = day_type_codes == DAY_TYPE_LIST.index(DayType.SATURDAY)
+    for season_code, season in enumerate(SEASON_TYPE_LIST):
+        daily_type_dict = electric_type_dict.get(season)
+        in_season = season_codes == season_code
+        # 與逐筆版本相同，後面的時段會覆蓋前面的判斷結果
+        for usage_type, time_list in daily_type_dict.items():
+            if usage_type == UsageType.SATURDAY_SEMI_PEAK:
+                mask = in_season & is_saturday
+            else:
+                mask = in_season & is_workday
+            mask &= _in_time_windows(time_of_day_ns, time_list)
+            result[mask] = USAGE_TYPE_LIST.index(usage_type)
+    return result
+
+
+def price_dict_to_matrix(price_dict: dict):
+    """
+    將季節/用電類型的價格字典轉為 (季節, 用電類型) 矩陣，缺少的類型為 NaN
+    :param price_dict: 價格字典
+    :return: 價格矩陣
+    """
+    import numpy as np
+    matrix = np.full((len(SEASON_TYPE_LIST), len(USAGE_TYPE_LIST)), np.nan)
+    for season_code, season in enumerate(SEASON_TYPE_LIST):
+        for usage_type, price in price_dict.get(season, {}).items():
+            matrix[season_code, USAGE_TYPE_LIST.index(usage_type)] = price
+    return matrix
+
+
 if __name__ == "__main__":
     example_date = "2025-01-01 00:00:00"
     print(f"{example_date} is workday = {get_day_type(example_date)}")
@@ -0,0 +1,664 @@
+from dataclasses import dataclass, replace
+import glob
+import os
+import time
+import numpy as np
+import pandas as pd
+import electricity_lib as ec_lib
+import taipower_analyze_lib as analyze_lib
+from analysis_pipeline_lib import group_monthly_data
+
+# 內建電表資料位置
+DATA_FOLDER = "./data/"
+# 合成數據的亂數種子
+SYNTHETIC_SEEDS = (0, 1, 2, 3, 4)
+# 每個合成數據隨機挑選的額外日期數
+SYNTHETIC_RANDOM_DAYS = 5
+# 合成數據每15分鐘的用電量範圍 (度)
+SYNTHETIC_USAGE_RANGE = (0.0, 400.0)
+# 合成原始電表數據的天數，需涵蓋 5/16 季節切換
+SYNTHETIC_RAW_DAYS = 4
+# 比對的合約/充放電類型組合
+PARAMETER_GRID = [
+    (contract_type, release_type)
+    for contract_type in ec_lib.ContractType
+    for release_type in ec_lib.ReleaseType
+]
+
+
+@dataclass
+class EquivalenceColumns:
+    source_col: str = "資料來源"
+    params_col: str = "參數"
+    function_col: str = "函式"
+    column_col: str = "欄位"
+    rows_col: str = "筆數"
+    max_abs_col: str = "最大絕對誤差"
+    max_rel_col: str = "最大相對誤差"
+    reference_seconds_col: str = "參考耗時"
+    fast_seconds_col: str = "向量化耗時"
+    speedup_col: str = "加速倍數"
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def cal_deviation(reference, fast):
+    """
+    計算參考值與向量化結果的最大絕對/相對誤差，兩者皆為 NaN 視為相同
+    :param reference: 參考結果
+    :param fast: 向量化結果
+    :return: (最大絕對誤差, 最大相對誤差)
+    """
+    reference = np.asarray(reference, dtype=float).reshape(-1)
+    fast = np.asarray(fast, dtype=float).reshape(-1)
+    if len(reference) == 0:
+        return 0.0, 0.0
+    both_nan = np.isnan(reference) & np.isnan(fast)
+    abs_diff = np.where(both_nan, 0.0, np.abs(reference - fast))
+    abs_diff = np.where(np.isnan(abs_diff), np.inf, abs_diff)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rel_diff = np.where(abs_diff == 0, 0.0,
+                            abs_diff / np.abs(reference))
+    return float(abs_diff.max()), float(np.nan_to_num(rel_diff,
+                                                      nan=np.inf).max())
+
+
+def build_synthetic_meter_data(seed,
+                               year=None,
+                               random_days=SYNTHETIC_RANDOM_DAYS,
+                               usage_range=SYNTHETIC_USAGE_RANGE,
+                               meter_usage_cols: analyze_lib.
+                               MeterUsageColumns = None):
+    """
+    產生涵蓋邊界情況的合成電表數據: 月底/月初、5/16 與 10/15 季節切換、
+    週六國定假日、平日假日，以及每個時段起訖前後一秒 (含 23:59:59)
+    :param seed: 亂數種子
+    :param year: 年度，預設為假日表的年度
+    :param random_days: 額外隨機挑選的日期數
+    :param usage_range: 每筆用電量範圍
+    :param meter_usage_cols: 用電欄位名稱
+    :return: 整理後的數據
+    """
+    meter_usage_cols = meter_usage_cols or analyze_lib.MeterUsageColumns()
+    rng = np.random.default_rng(seed)
+    holidays = pd.to_datetime(
+        [
+            day for day in ec_lib.get_taiwan_holiday()
+            if isinstance(day, str)
+        ],
+        format="%Y%m%d")
+    year = year or (holidays.year.max() if len(holidays) else 2024)
+    holidays = holidays[holidays.year == year]
+
+    days = [pd.Timestamp(year, 5, 15), pd.Timestamp(year, 5, 16)]
+    days += [pd.Timestamp(year, 10, 15), pd.Timestamp(year, 10, 16)]
+    month_ends = pd.date_range(f"{year}-01-01", periods=12, freq="ME")
+    for month_end in rng.choice(month_ends, 3, replace=False):
+        days += [pd.Timestamp(month_end), pd.Timestamp(month_end) +
+                 pd.Timedelta(days=1)]
+    saturday_holidays = holidays[holidays.weekday == 5]
+    weekday_holidays = holidays[holidays.weekday < 5]
+    for candidates in (saturday_holidays, weekday_holidays):
+        if len(candidates):
+            days += list(rng.choice(candidates, min(2, len(candidates)),
+                                    replace=False))
+    all_days = pd.date_range(f"{year}-01-01", f"{year}-12-31", freq="D")
+    days += list(rng.choice(all_days, random_days, replace=False))
+    days = pd.DatetimeIndex(days).normalize().unique()
+
+    # 所有時段的起訖時間與前後一秒
+    boundary_list = ["23:59:59"]
+    for contract_type in ec_lib.ContractType:
+        hour_dict_list = [ec_lib.get_elec_type_dict(contract_type)]
+        hour_dict_list += [{
+            season: {
+                None: time_list
+            }
+            for season, time_list in ec_lib.get_release_hour_dict(
+                contract_type, release_type).items()
+        } for release_type in ec_lib.ReleaseType]
+        hour_dict_list += [{
+            season: {
+                None: time_list
+            }
+            for season, time_list in ec_lib.get_charege_hour_dict(
+                contract_type, charge_type).items()
+        } for charge_type in ec_lib.ChargeType]
+        for hour_dict in hour_dict_list:
+            for daily_dict in hour_dict.values():
+                for time_list in daily_dict.values():
+                    boundary_list += list(time_list)
+    boundary = pd.to_timedelta(sorted(set(boundary_list)))
+    offsets = (boundary.to_numpy()[:, None] + np.array(
+        [-1, 0, 1], dtype="timedelta64[s]")[None, :]).reshape(-1)
+    offsets = offsets[(offsets >= np.timedelta64(0, "s"))
+                      & (offsets < np.timedelta64(1, "D"))]
+    quarter = pd.timedelta_range("00:00:00", periods=96, freq="15min")
+    day_offsets = np.unique(np.concatenate((quarter.to_numpy(), offsets)))
+
+    date_times = (days.to_numpy()[:, None] + day_offsets[None, :]).reshape(-1)
+    date_times = np.sort(date_times)
+    usage = rng.uniform(*usage_range, len(date_times))
+    # 隨機加入零用電與尖峰用電
+    usage[rng.random(len(date_times)) < 0.05] = 0.0
+    spikes = rng.random(len(date_times)) < 0.05
+    usage[spikes] = usage[spikes] * 3
+    return pd.DataFrame({
+        meter_usage_cols.time_col: pd.DatetimeIndex(date_times),
+        meter_usage_cols.usage_col: usage,
+    })
+
+
+def build_synthetic_raw_meter_data(seed,
+                                   days=SYNTHETIC_RAW_DAYS,
+                                   usage_range=SYNTHETIC_USAGE_RANGE,
+                                   meter_usage_cols: analyze_lib.
+                                   MeterUsageColumns = None):
+    """
+    產生原始電表欄位格式的合成數據 (需量 kW)，涵蓋各時段欄位只有單一數值、
+    數值相同、眾數同數量、整列缺值，以及儲冷空調與太陽光電超過用電的情況，
+    列順序打亂
+    :param seed: 亂數種子
+    :param days: 天數
+    :param usage_range: 每15分鐘的用電量範圍 (度)
+    :param meter_usage_cols: 用電欄位名稱
+    :return: 原始電表數據
+    """
+    meter_usage_cols = meter_usage_cols or analyze_lib.MeterUsageColumns()
+    rng = np.random.default_rng(seed)
+    date_times = pd.date_range("2024-05-14", periods=days * 96, freq="15min")
+    row_count = len(date_times)
+
+    def random_sum_values(demand):
+        col_count = len(analyze_lib.SUM_COLS)
+        values = np.full((row_count, col_count), np.nan)
+        pattern = rng.integers(0, 4, row_count)
+        rows = np.arange(row_count)
+        # 只有一個時段欄位有值
+        single = pattern == 0
+        values[rows[single], rng.integers(0, col_count, single.sum())] = (
+            demand[single])
+        # 所有時段欄位數值相同
+        values[pattern == 1] = demand[pattern == 1, None]
+        # 兩個數值各出現兩次，眾數同數量
+        tie = pattern == 2
+        values[tie] = np.column_stack(
+            (demand[tie], demand[tie], demand[tie] * 0.5, demand[tie] * 0.5))
+        # 整列缺值
+        return values
+
+    demand = rng.uniform(*usage_range, row_count) * 4
+    raw_data = pd.DataFrame(random_sum_values(demand),
+                            columns=analyze_lib.SUM_COLS)
+    raw_data[analyze_lib.COLD_STORAGE_COLS] = random_sum_values(demand * 0.3)
+    hours = date_times.hour.to_numpy() + date_times.minute.to_numpy() / 60
+    pv = np.clip(np.sin((hours - 6) / 12 * np.pi), 0, None) * rng.uniform(
+        0, usage_range[1] * 8, row_count)
+    pv[rng.random(row_count) < 0.05] = np.nan
+    raw_data[analyze_lib.PV_COL] = pv
+    raw_data[analyze_lib.DEFAULT_DROP_COLS] = 0
+    raw_data.insert(0, meter_usage_cols.time_col, date_times)
+    return raw_data.sample(frac=1.0, random_state=seed).reset_index(drop=True)
+
+
+def build_default_raw_contract(data, meter_usage_cols: analyze_lib.
+                               MeterUsageColumns):
+    """
+    沒有合約資料時，以最大用電需量作為原經常契約容量
+    :param data: 整理後的數據
+    :param meter_usage_cols: 用電欄位名稱
+    :return: 原合約容量
+    """
+    return {
+        ec_lib.UsageType.PEAK:
+        float(np.ceil(data[meter_usage_cols.usage_col].max() * 4)),
+        ec_lib.UsageType.SEMI_PEAK: 0.0,
+        ec_lib.UsageType.SATURDAY_SEMI_PEAK: 0.0,
+        ec_lib.UsageType.OFF_PEAK: 0.0,
+    }
+
+
+def _year_profit_values(yearly_profit, yearly_profit_cols):
+    return yearly_profit[[
+        yearly_profit_cols.charge_profit_col,
+        yearly_profit_cols.contract_profit_col,
+        yearly_profit_cols.dr_profit_col,
+        yearly_profit_cols.total_profit_col,
+        yearly_profit_cols.cumulative_profit_col,
+    ]].apply(pd.to_numeric)
+
+
+def _reference_monthly_basic_price(contract_volume: dict,
+                                   contract_price_dict: dict):
+    """
+    凍結的原始版本 cal_monthly_basic_price，五月與十月以夏月與非夏月各半計算，
+    作為比對基準，不隨 taipower_analyze_lib 修改
+    """
+    summer_price = analyze_lib.cal_basic_price(
+        contract_volume,
+        contract_price_dict.get(ec_lib.SeasonType.SUMMER),
+    )
+    non_summer_price = analyze_lib.cal_basic_price(
+        contract_volume,
+        contract_price_dict.get(ec_lib.SeasonType.NONSUMMER),
+    )
+    month_price_dict = {}
+    for i in range(1, 13):
+        if i in [5, 10]:
+            month_price_dict.update({
+                analyze_lib.MONTH_LIST[i - 1]:
+                (summer_price + non_summer_price) / 2
+            })
+        elif i in [6, 7, 8, 9]:
+            month_price_dict.update(
+                {analyze_lib.MONTH_LIST[i - 1]: summer_price})
+        else:
+            month_price_dict.update(
+                {analyze_lib.MONTH_LIST[i - 1]: non_summer_price})
+    return month_price_dict
+
+
+def _reference_demand(row):
+    # 原始逐筆版本: 只有一種數值時取該值，否則取眾數 (同數量時取最小值)
+    if row.isna().all():
+        return np.nan
+    return (row.dropna().unique()[0]
+            if row.nunique() == 1 else row.mode().iloc[0])
+
+
+def _reference_normalize_meter_data(raw_data, meter_usage_cols: analyze_lib.
+                                    MeterUsageColumns):
+    """
+    凍結的逐筆淨負載換算，以15分鐘間隔將場域用電加上儲冷用電再扣除太陽光電，
+    作為比對基準，不隨 normalize_meter_data 修改
+    :param raw_data: 原始電表數據
+    :param meter_usage_cols: 用電欄位名稱
+    :return: 依時間排序的淨負載欄位
+    """
+    cols = meter_usage_cols
+    cold_storage_cols = [
+        col for col in analyze_lib.COLD_STORAGE_COLS if col in raw_data.columns
+    ]
+    row_list = []
+    for _, row in raw_data.iterrows():
+        site_usage = _reference_demand(row[analyze_lib.SUM_COLS]) * 0.25
+        cold_storage = 0.0
+        if cold_storage_cols:
+            cold_storage = _reference_demand(row[cold_storage_cols])
+            cold_storage = 0.0 if pd.isna(cold_storage) else cold_storage * 0.25
+        pv = 0.0
+        if analyze_lib.PV_COL in raw_data.columns and not pd.isna(
+                row[analyze_lib.PV_COL]):
+            pv = row[analyze_lib.PV_COL] * 0.25
+        net_usage = site_usage + cold_storage - pv
+        row_list.append({
+            cols.time_col: pd.Timestamp(row[cols.time_col]),
+            cols.usage_col: net_usage if net_usage > 0 else
+            (np.nan if pd.isna(net_usage) else 0.0),
+            cols.site_usage_col: site_usage,
+            cols.cold_storage_col: cold_storage,
+            cols.pv_col: pv,
+            cols.pv_surplus_col: -net_usage if net_usage < 0 else 0.0,
+        })
+    return pd.DataFrame(row_list).sort_values(by=[cols.time_col],
+                                              kind="stable")
+
+
+def compare_normalization(raw_data,
+                          meter_usage_cols: analyze_lib.MeterUsageColumns = None
+                          ):
+    """
+    以凍結的逐筆淨負載換算作為參考，比對 normalize_meter_data 的結果與耗時
+    :param raw_data: 15分鐘間隔的原始電表數據
+    :param meter_usage_cols: 用電欄位名稱
+    :return: [(函式, 欄位, 筆數, 最大絕對誤差, 最大相對誤差, 參考耗時, 向量化耗時)]
+    """
+    cols = meter_usage_cols or analyze_lib.MeterUsageColumns()
+    value_cols = [
+        cols.usage_col,
+        cols.site_usage_col,
+        cols.cold_storage_col,
+        cols.pv_col,
+        cols.pv_surplus_col,
+    ]
+    reference, reference_seconds = _timed(_reference_normalize_meter_data,
+                                          raw_data, cols)
+    fast, fast_seconds = _timed(analyze_lib.normalize_meter_data,
+                                raw_data.copy(), cols)
+    fast = fast.sort_values(by=[cols.time_col], kind="stable")
+    result_list = []
+    for col in value_cols:
+        result_list.append(
+            ("normalize_meter_data", col, len(reference),
+             *cal_deviation(reference[col].to_numpy(), fast[col].to_numpy()),
+             reference_seconds, fast_seconds))
+    return result_list
+
+
+def compare_functions(
+    data,
+    raw_contract: dict,
+    analysis_params: analyze_lib.AnalysisParameters = None,
+    meter_usage_cols: analyze_lib.MeterUsageColumns = None,
+    elec_price_cols: analyze_lib.ElectricPriceColumns = None,
+    calendar_cols: analyze_lib.CalendarColumns = None,
+    yearly_profit_cols: analyze_lib.YearlyProfitColumns = None,
+):
+    """
+    以逐筆版本作為參考，比對向量化版本的結果與耗時。
+    逐筆版本使用模組的電池設定，只有合約與充放電類型取自 analysis_params
+    :param data: 依時間排序的整理後數據
+    :param raw_contract: 原合約容量
+    :param analysis_params: 分析參數
+    :return: [(函式, 欄位, 筆數, 最大絕對誤差, 最大相對誤差, 參考耗時, 向量化耗時)]
+    """
+    analysis_params = analysis_params or analyze_lib.AnalysisParameters()
+    cols = meter_usage_cols or analyze_lib.MeterUsageColumns()
+    elec_price_cols = elec_price_cols or analyze_lib.ElectricPriceColumns()
+    calendar_cols = calendar_cols or analyze_lib.CalendarColumns()
+    yearly_profit_cols = (yearly_profit_cols
+                          or analyze_lib.YearlyProfitColumns())
+    elec_params = analysis_params.build_electric_parameters()
+    elec_price_params = analysis_params.build_electric_price_parameters()
+    data = data.reset_index(drop=True)
+    date_times = data[cols.time_col]
+    result_list = []
+
+    def add_result(function_name, column_names, reference, fast,
+                   reference_seconds, fast_seconds):
+        reference = np.asarray(reference, dtype=float).reshape(
+            -1, len(column_names))
+        fast = np.asarray(fast, dtype=float).reshape(-1, len(column_names))
+        for i, column_name in enumerate(column_names):
+            result_list.append((function_name, column_name, len(reference),
+                                *cal_deviation(reference[:, i], fast[:, i]),
+                                reference_seconds, fast_seconds))
+
+    # 用電類型
+    def reference_usage_type():
+        return [[
+            ec_lib.USAGE_TYPE_LIST.index(
+                ec_lib.get_usage_type_from_dict(date_time, type_dict))
+            for type_dict in (elec_params.raw_elec_type_dict,
+                              elec_params.elec_type_dict)
+        ] for date_time in date_times]
+
+    def fast_usage_type():
+        features = analyze_lib.cal_calendar_features(data, cols,
+                                                     calendar_cols,
+                                                     elec_params)
+        return features[[
+            calendar_cols.raw_usage_type_col, calendar_cols.usage_type_col
+        ]].to_numpy()
+
+    reference, reference_seconds = _timed(reference_usage_type)
+    fast, fast_seconds = _timed(fast_usage_type)
+    add_result("cal_calendar_features", [
+        calendar_cols.raw_usage_type_col, calendar_cols.usage_type_col
+    ], reference, fast, reference_seconds, fast_seconds)
+
+    # 電池充放電
+    battery_cols = [
+        cols.battery_kw_col,
+        cols.battery_kwh_col,
+        cols.usage_with_battery_col,
+        cols.charge_kwh_col,
+        cols.release_kwh_col,
+    ]
+
+    def reference_battery_usage():
+        remain_battery_kw_list, battery_kwh_list = [], []
+        return [
+            analyze_lib.process_battery_usage(row, cols, elec_params,
+                                              remain_battery_kw_list,
+                                              battery_kwh_list)
+            for _, row in data.iterrows()
+        ]
+
+    def fast_battery_usage():
+        features = analyze_lib.cal_calendar_features(data, cols,
+                                                     calendar_cols,
+                                                     elec_params)
+        # 逐筆版本沒有太陽光電餘電充電，比較時關閉
+        return analyze_lib.process_battery_usage_vectorized(
+            data, features, cols, calendar_cols,
+            replace(analysis_params, absorb_pv_surplus=False))[0], features
+
+    reference, reference_seconds = _timed(reference_battery_usage)
+    (battery_data, features), fast_seconds = _timed(fast_battery_usage)
+    add_result("process_battery_usage", battery_cols, reference,
+               battery_data[battery_cols].to_numpy(), reference_seconds,
+               fast_seconds)
+
+    # 流動電價，兩者都以向量化的充放電結果為輸入
+    price_cols = [
+        elec_price_cols.elec_charge_price_col,
+        elec_price_cols.elec_charge_price_with_battery_col,
+    ]
+    reference, reference_seconds = _timed(lambda: [
+        analyze_lib.cal_elec_price(row, cols, elec_params, elec_price_params)
+        for _, row in battery_data.iterrows()
+    ])
+    fast, fast_seconds = _timed(lambda: np.column_stack(
+        analyze_lib.cal_elec_price_vectorized(battery_data, features, cols,
+                                              calendar_cols,
+                                              elec_price_params)))
+    add_result("cal_elec_price", price_cols, reference, fast,
+               reference_seconds, fast_seconds)
+    battery_data[price_cols[0]], battery_data[price_cols[1]] = fast.T
+
+    # 新合約容量
+    reference, reference_seconds = _timed(
+        lambda: analyze_lib.cal_new_contract_volume(
+            analyze_lib.filter_expensive_usage(battery_data, cols, elec_params
+                                               ),
+            analyze_lib.filter_nonexpensive_usage(battery_data, cols,
+                                                  elec_params),
+            cols,
+            analysis_params.contract_type,
+            raw_contract,
+        ))
+    fast, fast_seconds = _timed(
+        lambda: analyze_lib.cal_new_contract_volume_vectorized(
+            battery_data, features, cols, calendar_cols, analysis_params,
+            raw_contract))
+    add_result("cal_new_contract_volume",
+               [usage_type.value for usage_type in reference],
+               list(reference.values()),
+               [fast.get(usage_type, np.nan) for usage_type in reference],
+               reference_seconds, fast_seconds)
+
+    new_contract = fast
+
+    # 需量反應，逐筆版本使用模組的電池設定
+    dr_cols = [cols.dr_volume_col, elec_price_cols.demand_price_col]
+    reference, reference_seconds = _timed(analyze_lib.cal_hourly_dr_price,
+                                          battery_data, cols, elec_price_cols)
+    hourly_dr_data, fast_seconds = _timed(
+        analyze_lib.cal_hourly_dr_price_vectorized, battery_data, cols,
+        elec_price_cols, analysis_params)
+    add_result("cal_hourly_dr_price", dr_cols, reference[dr_cols].to_numpy(),
+               hourly_dr_data[dr_cols].to_numpy(), reference_seconds,
+               fast_seconds)
+
+    # 基本電費，以凍結的原始版本為參考
+    basic_price_list = [
+        (raw_contract, elec_price_params.raw_contract_price_dict),
+        (new_contract, elec_price_params.contract_price_dict),
+    ]
+    reference, reference_seconds = _timed(lambda: [
+        list(_reference_monthly_basic_price(*args).values())
+        for args in basic_price_list
+    ])
+    fast, fast_seconds = _timed(lambda: [
+        list(analyze_lib.cal_monthly_basic_price(*args).values())
+        for args in basic_price_list
+    ])
+    add_result("cal_monthly_basic_price", analyze_lib.MONTH_LIST, reference,
+               fast, reference_seconds, fast_seconds)
+    contract_monthly_basic_price, new_monthly_basic_price = [
+        analyze_lib.cal_monthly_basic_price(*args)
+        for args in basic_price_list
+    ]
+
+    # 年度效益，兩者都以相同的月度數據與基本電價為輸入
+    monthly_data = group_monthly_data(battery_data, hourly_dr_data, cols,
+                                      elec_price_cols)
+    reference, reference_seconds = _timed(
+        analyze_lib.cal_year_profit, monthly_data,
+        contract_monthly_basic_price, new_monthly_basic_price,
+        elec_price_cols, yearly_profit_cols)
+    fast, fast_seconds = _timed(analyze_lib.cal_year_profit_vectorized,
+                                monthly_data, contract_monthly_basic_price,
+                                new_monthly_basic_price, elec_price_cols,
+                                yearly_profit_cols, analysis_params)
+    reference = _year_profit_values(reference, yearly_profit_cols)
+    add_result("cal_year_profit", list(reference.columns),
+               reference.to_numpy(),
+               _year_profit_values(fast, yearly_profit_cols).to_numpy(),
+               reference_seconds, fast_seconds)
+    return result_list
+
+
+def list_meter_workbooks(data_folder=DATA_FOLDER):
+    """
+    列出資料夾內所有電表資料與對應的合約資料
+    :param data_folder: 資料夾
+    :return: [(電表編號, 電表資料路徑, 合約資料路徑或 None)]
+    """
+    workbook_list = []
+    for meter_path in sorted(
+            glob.glob(os.path.join(data_folder, "meter_*_data.xlsx"))):
+        meter_no = os.path.basename(meter_path)[len("meter_"):-len(
+            "_data.xlsx")]
+        contract_path = os.path.join(data_folder, f"info_{meter_no}_data.xlsx")
+        workbook_list.append(
+            (meter_no, meter_path,
+             contract_path if os.path.exists(contract_path) else None))
+    return workbook_list
+
+
+def run_equivalence_suite(
+    data_folder=DATA_FOLDER,
+    seeds=SYNTHETIC_SEEDS,
+    parameter_grid=None,
+    max_rows=None,
+    meter_usage_cols: analyze_lib.MeterUsageColumns = None,
+    equivalence_cols: EquivalenceColumns = None,
+):
+    """
+    對所有內建電表資料與合成數據執行逐筆/向量化版本比對
+    :param data_folder: 電表資料夾，None 表示只比對合成數據
+    :param seeds: 合成數據的亂數種子
+    :param parameter_grid: [(合約類型, 充放電類型)]，預設為所有組合
+    :param max_rows: 每份電表資料最多比對的列數，None 表示全部
+    :return: 比對報表
+    """
+    cols = meter_usage_cols or analyze_lib.MeterUsageColumns()
+    equivalence_cols = equivalence_cols or EquivalenceColumns()
+    parameter_grid = parameter_grid or PARAMETER_GRID
+
+    source_list = []
+    raw_source_list = []
+    if data_folder is not None:
+        for meter_no, meter_path, contract_path in list_meter_workbooks(
+                data_folder):
+            raw_data = pd.read_excel(meter_path)
+            data = analyze_lib.load_meter_data(meter_path, cols)
+            if max_rows is not None:
+                raw_data = raw_data.iloc[:max_rows]
+                data = data.iloc[:max_rows]
+            raw_contract = (analyze_lib.load_meter_contract(contract_path)
+                            if contract_path else
+                            build_default_raw_contract(data, cols))
+            source_list.append((f"meter_{meter_no}", data, raw_contract))
+            raw_source_list.append((f"meter_{meter_no}", raw_data))
+    for seed in seeds:
+        data = build_synthetic_meter_data(seed, meter_usage_cols=cols)
+        source_list.append((f"synthetic_{seed}", data,
+                            build_default_raw_contract(data, cols)))
+        raw_source_list.append(
+            (f"synthetic_raw_{seed}",
+             build_synthetic_raw_meter_data(seed, meter_usage_cols=cols)))
+
+    row_list = []
+    # 淨負載換算與合約/充放電類型無關，每份數據只比對一次
+    for source, raw_data in raw_source_list:
+        for result in compare_normalization(raw_data, cols):
+            row_list.append((source, "-", *result))
+    for source, data, raw_contract in source_list:
+        for contract_type, release_type in parameter_grid:
+            analysis_params = analyze_lib.AnalysisParameters(
+                contract_type=contract_type,
+                release_type=release_type,
+                charge_type=ec_lib.ChargeType(release_type.value),
+            )
+            for result in compare_functions(data, raw_contract,
+                                            analysis_params, cols):
+                row_list.append(
+                    (source, f"{contract_type.value}/{release_type.value}",
+                     *result))
+    report = pd.DataFrame(row_list,
+                          columns=[
+                              equivalence_cols.source_col,
+                              equivalence_cols.params_col,
+                              equivalence_cols.function_col,
+                              equivalence_cols.column_col,
+                              equivalence_cols.rows_col,
+                              equivalence_cols.max_abs_col,
+                              equivalence_cols.max_rel_col,
+                              equivalence_cols.reference_seconds_col,
+                              equivalence_cols.fast_seconds_col,
+                          ])
+    report[equivalence_cols.speedup_col] = (
+        report[equivalence_cols.reference_seconds_col] /
+        report[equivalence_cols.fast_seconds_col])
+    return report
+
+
+def summarize_equivalence(report,
+                          equivalence_cols: EquivalenceColumns = None):
+    """
+    彙整每個函式/欄位的最大誤差與每個函式的整體加速倍數
+    :param report: run_equivalence_suite 的結果
+    :return: (欄位誤差表, 函式加速表)
+    """
+    equivalence_cols = equivalence_cols or EquivalenceColumns()
+    deviation = report.groupby(
+        [equivalence_cols.function_col, equivalence_cols.column_col],
+        sort=False)[[
+            equivalence_cols.max_abs_col, equivalence_cols.max_rel_col
+        ]].max()
+    # 同一函式的每個欄位共用同一次計時，只取一次
+    timing = report.drop_duplicates([
+        equivalence_cols.source_col, equivalence_cols.params_col,
+        equivalence_cols.function_col
+    ]).groupby(equivalence_cols.function_col, sort=False)[[
+        equivalence_cols.rows_col,
+        equivalence_cols.reference_seconds_col,
+        equivalence_cols.fast_seconds_col,
+    ]].sum()
+    timing[equivalence_cols.speedup_col] = (
+        timing[equivalence_cols.reference_seconds_col] /
+        timing[equivalence_cols.fast_seconds_col])
+    return deviation, timing
+
+
+def find_deviations(report,
+                    abs_tolerance=1e-6,
+                    rel_tolerance=1e-9,
+                    equivalence_cols: EquivalenceColumns = None):
+    """
+    找出超過容許誤差的比對結果，絕對或相對誤差其中之一在範圍內即視為相同
+    :param report: run_equivalence_suite 的結果
+    :param abs_tolerance: 容許絕對誤差
+    :param rel_tolerance: 容許相對誤差
+    :return: 超出容許誤差的列
+    """
+    equivalence_cols = equivalence_cols or EquivalenceColumns()
+    return report[(report[equivalence_cols.max_abs_col] > abs_tolerance)
+                  & (report[equivalence_cols.max_rel_col] > rel_tolerance)]
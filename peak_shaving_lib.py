@@ -0,0 +1,320 @@
+from dataclasses import dataclass
+import time
+import numpy as np
+import pandas as pd
+import electricity_lib as ec_lib
+import taipower_analyze_lib as analyze_lib
+
+# 預設搜尋目標需量的用電類型，依序搜尋 (先決定尖峰，再決定半尖峰)
+SHAVING_USAGE_TYPES = (ec_lib.UsageType.PEAK, ec_lib.UsageType.SEMI_PEAK)
+# 二分搜尋的目標需量精度 (kW)
+TARGET_TOLERANCE_KW = 0.1
+# 比較電量/功率時的容許誤差
+FEASIBILITY_EPSILON = 1e-6
+
+
+@dataclass
+class PeakShavingColumns:
+    season_col: str = "季節"
+    usage_type_col: str = "用電類型"
+    raw_max_kw_col: str = "原最大需量"
+    target_kw_col: str = "目標需量"
+    max_kw_col: str = "削峰後最大需量"
+    reduced_kw_col: str = "削減需量"
+    search_seconds_col: str = "搜尋秒數"
+
+
+def target_dict_to_matrix(target_kw: dict):
+    """
+    將目標需量字典轉為 (季節, 用電類型) 矩陣，未指定的類型為 inf (不削峰)
+    :param target_kw: {用電類型: kW} (兩季相同) 或 {季節: {用電類型: kW}}
+    :return: 目標需量矩陣
+    """
+    if target_kw and all(
+            isinstance(key, ec_lib.UsageType) for key in target_kw):
+        target_kw = {season: target_kw for season in ec_lib.SEASON_TYPE_LIST}
+    matrix = ec_lib.price_dict_to_matrix(target_kw or {})
+    return np.where(np.isnan(matrix), np.inf, matrix)
+
+
+def target_matrix_to_dict(target_matrix):
+    """
+    將目標需量矩陣轉回 {季節: {用電類型: kW}}，只保留有設定的類型
+    """
+    return {
+        season: {
+            usage_type: float(target_matrix[i, j])
+            for j, usage_type in enumerate(ec_lib.USAGE_TYPE_LIST)
+            if np.isfinite(target_matrix[i, j])
+        }
+        for i, season in enumerate(ec_lib.SEASON_TYPE_LIST)
+    }
+
+
+def cal_peak_shaving_power(usage_kwh,
+                           season_codes,
+                           usage_type_codes,
+                           target_matrix,
+                           battery_kw,
+                           interval_hours=analyze_lib.INTERVAL_HOURS):
+    """
+    計算削峰模式的充/放電功率: 需量 (每期用電量 / 每期時數) 超過目標的部分放電，
+    離峰時段在不超過離峰目標的範圍內充電
+    :param usage_kwh: 每期用電量 (T,)
+    :param season_codes: 季節編碼 (T,)
+    :param usage_type_codes: 新合約用電類型編碼 (T,)
+    :param target_matrix: 目標需量矩陣 (2, 4) 或多組候選 (K, 2, 4)
+    :param battery_kw: 電池功率
+    :param interval_hours: 資料間隔 (小時)
+    :return: (充電功率, 放電功率)，單組為 (T,)，多組為 (T, K)
+    """
+    target_matrix = np.asarray(target_matrix, dtype=float)
+    demand_kw = np.asarray(usage_kwh, dtype=float) / interval_hours
+    if target_matrix.ndim == 3:
+        target_kw = target_matrix[:, season_codes, usage_type_codes].T
+        demand_kw = demand_kw[:, None]
+    else:
+        target_kw = target_matrix[season_codes, usage_type_codes]
+    is_off_peak = usage_type_codes == ec_lib.USAGE_TYPE_LIST.index(
+        ec_lib.UsageType.OFF_PEAK)
+    if target_kw.ndim == 2:
+        is_off_peak = is_off_peak[:, None]
+    release_kw = np.maximum(demand_kw - target_kw, 0.0)
+    charge_kw = np.where(is_off_peak,
+                         np.clip(target_kw - demand_kw, 0.0, battery_kw), 0.0)
+    return charge_kw, release_kw
+
+
+def _day_starts(date_times):
+    days = pd.DatetimeIndex(date_times).normalize().to_numpy()
+    return np.flatnonzero(np.r_[True, days[1:] != days[:-1]])
+
+
+def check_target_feasibility(usage_kwh,
+                             season_codes,
+                             usage_type_codes,
+                             day_starts,
+                             target_matrix,
+                             battery_kwh,
+                             battery_kw,
+                             battery_dod=analyze_lib.BATTERY_DOD,
+                             interval_hours=analyze_lib.INTERVAL_HOURS):
+    """
+    向量化檢查每天能否維持目標需量。電池由滿電開始，離峰儘量充電，
+    距離滿電的缺額為 D_t = max(0, D_{t-1} + 放電量 - 充電量)，
+    即累積和減去累積最小值，不需逐筆推進
+    :param usage_kwh: 每期用電量 (T,)
+    :param season_codes: 季節編碼 (T,)
+    :param usage_type_codes: 新合約用電類型編碼 (T,)
+    :param day_starts: 每天第一筆的位置
+    :param target_matrix: 目標需量矩陣 (2, 4) 或多組候選 (K, 2, 4)
+    :param interval_hours: 資料間隔 (小時)
+    :return: 每天是否可行，單組為 (D,)，多組為 (D, K)
+    """
+    charge_kw, release_kw = cal_peak_shaving_power(usage_kwh, season_codes,
+                                                   usage_type_codes,
+                                                   target_matrix, battery_kw,
+                                                   interval_hours)
+    cumulative = np.cumsum((release_kw - charge_kw) * interval_hours, axis=0)
+    deficit = cumulative - np.minimum(
+        np.minimum.accumulate(cumulative, axis=0), 0.0)
+    return ((np.maximum.reduceat(deficit, day_starts, axis=0) <=
+             battery_kwh * (1 - battery_dod) + FEASIBILITY_EPSILON)
+            & (np.maximum.reduceat(release_kw, day_starts, axis=0) <=
+               battery_kw + FEASIBILITY_EPSILON))
+
+
+def find_min_peak_targets(
+    data,
+    calendar_features,
+    meter_usage_cols: analyze_lib.MeterUsageColumns,
+    calendar_cols: analyze_lib.CalendarColumns,
+    analysis_params: analyze_lib.AnalysisParameters,
+    usage_types=SHAVING_USAGE_TYPES,
+    target_kw: dict = None,
+    keep_off_peak_max=True,
+    tolerance_kw=TARGET_TOLERANCE_KW,
+):
+    """
+    以二分搜尋找出每個季節/用電類型可維持的最低目標需量，
+    每次只需一次向量化的可行性檢查
+    :param data: 整理後的數據
+    :param calendar_features: cal_calendar_features 的結果
+    :param analysis_params: 分析參數 (電池容量、功率、放電深度)
+    :param usage_types: 依序搜尋的用電類型
+    :param target_kw: 其他用電類型的固定目標需量，例如離峰充電上限
+    :param keep_off_peak_max: 未指定離峰目標時，充電不超過各季原本的離峰最大需量
+    :param tolerance_kw: 目標需量精度
+    :return: (目標需量矩陣, 各季節/用電類型的搜尋秒數矩陣)
+    """
+    usage_kwh = data[meter_usage_cols.usage_col].to_numpy(dtype=float)
+    season_codes = calendar_features[calendar_cols.season_col].to_numpy()
+    usage_type_codes = calendar_features[
+        calendar_cols.usage_type_col].to_numpy()
+    day_starts = _day_starts(data[meter_usage_cols.time_col])
+    battery_kwh = analysis_params.battery_kwh
+    battery_kw = analysis_params.battery_kw
+    interval_hours = analyze_lib.get_interval_hours(data, meter_usage_cols)
+    demand_kw = usage_kwh / interval_hours
+
+    target_matrix = target_dict_to_matrix(target_kw)
+    off_peak_code = ec_lib.USAGE_TYPE_LIST.index(ec_lib.UsageType.OFF_PEAK)
+    if keep_off_peak_max:
+        for season_code in range(len(ec_lib.SEASON_TYPE_LIST)):
+            mask = (season_codes == season_code) & (usage_type_codes
+                                                    == off_peak_code)
+            if mask.any() and np.isinf(target_matrix[season_code,
+                                                     off_peak_code]):
+                target_matrix[season_code,
+                              off_peak_code] = demand_kw[mask].max()
+    search_seconds = np.zeros(target_matrix.shape)
+    for season_code in range(len(ec_lib.SEASON_TYPE_LIST)):
+        for usage_type in usage_types:
+            start = time.perf_counter()
+            usage_code = ec_lib.USAGE_TYPE_LIST.index(usage_type)
+            mask = (season_codes == season_code) & (usage_type_codes
+                                                    == usage_code)
+            if not mask.any():
+                continue
+            # 最大需量一定可行，低於 (最大需量 - 電池功率) 一定不可行
+            high = demand_kw[mask].max()
+            low = max(high - battery_kw, 0.0)
+
+            def is_feasible(target):
+                candidate = target_matrix.copy()
+                candidate[season_code, usage_code] = target
+                return check_target_feasibility(
+                    usage_kwh, season_codes, usage_type_codes, day_starts,
+                    candidate, battery_kwh, battery_kw,
+                    analysis_params.battery_dod, interval_hours).all()
+
+            if is_feasible(low):
+                high = low
+            while high - low > tolerance_kw:
+                middle = (low + high) / 2
+                if is_feasible(middle):
+                    high = middle
+                else:
+                    low = middle
+            target_matrix[season_code, usage_code] = high
+            search_seconds[season_code,
+                           usage_code] = time.perf_counter() - start
+    return target_matrix, search_seconds
+
+
+def process_peak_shaving_vectorized(
+    data,
+    calendar_features,
+    meter_usage_cols: analyze_lib.MeterUsageColumns,
+    calendar_cols: analyze_lib.CalendarColumns,
+    analysis_params: analyze_lib.AnalysisParameters,
+    target_kw,
+    initial_state: analyze_lib.BatteryState = None,
+):
+    """
+    削峰模式的充放電模擬，輸出欄位與 process_battery_usage_vectorized 相同，
+    可直接接續電價、需量反應與合約容量計算
+    :param data: 整理後的數據
+    :param calendar_features: cal_calendar_features 的結果
+    :param analysis_params: 分析參數
+    :param target_kw: 目標需量字典 (見 target_dict_to_matrix) 或矩陣
+    :param initial_state: 前一批次結束時的電池狀態，預設為滿電
+    :return: (增加充放電欄位後的數據, 電池狀態)
+    """
+    target_matrix = (target_dict_to_matrix(target_kw) if isinstance(
+        target_kw, dict) else np.asarray(target_kw, dtype=float))
+    if initial_state is None:
+        initial_state = analyze_lib.BatteryState(
+            battery_kwh=analysis_params.battery_kwh)
+    usage_kwh = data[meter_usage_cols.usage_col].to_numpy(dtype=float)
+    interval_hours = analyze_lib.get_interval_hours(data, meter_usage_cols)
+    charge_kw, release_kw = cal_peak_shaving_power(
+        usage_kwh,
+        calendar_features[calendar_cols.season_col].to_numpy(),
+        calendar_features[calendar_cols.usage_type_col].to_numpy(),
+        target_matrix,
+        analysis_params.battery_kw,
+        interval_hours,
+    )
+    # 放電量以需量反應事件的方式指定，只放出超過目標的部分，不累積未放出的功率
+    (*columns, final_state) = analyze_lib.simulate_battery_dispatch(
+        usage_kwh,
+        charge_kw,
+        np.zeros(len(usage_kwh)),
+        analysis_params.battery_kwh,
+        analysis_params.battery_kw,
+        analysis_params.battery_dod,
+        analysis_params.charge_loss,
+        initial_state,
+        event_kw=release_kw,
+        surplus_kwh=analyze_lib.get_surplus_kwh(data, meter_usage_cols,
+                                                analysis_params),
+        interval_hours=interval_hours,
+    )
+    data = data.copy(deep=False)
+    for col, values in zip(
+        [
+            meter_usage_cols.battery_kw_col,
+            meter_usage_cols.battery_kwh_col,
+            meter_usage_cols.usage_with_battery_col,
+            meter_usage_cols.charge_kwh_col,
+            meter_usage_cols.release_kwh_col,
+        ],
+            columns,
+    ):
+        data[col] = values
+    analyze_lib.add_pv_charge_kwh(data, meter_usage_cols, interval_hours)
+    return data, final_state
+
+
+def build_peak_target_table(
+    battery_data,
+    calendar_features,
+    target_matrix,
+    meter_usage_cols: analyze_lib.MeterUsageColumns,
+    calendar_cols: analyze_lib.CalendarColumns,
+    search_seconds=None,
+    peak_shaving_cols: PeakShavingColumns = None,
+):
+    """
+    整理每個季節/用電類型的原最大需量、目標需量與削峰後最大需量
+    :param battery_data: process_peak_shaving_vectorized 的結果
+    :param target_matrix: 目標需量矩陣
+    :param search_seconds: find_min_peak_targets 的搜尋秒數矩陣
+    :return: 目標需量表
+    """
+    peak_shaving_cols = peak_shaving_cols or PeakShavingColumns()
+    season_codes = calendar_features[calendar_cols.season_col].to_numpy()
+    usage_type_codes = calendar_features[
+        calendar_cols.usage_type_col].to_numpy()
+    interval_hours = analyze_lib.get_interval_hours(battery_data,
+                                                    meter_usage_cols)
+    raw_kw = battery_data[
+        meter_usage_cols.usage_col].to_numpy() / interval_hours
+    new_kw = battery_data[
+        meter_usage_cols.usage_with_battery_col].to_numpy() / interval_hours
+    row_list = []
+    for i, season in enumerate(ec_lib.SEASON_TYPE_LIST):
+        for j, usage_type in enumerate(ec_lib.USAGE_TYPE_LIST):
+            mask = (season_codes == i) & (usage_type_codes == j)
+            if not mask.any():
+                continue
+            target = target_matrix[i, j]
+            row_list.append({
+                peak_shaving_cols.season_col:
+                season.value,
+                peak_shaving_cols.usage_type_col:
+                usage_type.value,
+                peak_shaving_cols.raw_max_kw_col:
+                raw_kw[mask].max(),
+                peak_shaving_cols.target_kw_col:
+                target if np.isfinite(target) else np.nan,
+                peak_shaving_cols.max_kw_col:
+                new_kw[mask].max(),
+                peak_shaving_cols.reduced_kw_col:
+                raw_kw[mask].max() - new_kw[mask].max(),
+                peak_shaving_cols.search_seconds_col:
+                (search_seconds[i, j] if search_seconds is not None else
+                 np.nan),
+            })
+    return pd.DataFrame(row_list)
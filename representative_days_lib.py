@@ -0,0 +1,570 @@
+from dataclasses import dataclass, field, replace
+import time
+import numpy as np
+import pandas as pd
+import electricity_lib as ec_lib
+import taipower_analyze_lib as analyze_lib
+
+# 每個季節/日期類型的代表日數量
+REPRESENTATIVE_DAY_COUNT = 4
+# k-means 設定
+KMEANS_MAX_ITER = 100
+KMEANS_SEED = 0
+# 代表日前一併模擬的天數，以及重複模擬窗口的次數 (以前一次的結束狀態為起點)
+WARMUP_DAYS = 3
+WARMUP_PASSES = 1
+
+
+@dataclass
+class RepresentativeDayColumns:
+    day_col: str = "代表日"
+    day_index_col: str = "日序"
+    season_col: str = "季節"
+    day_type_col: str = "日期類型"
+    weight_col: str = "權重"
+
+
+@dataclass
+class SizingColumns:
+    device_number_col: str = "設備台數"
+    metric_col: str = "項目"
+    full_col: str = "完整模擬"
+    approx_col: str = "代表日估算"
+    abs_error_col: str = "絕對誤差"
+    rel_error_col: str = "相對誤差"
+
+
+@dataclass
+class DailyProfiles:
+    """
+    每日各時段的用電量與日曆特徵，只有資料完整的日期才會被分群
+    """
+    days: pd.DatetimeIndex
+    profiles: np.ndarray
+    features: dict = field(default_factory=dict)
+    is_complete: np.ndarray = None
+    row_count: int = 0
+    surplus: np.ndarray = None
+    interval_hours: float = analyze_lib.INTERVAL_HOURS
+
+    @property
+    def intervals_per_day(self):
+        return self.profiles.shape[1]
+
+
+def build_daily_profiles(data,
+                         calendar_features,
+                         meter_usage_cols: analyze_lib.MeterUsageColumns,
+                         calendar_cols: analyze_lib.CalendarColumns,
+                         surplus_kwh=None,
+                         interval_hours=None):
+    """
+    將數據轉為 (日, 每日筆數) 的每日用電曲線與日曆特徵
+    :param data: 整理後的數據
+    :param calendar_features: cal_calendar_features 的結果
+    :param surplus_kwh: analyze_lib.get_surplus_kwh 的結果，None 表示沒有餘電
+    :param interval_hours: 資料間隔 (小時)，None 表示由時間欄位判斷
+    :return: 每日用電曲線
+    """
+    if interval_hours is None:
+        interval_hours = analyze_lib.get_interval_hours(
+            data, meter_usage_cols)
+    interval = pd.Timedelta(hours=interval_hours)
+    if pd.Timedelta(hours=1) % interval != pd.Timedelta(0):
+        raise ValueError(f"資料間隔需能整除一小時才能建立每日用電曲線: {interval}")
+    intervals_per_day = pd.Timedelta(days=1) // interval
+    date_times = pd.DatetimeIndex(data[meter_usage_cols.time_col])
+    days, day_index = np.unique(date_times.normalize().to_numpy(),
+                                return_inverse=True)
+    day_index = day_index.reshape(-1)
+    time_of_day = (date_times - date_times.normalize()).to_numpy()
+    on_grid = time_of_day % interval.to_timedelta64() == np.timedelta64(0)
+    slot = time_of_day // interval.to_timedelta64()
+
+    def pivot(values, fill_value=np.nan):
+        result = np.full((len(days), intervals_per_day), fill_value)
+        result[day_index[on_grid], slot[on_grid]] = np.asarray(values)[on_grid]
+        return result
+
+    profiles = pivot(data[meter_usage_cols.usage_col].to_numpy(dtype=float))
+    features = {
+        col: pivot(calendar_features[col].to_numpy(), 0)
+        for col in calendar_features.columns
+    }
+    return DailyProfiles(
+        days=pd.DatetimeIndex(days),
+        profiles=profiles,
+        features=features,
+        is_complete=~np.isnan(profiles).any(axis=1),
+        row_count=len(data),
+        surplus=None if surplus_kwh is None else pivot(surplus_kwh, 0.0),
+        interval_hours=interval_hours,
+    )
+
+
+def kmeans(points, k, seed=KMEANS_SEED, max_iter=KMEANS_MAX_ITER):
+    """
+    NumPy 版 k-means (k-means++ 初始化)
+    :param points: 資料點 (N, D)
+    :param k: 群數，超過資料點數時取資料點數
+    :param seed: 亂數種子
+    :param max_iter: 最大迭代次數
+    :return: (群中心 (k, D), 每點所屬群 (N,))
+    """
+    rng = np.random.default_rng(seed)
+    points = np.asarray(points, dtype=float)
+    k = min(k, len(points))
+    centers = points[[rng.integers(len(points))]]
+    for _ in range(1, k):
+        distance = ((points[:, None, :] - centers[None, :, :])**2).sum(
+            axis=2).min(axis=1)
+        if distance.sum() == 0:
+            break
+        centers = np.vstack(
+            (centers, points[rng.choice(len(points),
+                                        p=distance / distance.sum())]))
+    for _ in range(max_iter):
+        labels = ((points[:, None, :] - centers[None, :, :])**2).sum(
+            axis=2).argmin(axis=1)
+        counts = np.bincount(labels, minlength=len(centers))
+        sums = np.zeros_like(centers)
+        np.add.at(sums, labels, points)
+        new_centers = centers.copy()
+        # 空的群維持原中心
+        new_centers[counts > 0] = sums[counts > 0] / counts[counts > 0, None]
+        if np.allclose(new_centers, centers):
+            break
+        centers = new_centers
+    labels = ((points[:, None, :] - centers[None, :, :])**2).sum(
+        axis=2).argmin(axis=1)
+    return centers, labels
+
+
+def select_representative_days(
+    daily_profiles: DailyProfiles,
+    calendar_cols: analyze_lib.CalendarColumns,
+    k=REPRESENTATIVE_DAY_COUNT,
+    include_peak_day=True,
+    seed=KMEANS_SEED,
+    representative_cols: RepresentativeDayColumns = None,
+):
+    """
+    依季節/日期類型分組，以 k-means 分群後取最接近群中心的實際日期為代表日，
+    權重為群內日數並換算為整段數據的筆數
+    :param daily_profiles: build_daily_profiles 的結果
+    :param k: 每組代表日數量
+    :param include_peak_day: 是否將每組最大需量的日期獨立為一群，以保留契約容量的尖峰
+    :param seed: 亂數種子
+    :return: 代表日表
+    """
+    representative_cols = representative_cols or RepresentativeDayColumns()
+    season_codes = daily_profiles.features[calendar_cols.season_col][:, 0]
+    day_type_codes = daily_profiles.features[calendar_cols.day_type_col][:, 0]
+    complete_days = np.flatnonzero(daily_profiles.is_complete)
+    if len(complete_days) == 0:
+        raise ValueError("沒有資料完整的日期，無法選取代表日")
+    row_list = []
+    for season_code in np.unique(season_codes[complete_days]):
+        for day_type_code in np.unique(day_type_codes[complete_days]):
+            group = complete_days[(season_codes[complete_days] == season_code)
+                                  & (day_type_codes[complete_days]
+                                     == day_type_code)]
+            if len(group) == 0:
+                continue
+            if include_peak_day:
+                peak_day = group[daily_profiles.profiles[group].max(
+                    axis=1).argmax()]
+                row_list.append((peak_day, season_code, day_type_code, 1))
+                group = group[group != peak_day]
+            if len(group) == 0:
+                continue
+            centers, labels = kmeans(daily_profiles.profiles[group], k, seed)
+            for label, center in enumerate(centers):
+                members = group[labels == label]
+                if len(members) == 0:
+                    continue
+                medoid = members[((daily_profiles.profiles[members] -
+                                   center)**2).sum(axis=1).argmin()]
+                row_list.append(
+                    (medoid, season_code, day_type_code, len(members)))
+    result = pd.DataFrame(row_list,
+                          columns=[
+                              representative_cols.day_index_col,
+                              representative_cols.season_col,
+                              representative_cols.day_type_col,
+                              representative_cols.weight_col,
+                          ])
+    result.insert(0, representative_cols.day_col,
+                  daily_profiles.days[result[
+                      representative_cols.day_index_col]])
+    # 不完整的日期以筆數比例分攤到各代表日
+    result[representative_cols.weight_col] = result[
+        representative_cols.weight_col] * (daily_profiles.row_count / (
+            daily_profiles.intervals_per_day * len(complete_days)))
+    return result.sort_values(representative_cols.day_col,
+                              ignore_index=True)
+
+
+def _masked_max(values, mask):
+    masked = np.where(mask, values, -np.inf).max(axis=0)
+    return np.where(np.isinf(masked), np.nan, masked)
+
+
+def build_sizing_table(device_numbers, charge_profit, contract_profit,
+                       dr_profit, analysis_params: analyze_lib.
+                       AnalysisParameters,
+                       yearly_profit_cols: analyze_lib.YearlyProfitColumns,
+                       sizing_cols: SizingColumns):
+    """
+    建立每種設備台數的第一年效益與 20 年累計效益
+    :return: 設備台數效益表
+    """
+    device_numbers = np.asarray(device_numbers)
+    decay_factors = analyze_lib.cal_decay_factors(analysis_params.battery_decay)
+    building_cost = -(analyze_lib.DEVICE_KWH * device_numbers *
+                      analysis_params.kwh_price)
+    total_profit = charge_profit + contract_profit + dr_profit
+    return pd.DataFrame({
+        sizing_cols.device_number_col:
+        device_numbers,
+        yearly_profit_cols.charge_profit_col:
+        charge_profit,
+        yearly_profit_cols.contract_profit_col:
+        contract_profit,
+        yearly_profit_cols.dr_profit_col:
+        dr_profit,
+        yearly_profit_cols.total_profit_col:
+        total_profit,
+        yearly_profit_cols.cumulative_profit_col:
+        building_cost + (charge_profit + dr_profit) * decay_factors.sum() +
+        contract_profit * len(decay_factors),
+    })
+
+
+def _contract_profit(max_peak, max_semi_peak, max_nonexpensive,
+                     raw_contract, analysis_params, elec_price_params,
+                     interval_hours):
+    if analysis_params.contract_type == ec_lib.ContractType.HIGH_PRESSURE_BATCH:
+        max_semi_peak = 0.0
+    new_contract_volume = analyze_lib.cal_new_contract_volume_from_max(
+        max_peak,
+        max_semi_peak,
+        max_nonexpensive,
+        analysis_params.contract_type,
+        raw_contract,
+        analysis_params.new_contract_buffer,
+        interval_hours,
+    )
+    contract_monthly_basic_price = analyze_lib.cal_monthly_basic_price(
+        raw_contract, elec_price_params.raw_contract_price_dict)
+    new_monthly_basic_price = analyze_lib.cal_monthly_basic_price(
+        new_contract_volume, elec_price_params.contract_price_dict)
+    return sum(contract_monthly_basic_price[key] -
+               new_monthly_basic_price[key]
+               for key in contract_monthly_basic_price)
+
+
+def simulate_representative_days(
+    data,
+    calendar_features,
+    raw_contract: dict,
+    analysis_params: analyze_lib.AnalysisParameters = None,
+    device_numbers=None,
+    k=REPRESENTATIVE_DAY_COUNT,
+    include_peak_day=True,
+    seed=KMEANS_SEED,
+    meter_usage_cols: analyze_lib.MeterUsageColumns = None,
+    calendar_cols: analyze_lib.CalendarColumns = None,
+    yearly_profit_cols: analyze_lib.YearlyProfitColumns = None,
+    representative_cols: RepresentativeDayColumns = None,
+    sizing_cols: SizingColumns = None,
+):
+    """
+    只模擬代表日估算各設備台數的效益，代表日 × 設備台數作為狀態引擎的批次維度，
+    每個代表日連同前 WARMUP_DAYS 天重複模擬，以前一次的結束狀態作為下一次的起點，
+    只取最後一次模擬中代表日當天的結果
+    :param data: 整理後的數據
+    :param calendar_features: cal_calendar_features 的結果
+    :param raw_contract: 原合約容量
+    :param analysis_params: 分析參數
+    :param device_numbers: 設備台數列表，預設為 analysis_params.device_number
+    :param k: 每個季節/日期類型的代表日數量
+    :param include_peak_day: 是否保留每組最大需量的日期
+    :param seed: 亂數種子
+    :return: (設備台數效益表, 代表日表)
+    """
+    analysis_params = analysis_params or analyze_lib.AnalysisParameters()
+    cols = meter_usage_cols or analyze_lib.MeterUsageColumns()
+    calendar_cols = calendar_cols or analyze_lib.CalendarColumns()
+    yearly_profit_cols = (yearly_profit_cols
+                          or analyze_lib.YearlyProfitColumns())
+    representative_cols = representative_cols or RepresentativeDayColumns()
+    sizing_cols = sizing_cols or SizingColumns()
+    if device_numbers is None:
+        device_numbers = [analysis_params.device_number]
+    elec_price_params = analysis_params.build_electric_price_parameters()
+
+    daily_profiles = build_daily_profiles(
+        data, calendar_features, cols, calendar_cols,
+        analyze_lib.get_surplus_kwh(data, cols, analysis_params))
+    representative_days = select_representative_days(
+        daily_profiles, calendar_cols, k, include_peak_day, seed,
+        representative_cols)
+    interval_hours = daily_profiles.interval_hours
+    steps = daily_profiles.intervals_per_day
+    day_index = representative_days[
+        representative_cols.day_index_col].to_numpy()
+    weights = representative_days[representative_cols.weight_col].to_numpy()
+    day_count, size_count = len(day_index), len(device_numbers)
+    day_features = pd.DataFrame({
+        col: values[day_index].reshape(-1)
+        for col, values in daily_profiles.features.items()
+    })
+
+    def to_batch(values, steps=steps):
+        # (代表日 × steps, 設備台數) -> (steps, 代表日 × 設備台數)
+        values = np.asarray(values).reshape(day_count, steps, -1)
+        values = np.broadcast_to(values, (day_count, steps, size_count))
+        return values.transpose(1, 0, 2).reshape(steps, -1)
+
+    # 代表日與前 WARMUP_DAYS 天組成模擬窗口，假日才能沿用前一個工作日的電池狀態
+    window_index = np.clip(
+        day_index[:, None] + np.arange(-WARMUP_DAYS, 1), 0, None).reshape(-1)
+    window_steps = (WARMUP_DAYS + 1) * steps
+    window_features = pd.DataFrame({
+        col: values[window_index].reshape(-1)
+        for col, values in daily_profiles.features.items()
+    })
+    device_array = np.asarray(device_numbers, dtype=float)
+    battery_kwh = (analyze_lib.DEVICE_KWH * device_array *
+                   analysis_params.battery_buffer)
+    battery_kw = (analyze_lib.DEVICE_KW * device_array *
+                  analysis_params.battery_buffer)
+    charge_kw, release_kw = analyze_lib.cal_default_power_vectorized(
+        window_features, calendar_cols, analysis_params, battery_kwh,
+        battery_kw)
+    charge_kw = to_batch(charge_kw, window_steps)
+    release_kw = to_batch(release_kw, window_steps)
+    # 窗口內資料不完整的時段視為不用電
+    usage = to_batch(
+        np.nan_to_num(daily_profiles.profiles[window_index]).reshape(-1),
+        window_steps)
+    surplus = (None if daily_profiles.surplus is None else to_batch(
+        daily_profiles.surplus[window_index].reshape(-1), window_steps))
+    batch_kwh = np.tile(battery_kwh, day_count)
+    batch_kw = np.tile(battery_kw, day_count)
+
+    state = None
+    for _ in range(WARMUP_PASSES + 1):
+        (*columns, state) = analyze_lib.simulate_battery_dispatch(
+            usage,
+            charge_kw,
+            release_kw,
+            batch_kwh,
+            batch_kw,
+            analysis_params.battery_dod,
+            analysis_params.charge_loss,
+            initial_state=state,
+            surplus_kwh=surplus,
+            interval_hours=interval_hours,
+        )
+    # 只取最後一次模擬中代表日當天的結果
+    (battery_power, soc, usage_with_battery, charge_kwh,
+     release_kwh) = [values[-steps:] for values in columns]
+    usage = usage[-steps:]
+
+    def weighted_sum(values):
+        # (代表日 × 設備台數,) -> (設備台數,)
+        return (values.reshape(day_count, size_count) *
+                weights[:, None]).sum(axis=0)
+
+    # 尖離峰套利利潤
+    season_codes = day_features[calendar_cols.season_col].to_numpy()
+    raw_price = ec_lib.price_dict_to_matrix(
+        elec_price_params.raw_charge_price_dict)[
+            season_codes,
+            day_features[calendar_cols.raw_usage_type_col].to_numpy()]
+    new_price = ec_lib.price_dict_to_matrix(
+        elec_price_params.new_charge_price_dict)[
+            season_codes,
+            day_features[calendar_cols.usage_type_col].to_numpy()]
+    raw_bill = (usage * to_batch(raw_price)).sum(axis=0)
+    new_bill = ((usage - charge_kwh - release_kwh) *
+                to_batch(new_price)).sum(axis=0)
+    charge_profit = weighted_sum(raw_bill - new_bill)
+
+    # 需量反應價金
+    def hourly(values, how):
+        values = values.reshape(24, steps // 24, -1)
+        return values.sum(axis=1) if how == "sum" else values.mean(axis=1)
+
+    _, dr_price = analyze_lib.cal_dr_volume_and_price_vectorized(
+        hourly(usage_with_battery, "sum"),
+        hourly(battery_power, "mean"),
+        hourly(soc, "mean"),
+        analysis_params,
+        batch_kw,
+    )
+    dr_profit = weighted_sum(dr_price.sum(axis=0))
+
+    # 基本電價差利潤，以代表日的最大需量估算
+    is_expensive = to_batch(
+        analyze_lib.is_expensive_hour_vectorized(
+            day_features, calendar_cols, analysis_params.contract_type))
+    is_summer = to_batch(
+        season_codes == ec_lib.SEASON_TYPE_LIST.index(ec_lib.SeasonType.SUMMER))
+    usage_by_size = usage_with_battery.reshape(steps * day_count, size_count)
+
+    def size_max(mask):
+        return _masked_max(usage_by_size,
+                           mask.reshape(steps * day_count, size_count))
+
+    if (analysis_params.contract_type ==
+            ec_lib.ContractType.HIGH_PRESSURE_THREE_PHASE):
+        max_peak = size_max(is_expensive & is_summer)
+        max_semi_peak = size_max(is_expensive & ~is_summer)
+    else:
+        max_peak = size_max(is_expensive)
+        max_semi_peak = np.zeros(size_count)
+    max_nonexpensive = size_max(~is_expensive)
+    contract_profit = np.array([
+        _contract_profit(max_peak[i], max_semi_peak[i], max_nonexpensive[i],
+                         raw_contract, analysis_params, elec_price_params,
+                         interval_hours) for i in range(size_count)
+    ])
+
+    return build_sizing_table(device_numbers, charge_profit, contract_profit,
+                              dr_profit, analysis_params, yearly_profit_cols,
+                              sizing_cols), representative_days
+
+
+def simulate_full_sizing(
+    data,
+    calendar_features,
+    raw_contract: dict,
+    analysis_params: analyze_lib.AnalysisParameters = None,
+    device_numbers=None,
+    meter_usage_cols: analyze_lib.MeterUsageColumns = None,
+    elec_price_cols: analyze_lib.ElectricPriceColumns = None,
+    calendar_cols: analyze_lib.CalendarColumns = None,
+    yearly_profit_cols: analyze_lib.YearlyProfitColumns = None,
+    sizing_cols: SizingColumns = None,
+):
+    """
+    以完整數據逐一模擬各設備台數，作為代表日估算的比較基準
+    :return: 設備台數效益表
+    """
+    analysis_params = analysis_params or analyze_lib.AnalysisParameters()
+    cols = meter_usage_cols or analyze_lib.MeterUsageColumns()
+    elec_price_cols = elec_price_cols or analyze_lib.ElectricPriceColumns()
+    calendar_cols = calendar_cols or analyze_lib.CalendarColumns()
+    yearly_profit_cols = (yearly_profit_cols
+                          or analyze_lib.YearlyProfitColumns())
+    sizing_cols = sizing_cols or SizingColumns()
+    if device_numbers is None:
+        device_numbers = [analysis_params.device_number]
+    elec_price_params = analysis_params.build_electric_price_parameters()
+    interval_hours = analyze_lib.get_interval_hours(data, cols)
+
+    charge_profit, contract_profit, dr_profit = [], [], []
+    for device_number in device_numbers:
+        params = replace(analysis_params, device_number=device_number)
+        battery_data, _ = analyze_lib.process_battery_usage_vectorized(
+            data, calendar_features, cols, calendar_cols, params,
+            interval_hours=interval_hours)
+        (
+            battery_data[elec_price_cols.elec_charge_price_col],
+            battery_data[elec_price_cols.elec_charge_price_with_battery_col],
+        ) = analyze_lib.cal_elec_price_vectorized(battery_data,
+                                                  calendar_features, cols,
+                                                  calendar_cols,
+                                                  elec_price_params)
+        charge_profit.append(
+            (battery_data[elec_price_cols.elec_charge_price_col] -
+             battery_data[elec_price_cols.elec_charge_price_with_battery_col]
+             ).sum())
+        dr_profit.append(
+            analyze_lib.cal_hourly_dr_price_vectorized(
+                battery_data, cols, elec_price_cols,
+                params)[elec_price_cols.demand_price_col].sum())
+        contract_profit.append(
+            _contract_profit(
+                *analyze_lib.cal_contract_max_usage(
+                    battery_data, calendar_features, cols, calendar_cols,
+                    params.contract_type), raw_contract, params,
+                elec_price_params, interval_hours))
+    return build_sizing_table(device_numbers, np.array(charge_profit),
+                              np.array(contract_profit), np.array(dr_profit),
+                              analysis_params, yearly_profit_cols,
+                              sizing_cols)
+
+
+def compare_with_full_run(
+    data,
+    calendar_features,
+    raw_contract: dict,
+    analysis_params: analyze_lib.AnalysisParameters = None,
+    device_numbers=None,
+    k=REPRESENTATIVE_DAY_COUNT,
+    include_peak_day=True,
+    seed=KMEANS_SEED,
+    yearly_profit_cols: analyze_lib.YearlyProfitColumns = None,
+    sizing_cols: SizingColumns = None,
+):
+    """
+    比較代表日估算與完整模擬的效益誤差及耗時
+    :return: (誤差表, {"full_seconds", "approx_seconds", "speedup"})
+    """
+    yearly_profit_cols = (yearly_profit_cols
+                          or analyze_lib.YearlyProfitColumns())
+    sizing_cols = sizing_cols or SizingColumns()
+    start = time.perf_counter()
+    approx, _ = simulate_representative_days(
+        data,
+        calendar_features,
+        raw_contract,
+        analysis_params,
+        device_numbers,
+        k,
+        include_peak_day,
+        seed,
+        yearly_profit_cols=yearly_profit_cols,
+        sizing_cols=sizing_cols)
+    approx_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    full = simulate_full_sizing(data,
+                                calendar_features,
+                                raw_contract,
+                                analysis_params,
+                                device_numbers,
+                                yearly_profit_cols=yearly_profit_cols,
+                                sizing_cols=sizing_cols)
+    full_seconds = time.perf_counter() - start
+
+    metric_list = [
+        yearly_profit_cols.charge_profit_col,
+        yearly_profit_cols.contract_profit_col,
+        yearly_profit_cols.dr_profit_col,
+        yearly_profit_cols.total_profit_col,
+        yearly_profit_cols.cumulative_profit_col,
+    ]
+    comparison = pd.concat([
+        pd.DataFrame({
+            sizing_cols.device_number_col:
+            full[sizing_cols.device_number_col],
+            sizing_cols.metric_col: metric,
+            sizing_cols.full_col: full[metric],
+            sizing_cols.approx_col: approx[metric],
+        }) for metric in metric_list
+    ],
+                           ignore_index=True)
+    comparison[sizing_cols.abs_error_col] = (
+        comparison[sizing_cols.approx_col] - comparison[sizing_cols.full_col])
+    comparison[sizing_cols.rel_error_col] = (
+        comparison[sizing_cols.abs_error_col] /
+        comparison[sizing_cols.full_col].abs().replace(0, np.nan))
+    return comparison, {
+        "full_seconds": full_seconds,
+        "approx_seconds": approx_seconds,
+        "speedup": full_seconds / approx_seconds,
+    }
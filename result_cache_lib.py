@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+# 設定快取資料夾與容量上限
+CACHE_FOLDER = "./cache/"
+CACHE_MAX_BYTES = 2 * 1024**3
+# 計算邏輯變更時調整版本，使舊快取失效，任何改變階段結果的修改都必須一併調整
+CACHE_VERSION = 3
+
+_CACHE_FILE_SUFFIX = ".pkl"
+
+
+def hash_file(file_path):
+    """
+    計算檔案內容的雜湊值
+    :param file_path: 檔案路徑
+    :return: sha256 雜湊字串
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_cache_key(stage_name, params: dict, input_keys: list):
+    """
+    以階段名稱、該階段讀取的參數與上游結果的鍵值計算快取鍵值
+    :param stage_name: 階段名稱
+    :param params: 該階段實際讀取的參數
+    :param input_keys: 上游階段的鍵值
+    :return: sha256 雜湊字串
+    """
+    payload = json.dumps(
+        {
+            "version": CACHE_VERSION,
+            "stage": stage_name,
+            "params": params,
+            "inputs": list(input_keys),
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    以內容雜湊為鍵值的磁碟快取，超過容量上限時淘汰最久未使用的結果
+    """
+
+    def __init__(self, cache_folder=CACHE_FOLDER, max_bytes=CACHE_MAX_BYTES):
+        self.cache_folder = cache_folder
+        self.max_bytes = max_bytes
+        os.makedirs(cache_folder, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_folder, key + _CACHE_FILE_SUFFIX)
+
+    def get(self, key):
+        """
+        讀取快取結果
+        :param key: 快取鍵值
+        :return: (是否命中, 結果)
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError,
+                AttributeError, ImportError, ValueError):
+            # 檔案不存在、被截斷或不是本程式寫入的結果時視為未命中，重新計算
+            return False, None
+        # 更新修改時間作為最近使用時間，其他程序可能已同時淘汰此結果
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return True, value
+
+    def put(self, key, value):
+        """
+        寫入快取結果並依容量上限淘汰舊結果
+        :param key: 快取鍵值
+        :param value: 結果
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_folder,
+                                        suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """
+        淘汰最久未使用的結果直到總容量低於上限
+        """
+        entries = []
+        for entry in os.scandir(self.cache_folder):
+            if entry.is_file() and entry.name.endswith(_CACHE_FILE_SUFFIX):
+                # 其他程序可能同時淘汰或取代同一個結果
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+
+    def clear(self):
+        """
+        清除所有快取結果
+        """
+        for entry in os.scandir(self.cache_folder):
+            if entry.is_file() and entry.name.endswith(_CACHE_FILE_SUFFIX):
+                os.remove(entry.path)
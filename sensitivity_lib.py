@@ -0,0 +1,465 @@
+from dataclasses import dataclass, field
+import numpy as np
+import pandas as pd
+import electricity_lib as ec_lib
+import taipower_analyze_lib as analyze_lib
+
+# 效益計算年數
+PROFIT_YEARS = 20
+# 預設的電價、建置單價與需量反應價格變動幅度 (相對值)
+DEFAULT_RELATIVE_CHANGE = 0.1
+# 預設的電池衰退係數變動幅度 (絕對值)
+BATTERY_DECAY_STEP = 0.01
+
+
+@dataclass
+class SensitivityColumns:
+    parameter_col: str = "參數"
+    low_value_col: str = "低值"
+    high_value_col: str = "高值"
+    base_result_col: str = "基準結果"
+    low_result_col: str = "低值結果"
+    high_result_col: str = "高值結果"
+    low_change_col: str = "低值變化"
+    high_change_col: str = "高值變化"
+    swing_col: str = "影響幅度"
+    payback_year_col: str = "回收年"
+
+
+@dataclass
+class SensitivityBasis:
+    """
+    由一次充放電結果預先計算的定價基礎，各項效益都是價格/財務參數的線性組合
+    """
+    # 原合約 (季節, 原用電類型) 的用電量 kWh
+    raw_energy: np.ndarray
+    # 增加電池後 (季節, 用電類型) 的用電量 kWh
+    new_energy: np.ndarray
+    # 原/新合約年度基本電費對 (季節, 用電類型) 單價的係數
+    raw_contract_volume: np.ndarray
+    new_contract_volume: np.ndarray
+    # 基準的流動電價與基本電價矩陣，未定義的類型為 0；
+    # 使用電價表排程時為各版本依用電量/基本電費係數加權的等效價格
+    raw_charge_price: np.ndarray
+    new_charge_price: np.ndarray
+    raw_contract_price: np.ndarray
+    new_contract_price: np.ndarray
+    # 需量反應投標量合計 MWh
+    dr_mwh: float
+    analysis_params: analyze_lib.AnalysisParameters
+
+
+@dataclass
+class SensitivityCase:
+    """
+    一組價格/財務參數的變動，未設定的項目沿用基準值
+    """
+    # {用電類型: 倍數}，同時套用於原/新合約的流動電價
+    charge_price_scale: dict = field(default_factory=dict)
+    # {用電類型: 倍數}，同時套用於原/新合約的基本電價
+    contract_price_scale: dict = field(default_factory=dict)
+    kwh_price: float = None
+    dr_avg_price: float = None
+    battery_decay: float = None
+
+
+@dataclass
+class SensitivityParameter:
+    """
+    龍捲風圖的一個參數，field_name 為 SensitivityCase 的欄位，
+    電價類參數需指定用電類型，低值/高值為倍數，其餘為參數值
+    """
+    name: str
+    field_name: str
+    low: float
+    high: float
+    usage_type: ec_lib.UsageType = None
+
+    def to_case(self, value):
+        if self.usage_type is not None:
+            return SensitivityCase(**{self.field_name: {self.usage_type: value}})
+        return SensitivityCase(**{self.field_name: value})
+
+
+def _price_matrix(price_dict):
+    return np.nan_to_num(ec_lib.price_dict_to_matrix(price_dict))
+
+
+def _sum_by_season_usage(values, season_codes, usage_type_codes):
+    """
+    以 (季節, 用電類型) 加總，缺值視為 0
+    """
+    shape = (len(ec_lib.SEASON_TYPE_LIST), len(ec_lib.USAGE_TYPE_LIST))
+    return np.bincount(
+        np.ravel_multi_index((season_codes, usage_type_codes), shape),
+        weights=np.nan_to_num(np.asarray(values, dtype=float)),
+        minlength=shape[0] * shape[1],
+    ).reshape(shape)
+
+
+def cal_contract_volume_matrix(contract_volume: dict, contract_price_dict: dict):
+    """
+    計算年度基本電費對各 (季節, 用電類型) 單價的係數。cal_basic_price 在單價不為負時
+    對單價是線性的，逐一代入單位單價即可得到係數
+    :param contract_volume: 合約容量
+    :param contract_price_dict: 基本電價字典，決定有哪些 (季節, 用電類型)
+    :return: 係數矩陣，與基本電價矩陣逐項相乘後加總即為年度基本電費
+    """
+    matrix = np.zeros(
+        (len(ec_lib.SEASON_TYPE_LIST), len(ec_lib.USAGE_TYPE_LIST)))
+    zero_price_dict = {
+        season: {usage_type: 0.0
+                 for usage_type in price_dict}
+        for season, price_dict in contract_price_dict.items()
+    }
+    for season, price_dict in contract_price_dict.items():
+        for usage_type in price_dict:
+            unit_price_dict = {
+                key: dict(value)
+                for key, value in zero_price_dict.items()
+            }
+            unit_price_dict[season][usage_type] = 1.0
+            matrix[ec_lib.SEASON_TYPE_LIST.index(season),
+                   ec_lib.USAGE_TYPE_LIST.index(usage_type)] = sum(
+                       analyze_lib.cal_monthly_basic_price(
+                           contract_volume, unit_price_dict).values())
+    return matrix
+
+
+def _divide_or_zero(numerator, denominator):
+    return np.divide(numerator,
+                     denominator,
+                     out=np.zeros_like(numerator, dtype=float),
+                     where=denominator != 0)
+
+
+def cal_schedule_contract_cost_matrix(tariff_schedule, contract_volume: dict,
+                                      contract_type: ec_lib.ContractType,
+                                      date_times):
+    """
+    依電價表排程計算年度基本電費中各 (季節, 用電類型) 單價所貢獻的金額，
+    基本電費對單價是線性的，逐一只保留一個 (季節, 用電類型) 的單價即可得到
+    :param tariff_schedule: tariff_lib.TariffSchedule
+    :param contract_volume: 合約容量
+    :param contract_type: 合約類型
+    :param date_times: 數據時間欄位
+    :return: 金額矩陣，各項加總即為年度基本電費
+    """
+    edition_count = tariff_schedule.cal_month_edition_count(date_times)
+    matrix = np.zeros(
+        (len(ec_lib.SEASON_TYPE_LIST), len(ec_lib.USAGE_TYPE_LIST)))
+    has_price = np.isfinite(
+        tariff_schedule.price_matrix("contract_price", contract_type)).any(
+            axis=0)
+    for season_code, usage_type_code in zip(*np.nonzero(has_price)):
+        price_scale = np.zeros_like(matrix)
+        price_scale[season_code, usage_type_code] = 1.0
+        matrix[season_code, usage_type_code] = sum(
+            tariff_schedule.cal_monthly_basic_price(
+                contract_volume,
+                contract_type,
+                edition_count=edition_count,
+                price_scale=price_scale).values())
+    return matrix
+
+
+def build_sensitivity_basis(
+    battery_data,
+    calendar_features,
+    hourly_dr_data,
+    raw_contract_volume: dict,
+    new_contract_volume: dict,
+    meter_usage_cols: analyze_lib.MeterUsageColumns,
+    calendar_cols: analyze_lib.CalendarColumns,
+    analysis_params: analyze_lib.AnalysisParameters,
+    tariff_schedule=None,
+):
+    """
+    由充放電結果預先計算 (季節, 用電類型) 用電量與基本電費係數，之後的變動不需再讀取每15分鐘數據。
+    使用電價表排程時，價格矩陣為依各時間適用版本計價後換算的等效價格
+    :param battery_data: process_battery_usage_vectorized 的結果
+    :param calendar_features: cal_calendar_features 的結果
+    :param hourly_dr_data: cal_hourly_dr_price_vectorized 的結果
+    :param raw_contract_volume: 原合約容量
+    :param new_contract_volume: 新合約容量
+    :param analysis_params: 分析參數 (基準值)
+    :param tariff_schedule: tariff_lib.TariffSchedule，None 表示使用內建電價
+    :return: SensitivityBasis
+    """
+    elec_price_params = analysis_params.build_electric_price_parameters()
+    season_codes = calendar_features[calendar_cols.season_col].to_numpy()
+    raw_usage_type_codes = calendar_features[
+        calendar_cols.raw_usage_type_col].to_numpy()
+    usage_type_codes = calendar_features[
+        calendar_cols.usage_type_col].to_numpy()
+    usage = battery_data[meter_usage_cols.usage_col].to_numpy(dtype=float)
+    new_usage = (usage -
+                 battery_data[meter_usage_cols.charge_kwh_col].to_numpy() -
+                 battery_data[meter_usage_cols.release_kwh_col].to_numpy())
+    raw_energy = _sum_by_season_usage(usage, season_codes,
+                                      raw_usage_type_codes)
+    new_energy = _sum_by_season_usage(new_usage, season_codes,
+                                      usage_type_codes)
+    raw_contract_coef = cal_contract_volume_matrix(
+        raw_contract_volume, elec_price_params.raw_contract_price_dict)
+    new_contract_coef = cal_contract_volume_matrix(
+        new_contract_volume, elec_price_params.contract_price_dict)
+    if tariff_schedule is None:
+        raw_charge_price = _price_matrix(
+            elec_price_params.raw_charge_price_dict)
+        new_charge_price = _price_matrix(
+            elec_price_params.new_charge_price_dict)
+        raw_contract_price = _price_matrix(
+            elec_price_params.raw_contract_price_dict)
+        new_contract_price = _price_matrix(
+            elec_price_params.contract_price_dict)
+    else:
+        # 依各時間適用的版本計價後，除以用電量/係數換算為等效價格，
+        # 價格矩陣與用電量/係數相乘仍為排程計價的結果
+        raw_charge, new_charge = tariff_schedule.cal_elec_price(
+            battery_data, calendar_features, meter_usage_cols, calendar_cols,
+            analysis_params)
+        raw_charge_price = _divide_or_zero(
+            _sum_by_season_usage(raw_charge, season_codes,
+                                 raw_usage_type_codes), raw_energy)
+        new_charge_price = _divide_or_zero(
+            _sum_by_season_usage(new_charge, season_codes, usage_type_codes),
+            new_energy)
+        date_times = battery_data[meter_usage_cols.time_col]
+        raw_contract_price = _divide_or_zero(
+            cal_schedule_contract_cost_matrix(
+                tariff_schedule, raw_contract_volume,
+                analysis_params.raw_contract_type, date_times),
+            raw_contract_coef)
+        new_contract_price = _divide_or_zero(
+            cal_schedule_contract_cost_matrix(tariff_schedule,
+                                              new_contract_volume,
+                                              analysis_params.contract_type,
+                                              date_times), new_contract_coef)
+    return SensitivityBasis(
+        raw_energy=raw_energy,
+        new_energy=new_energy,
+        raw_contract_volume=raw_contract_coef,
+        new_contract_volume=new_contract_coef,
+        raw_charge_price=raw_charge_price,
+        new_charge_price=new_charge_price,
+        raw_contract_price=raw_contract_price,
+        new_contract_price=new_contract_price,
+        dr_mwh=float(
+            np.nansum(hourly_dr_data[meter_usage_cols.dr_volume_col])),
+        analysis_params=analysis_params,
+    )
+
+
+def _scale_matrix(scale_dict: dict):
+    scale = np.ones(len(ec_lib.USAGE_TYPE_LIST))
+    for usage_type, value in scale_dict.items():
+        scale[ec_lib.USAGE_TYPE_LIST.index(usage_type)] = value
+    return np.broadcast_to(scale, (len(ec_lib.SEASON_TYPE_LIST), len(scale)))
+
+
+def evaluate_sensitivity_cases(
+    basis: SensitivityBasis,
+    case_list,
+    yearly_profit_cols: analyze_lib.YearlyProfitColumns = None,
+    sensitivity_cols: SensitivityColumns = None,
+    years=PROFIT_YEARS,
+):
+    """
+    一次計算多組變動的效益，每組只需 (季節 × 用電類型) 大小的矩陣乘積
+    :param basis: build_sensitivity_basis 的結果
+    :param case_list: SensitivityCase 列表
+    :param years: 效益計算年數
+    :return: 每組變動的第一年各項利潤、累計效益與回收年
+    """
+    yearly_profit_cols = (yearly_profit_cols
+                          or analyze_lib.YearlyProfitColumns())
+    sensitivity_cols = sensitivity_cols or SensitivityColumns()
+    params = basis.analysis_params
+    charge_scale = np.array(
+        [_scale_matrix(case.charge_price_scale) for case in case_list])
+    contract_scale = np.array(
+        [_scale_matrix(case.contract_price_scale) for case in case_list])
+
+    def pick(name):
+        return np.array([
+            getattr(params, name)
+            if getattr(case, name) is None else getattr(case, name)
+            for case in case_list
+        ], dtype=float)
+
+    # 基準電價 × 用電量 (或基本電費係數) 後，變動只剩逐項倍數，攤平成矩陣乘積
+    charge_profit = charge_scale.reshape(len(case_list), -1) @ (
+        basis.raw_charge_price * basis.raw_energy -
+        basis.new_charge_price * basis.new_energy).ravel()
+    contract_profit = contract_scale.reshape(len(case_list), -1) @ (
+        basis.raw_contract_price * basis.raw_contract_volume -
+        basis.new_contract_price * basis.new_contract_volume).ravel()
+    dr_profit = basis.dr_mwh * (pick("dr_avg_price") +
+                                1000 * params.dr_reaction_freq *
+                                params.dr_energy_price)
+    building_cost = -(params.battery_kwh / params.battery_buffer *
+                      pick("kwh_price"))
+    decay_factors = np.cumprod(np.column_stack(
+        (np.ones(len(case_list)),
+         np.repeat(pick("battery_decay")[:, None], years - 1, axis=1))),
+                               axis=1)
+    cumulative_profit = building_cost[:, None] + np.cumsum(
+        (charge_profit + dr_profit)[:, None] * decay_factors +
+        contract_profit[:, None],
+        axis=1)
+    is_paid_back = cumulative_profit >= 0
+    return pd.DataFrame({
+        yearly_profit_cols.charge_profit_col:
+        charge_profit,
+        yearly_profit_cols.contract_profit_col:
+        contract_profit,
+        yearly_profit_cols.dr_profit_col:
+        dr_profit,
+        yearly_profit_cols.total_profit_col:
+        charge_profit + contract_profit + dr_profit,
+        yearly_profit_cols.cumulative_profit_col:
+        cumulative_profit[:, -1],
+        sensitivity_cols.payback_year_col:
+        np.where(is_paid_back.any(axis=1),
+                 is_paid_back.argmax(axis=1) + 1, np.nan),
+    })
+
+
+def build_default_parameters(
+        analysis_params: analyze_lib.AnalysisParameters,
+        relative_change=DEFAULT_RELATIVE_CHANGE,
+        battery_decay_step=BATTERY_DECAY_STEP):
+    """
+    建立預設的敏感度參數: 新合約有定義的各用電類型流動/基本電價、建置單價、
+    需量反應平均價格與電池衰退係數
+    :param analysis_params: 分析參數 (基準值)
+    :param relative_change: 電價、建置單價與需量反應價格的相對變動幅度
+    :param battery_decay_step: 電池衰退係數的變動幅度
+    :return: SensitivityParameter 列表
+    """
+    elec_price_params = analysis_params.build_electric_price_parameters()
+    parameter_list = []
+    for name, field_name, price_dict in [
+        ("流動電價", "charge_price_scale",
+         elec_price_params.new_charge_price_dict),
+        ("基本電價", "contract_price_scale",
+         elec_price_params.contract_price_dict),
+    ]:
+        for usage_type in ec_lib.USAGE_TYPE_LIST:
+            if any(usage_type in season_price
+                   for season_price in price_dict.values()):
+                parameter_list.append(
+                    SensitivityParameter(f"{name} {usage_type.value} (倍數)",
+                                         field_name, 1 - relative_change,
+                                         1 + relative_change, usage_type))
+    parameter_list += [
+        SensitivityParameter("建置單價", "kwh_price",
+                             analysis_params.kwh_price * (1 - relative_change),
+                             analysis_params.kwh_price * (1 + relative_change)),
+        SensitivityParameter(
+            "需量反應平均價格", "dr_avg_price",
+            analysis_params.dr_avg_price * (1 - relative_change),
+            analysis_params.dr_avg_price * (1 + relative_change)),
+        SensitivityParameter(
+            "電池衰退係數", "battery_decay",
+            analysis_params.battery_decay - battery_decay_step,
+            min(analysis_params.battery_decay + battery_decay_step, 1.0)),
+    ]
+    return parameter_list
+
+
+def build_tornado_table(
+    basis: SensitivityBasis,
+    parameter_list=None,
+    result_col=None,
+    yearly_profit_cols: analyze_lib.YearlyProfitColumns = None,
+    sensitivity_cols: SensitivityColumns = None,
+):
+    """
+    計算每個參數在低值/高值時的結果，依影響幅度由大到小排序，可直接畫成龍捲風圖
+    :param basis: build_sensitivity_basis 的結果
+    :param parameter_list: SensitivityParameter 列表，預設為 build_default_parameters
+    :param result_col: evaluate_sensitivity_cases 的結果欄位，預設為累計效益
+    :return: 龍捲風圖表格
+    """
+    yearly_profit_cols = (yearly_profit_cols
+                          or analyze_lib.YearlyProfitColumns())
+    sensitivity_cols = sensitivity_cols or SensitivityColumns()
+    parameter_list = (parameter_list if parameter_list is not None else
+                      build_default_parameters(basis.analysis_params))
+    result_col = result_col or yearly_profit_cols.cumulative_profit_col
+    case_list = [SensitivityCase()]
+    for parameter in parameter_list:
+        case_list += [
+            parameter.to_case(parameter.low),
+            parameter.to_case(parameter.high)
+        ]
+    result = evaluate_sensitivity_cases(basis, case_list, yearly_profit_cols,
+                                        sensitivity_cols)[result_col].to_numpy()
+    base_result = result[0]
+    low_result, high_result = result[1::2], result[2::2]
+    table = pd.DataFrame({
+        sensitivity_cols.parameter_col: [
+            parameter.name for parameter in parameter_list
+        ],
+        sensitivity_cols.low_value_col: [
+            parameter.low for parameter in parameter_list
+        ],
+        sensitivity_cols.high_value_col: [
+            parameter.high for parameter in parameter_list
+        ],
+        sensitivity_cols.base_result_col: base_result,
+        sensitivity_cols.low_result_col: low_result,
+        sensitivity_cols.high_result_col: high_result,
+        sensitivity_cols.low_change_col: low_result - base_result,
+        sensitivity_cols.high_change_col: high_result - base_result,
+        sensitivity_cols.swing_col: np.abs(high_result - low_result),
+    })
+    return table.sort_values(by=sensitivity_cols.swing_col,
+                             ascending=False,
+                             kind="stable").reset_index(drop=True)
+
+
+def build_sensitivity_basis_from_pipeline(
+    meter_data_path,
+    meter_contract_path,
+    analysis_params: analyze_lib.AnalysisParameters = None,
+    cache=None,
+    meter_usage_cols: analyze_lib.MeterUsageColumns = None,
+    calendar_cols: analyze_lib.CalendarColumns = None,
+    tariff_schedule=None,
+):
+    """
+    以分析流程取得充放電、需量反應與合約容量結果 (可使用快取)，建立定價基礎
+    :param meter_data_path: 電表資料路徑
+    :param meter_contract_path: 合約資料路徑
+    :param analysis_params: 分析參數 (基準值)
+    :param cache: 結果快取，None 表示不使用快取
+    :param tariff_schedule: tariff_lib.TariffSchedule，None 表示使用內建電價
+    :return: SensitivityBasis
+    """
+    import analysis_pipeline_lib as pipeline_lib
+    analysis_params = analysis_params or analyze_lib.AnalysisParameters()
+    meter_usage_cols = meter_usage_cols or analyze_lib.MeterUsageColumns()
+    calendar_cols = calendar_cols or analyze_lib.CalendarColumns()
+    stages = pipeline_lib.build_analysis_stages(
+        meter_data_path,
+        meter_contract_path,
+        analysis_params,
+        cache,
+        meter_usage_cols=meter_usage_cols,
+        calendar_cols=calendar_cols,
+        tariff_schedule=tariff_schedule,
+    )
+    return build_sensitivity_basis(
+        stages["dispatch"].get(),
+        stages["calendar"].get(),
+        stages["dr"].get(),
+        stages["raw_contract"].get(),
+        stages["contract"].get()["new_contract_volume"],
+        meter_usage_cols,
+        calendar_cols,
+        analysis_params,
+        tariff_schedule,
+    )
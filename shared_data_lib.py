@@ -0,0 +1,147 @@
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+import taipower_analyze_lib as analyze_lib
+import analysis_pipeline_lib as pipeline_lib
+from result_cache_lib import make_cache_key
+
+# 共享陣列的上層資料夾，Linux 使用記憶體中的 /dev/shm，其他系統使用暫存資料夾
+SHARED_ROOT_FOLDER = "/dev/shm" if os.path.isdir("/dev/shm") else None
+SHARED_FOLDER_PREFIX = "taipower_"
+
+_MANIFEST_FILE_NAME = "manifest.json"
+
+
+def create_shared_folder(root_folder=SHARED_ROOT_FOLDER):
+    """
+    建立本次執行專用的共享陣列資料夾
+    :param root_folder: 上層資料夾，None 表示系統暫存資料夾
+    :return: 資料夾路徑
+    """
+    return tempfile.mkdtemp(prefix=SHARED_FOLDER_PREFIX, dir=root_folder)
+
+
+def remove_shared_folder(folder):
+    """
+    刪除共享陣列資料夾，已開啟的記憶體映射在關閉前仍可使用
+    """
+    shutil.rmtree(folder, ignore_errors=True)
+
+
+def publish_frame(frame, folder):
+    """
+    將表格的每個欄位存為 .npy 檔，子程序以記憶體映射讀取，不需序列化或複製
+    :param frame: 表格，欄位需為數值或時間型別
+    :param folder: 輸出資料夾
+    :return: 輸出資料夾
+    """
+    os.makedirs(folder, exist_ok=True)
+    column_list = []
+    for i, col in enumerate(frame.columns):
+        values = frame[col].to_numpy()
+        if values.dtype.kind not in "biufM":
+            raise ValueError(f"欄位 {col} 不是數值或時間型別，無法共享")
+        file_name = f"{i}.npy"
+        np.save(os.path.join(folder, file_name), np.ascontiguousarray(values))
+        column_list.append({"name": col, "file": file_name})
+    with open(os.path.join(folder, _MANIFEST_FILE_NAME),
+              "w",
+              encoding="utf-8") as f:
+        json.dump({
+            "length": len(frame),
+            "columns": column_list
+        },
+                  f,
+                  ensure_ascii=False)
+    return folder
+
+
+def attach_frame(folder):
+    """
+    以唯讀記憶體映射讀取 publish_frame 輸出的欄位，組成不複製資料的表格
+    :param folder: publish_frame 的輸出資料夾
+    :return: 表格，各欄位直接指向映射的檔案內容
+    """
+    with open(os.path.join(folder, _MANIFEST_FILE_NAME),
+              encoding="utf-8") as f:
+        manifest = json.load(f)
+    return pd.DataFrame(
+        {
+            col["name"]: np.load(os.path.join(folder, col["file"]),
+                                 mmap_mode="r")
+            for col in manifest["columns"]
+        },
+        index=pd.RangeIndex(manifest["length"]),
+        copy=False,
+    )
+
+
+def calendar_key(analysis_params: analyze_lib.AnalysisParameters,
+                 tariff_schedule=None):
+    """
+    日曆特徵只與合約、充放電類型及電價表有關，鍵值相同的情境可共用同一份
+    :param analysis_params: 分析參數
+    :param tariff_schedule: tariff_lib.TariffSchedule，None 表示使用內建電價
+    :return: 日曆特徵鍵值
+    """
+    return make_cache_key(
+        "shared_calendar",
+        {
+            "raw_contract_type": analysis_params.raw_contract_type,
+            "contract_type": analysis_params.contract_type,
+            "release_type": analysis_params.release_type,
+            "charge_type": analysis_params.charge_type,
+            "tariff": (None if tariff_schedule is None else
+                       tariff_schedule.fingerprint()),
+        },
+        [],
+    )
+
+
+def publish_meter_arrays(
+    meter_data_path,
+    analysis_params_list,
+    folder,
+    tariff_schedule=None,
+    meter_usage_cols: analyze_lib.MeterUsageColumns = None,
+    calendar_cols: analyze_lib.CalendarColumns = None,
+):
+    """
+    讀取電表資料一次，發布整理後的數據 (時間、用電量) 與各情境所需的日曆特徵
+    :param meter_data_path: 電表資料路徑
+    :param analysis_params_list: 各情境的分析參數
+    :param folder: 輸出資料夾
+    :param tariff_schedule: tariff_lib.TariffSchedule，None 表示使用內建電價
+    :return: {"data": 數據資料夾, "key": 數據識別碼,
+        "calendar": {日曆特徵鍵值: 日曆特徵資料夾}}
+    """
+    meter_usage_cols = meter_usage_cols or analyze_lib.MeterUsageColumns()
+    calendar_cols = calendar_cols or analyze_lib.CalendarColumns()
+    data = analyze_lib.load_meter_data(meter_data_path, meter_usage_cols)
+    result = {
+        "data": publish_frame(data, os.path.join(folder, "data")),
+        # 與讀取電表資料階段相同的參數，分析時不必再計算檔案雜湊值
+        "key": make_cache_key(
+            "shared_data",
+            pipeline_lib.build_ingest_params(meter_data_path,
+                                             meter_usage_cols), []),
+        "calendar": {},
+    }
+    for analysis_params in analysis_params_list:
+        key = calendar_key(analysis_params, tariff_schedule)
+        if key in result["calendar"]:
+            continue
+        if tariff_schedule is None:
+            calendar_features = analyze_lib.cal_calendar_features(
+                data, meter_usage_cols, calendar_cols,
+                analysis_params.build_electric_parameters())
+        else:
+            calendar_features = tariff_schedule.cal_calendar_features(
+                data, meter_usage_cols, calendar_cols, analysis_params)
+        result["calendar"][key] = publish_frame(
+            calendar_features,
+            os.path.join(folder, f"calendar_{len(result['calendar'])}"))
+    return result
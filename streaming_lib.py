@@ -0,0 +1,396 @@
+import itertools
+import numpy as np
+import pandas as pd
+import electricity_lib as ec_lib
+import taipower_analyze_lib as analyze_lib
+import data_quality_lib
+from analysis_pipeline_lib import AnalysisResult
+
+# 每次從檔案讀取的列數
+CHUNK_ROWS = 200_000
+
+
+def read_meter_file_in_chunks(file_path, chunk_rows=CHUNK_ROWS):
+    """
+    分批讀取電表原始資料，支援 CSV 與 Parquet
+    :param file_path: 電表資料路徑
+    :param chunk_rows: 每批列數
+    :return: 原始數據的產生器
+    """
+    if str(file_path).endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("讀取 Parquet 需要安裝 pyarrow") from e
+        parquet_file = pq.ParquetFile(file_path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    elif str(file_path).endswith(".csv"):
+        yield from pd.read_csv(file_path, chunksize=chunk_rows)
+    else:
+        # Excel 無法分批讀取，整份讀入後再依月份切割
+        yield pd.read_excel(file_path)
+
+
+def detect_chunk_interval_hours(raw_chunks, meter_usage_cols: analyze_lib.
+                                MeterUsageColumns):
+    """
+    由最前面至少有兩個不同時間的原始數據判斷資料間隔，整個檔案只判斷一次，
+    避免筆數過少的批次 (例如只有一筆) 退回預設間隔
+    :param raw_chunks: 原始數據的產生器
+    :param meter_usage_cols: 用電欄位名稱
+    :return: (資料間隔 (小時), 包含已讀取批次的原始數據產生器)
+    """
+    time_col = meter_usage_cols.time_col
+    read_chunks = []
+    interval = None
+    for chunk in raw_chunks:
+        read_chunks.append(chunk)
+        interval = data_quality_lib.detect_interval(
+            pd.to_datetime(
+                pd.concat([chunk[time_col] for chunk in read_chunks])))
+        if interval is not None:
+            break
+    interval_hours = (analyze_lib.INTERVAL_HOURS if interval is None else
+                      interval.total_seconds() / 3600)
+    return interval_hours, itertools.chain(read_chunks, raw_chunks)
+
+
+def split_chunks_by_month(raw_chunks,
+                          meter_usage_cols: analyze_lib.MeterUsageColumns,
+                          interval_hours=None):
+    """
+    將時間排序的原始數據重新切割為完整月份，確保每小時/每月的資料不會跨批次
+    :param raw_chunks: 原始數據的產生器
+    :param meter_usage_cols: 用電欄位名稱
+    :param interval_hours: 資料間隔 (小時)，None 表示由最前面的批次判斷
+    :return: 每次一個月份的整理後數據
+    """
+    if interval_hours is None:
+        interval_hours, raw_chunks = detect_chunk_interval_hours(
+            raw_chunks, meter_usage_cols)
+    buffer = None
+    last_time = None
+    for chunk in raw_chunks:
+        chunk = analyze_lib.normalize_meter_data(chunk, meter_usage_cols,
+                                                 interval_hours)
+        if len(chunk) == 0:
+            continue
+        if last_time is not None and chunk[
+                meter_usage_cols.time_col].iloc[0] < last_time:
+            raise ValueError("電表資料必須依時間排序")
+        last_time = chunk[meter_usage_cols.time_col].iloc[-1]
+        if buffer is not None:
+            chunk = pd.concat([buffer, chunk], ignore_index=True)
+        months = chunk[meter_usage_cols.time_col].dt.to_period("M")
+        last_month = months.iloc[-1]
+        for _, month_data in chunk[months != last_month].groupby(
+                months[months != last_month], sort=True):
+            yield month_data.reset_index(drop=True)
+        buffer = chunk[months == last_month]
+    if buffer is not None and len(buffer) > 0:
+        yield buffer.reset_index(drop=True)
+
+
+def regularize_months(month_chunks,
+                      meter_usage_cols: analyze_lib.MeterUsageColumns,
+                      fill_policy=data_quality_lib.FILL_POLICY,
+                      interval_hours=None):
+    """
+    將每個月份的數據整理為規則間隔，以前一個月最後一天的數據為前文，
+    跨月份的缺漏也會補上
+    :param month_chunks: split_chunks_by_month 的結果
+    :param meter_usage_cols: 用電欄位名稱
+    :param fill_policy: 缺漏時段的補值方式
+    :param interval_hours: 資料間隔 (小時)，None 表示由各月份數據判斷
+    :return: 每次一個月份的規則間隔數據
+    """
+    time_col = meter_usage_cols.time_col
+    interval = (None if interval_hours is None else
+                pd.Timedelta(hours=interval_hours))
+    context = None
+    for month_data in month_chunks:
+        if context is not None:
+            month_data = pd.concat([context, month_data], ignore_index=True)
+        if len(month_data) > 1:
+            month_data, _ = data_quality_lib.regularize_meter_data(
+                month_data,
+                time_col,
+                interval=interval,
+                fill_policy=fill_policy)
+        if context is not None:
+            month_data = month_data[
+                month_data[time_col] > context[time_col].iloc[-1]]
+        if len(month_data) == 0:
+            continue
+        last_time = month_data[time_col].iloc[-1]
+        context = month_data[
+            month_data[time_col] > last_time - pd.Timedelta(days=1)]
+        yield month_data.reset_index(drop=True)
+
+
+class StreamingAnalysis:
+    """
+    逐批處理電表數據，跨批次延續電池狀態，只保留月度加總、每日最大值與
+    計算新合約容量所需的尖峰/非尖峰最大值。資料間隔 interval_hours 為 None 時
+    由第一批數據判斷一次，之後各批次沿用；tariff_schedule 為 None 時使用內建電價
+    """
+
+    def __init__(
+        self,
+        raw_contract: dict,
+        analysis_params: analyze_lib.AnalysisParameters = None,
+        meter_usage_cols: analyze_lib.MeterUsageColumns = None,
+        elec_price_cols: analyze_lib.ElectricPriceColumns = None,
+        calendar_cols: analyze_lib.CalendarColumns = None,
+        yearly_profit_cols: analyze_lib.YearlyProfitColumns = None,
+        interval_hours=None,
+        tariff_schedule=None,
+    ):
+        self.raw_contract = raw_contract
+        self.analysis_params = (analysis_params
+                                or analyze_lib.AnalysisParameters())
+        self.meter_usage_cols = (meter_usage_cols
+                                 or analyze_lib.MeterUsageColumns())
+        self.elec_price_cols = (elec_price_cols
+                                or analyze_lib.ElectricPriceColumns())
+        self.calendar_cols = calendar_cols or analyze_lib.CalendarColumns()
+        self.yearly_profit_cols = (yearly_profit_cols
+                                   or analyze_lib.YearlyProfitColumns())
+        self.elec_params = self.analysis_params.build_electric_parameters()
+        self.elec_price_params = (
+            self.analysis_params.build_electric_price_parameters())
+        self.battery_state = analyze_lib.BatteryState()
+        self.interval_hours = interval_hours
+        self.tariff_schedule = tariff_schedule
+        # 各月份適用電價表版本的筆數，供計算基本電費
+        self.edition_count = None
+        self.max_peak = np.nan
+        self.max_semi_peak = np.nan
+        self.max_nonexpensive = np.nan
+        self._monthly_sum = []
+        self._daily_max = []
+
+    @property
+    def _sum_cols(self):
+        return [
+            self.meter_usage_cols.usage_col,
+            self.meter_usage_cols.usage_with_battery_col,
+            self.meter_usage_cols.charge_kwh_col,
+            self.meter_usage_cols.release_kwh_col,
+            self.elec_price_cols.elec_charge_price_col,
+            self.elec_price_cols.elec_charge_price_with_battery_col,
+        ]
+
+    @property
+    def _mean_cols(self):
+        return [
+            self.meter_usage_cols.battery_kw_col,
+            self.meter_usage_cols.battery_kwh_col,
+        ]
+
+    @property
+    def _dr_cols(self):
+        return [
+            self.meter_usage_cols.dr_volume_col,
+            self.elec_price_cols.demand_price_col,
+        ]
+
+    def update(self, data):
+        """
+        處理一批時間排序且接續上一批的整理後數據
+        :param data: 整理後的數據
+        """
+        cols = self.meter_usage_cols
+        if self.tariff_schedule is None:
+            features = analyze_lib.cal_calendar_features(
+                data, cols, self.calendar_cols, self.elec_params)
+        else:
+            features = self.tariff_schedule.cal_calendar_features(
+                data, cols, self.calendar_cols, self.analysis_params)
+            edition_count = self.tariff_schedule.cal_month_edition_count(
+                data[cols.time_col])
+            self.edition_count = (edition_count
+                                  if self.edition_count is None else
+                                  self.edition_count + edition_count)
+        if self.interval_hours is None:
+            self.interval_hours = analyze_lib.get_interval_hours(data, cols)
+        data, self.battery_state = analyze_lib.process_battery_usage_vectorized(
+            data, features, cols, self.calendar_cols, self.analysis_params,
+            self.battery_state, self.interval_hours)
+        if self.tariff_schedule is None:
+            price_columns = analyze_lib.cal_elec_price_vectorized(
+                data, features, cols, self.calendar_cols,
+                self.elec_price_params)
+        else:
+            price_columns = self.tariff_schedule.cal_elec_price(
+                data, features, cols, self.calendar_cols,
+                self.analysis_params)
+        (
+            data[self.elec_price_cols.elec_charge_price_col],
+            data[self.elec_price_cols.elec_charge_price_with_battery_col],
+        ) = price_columns
+
+        max_peak, max_semi_peak, max_nonexpensive = (
+            analyze_lib.cal_contract_max_usage(
+                data, features, cols, self.calendar_cols,
+                self.analysis_params.contract_type))
+        self.max_peak = np.fmax(self.max_peak, max_peak)
+        self.max_semi_peak = np.fmax(self.max_semi_peak, max_semi_peak)
+        self.max_nonexpensive = np.fmax(self.max_nonexpensive,
+                                        max_nonexpensive)
+
+        month_grouper = pd.Grouper(key=cols.time_col, freq="ME")
+        # 淨負載組成欄位 (場域、儲冷、太陽光電) 存在時一併加總
+        component_cols = [
+            col for col in cols.component_cols if col in data.columns
+        ]
+        monthly = data.groupby(month_grouper).agg({
+            col: "sum"
+            for col in self._sum_cols + self._mean_cols + component_cols
+        })
+        monthly = monthly.join(
+            data.groupby(month_grouper)[self._mean_cols].count().add_suffix(
+                "_count"))
+        hourly_dr = analyze_lib.cal_hourly_dr_price_vectorized(
+            data, cols, self.elec_price_cols, self.analysis_params)
+        monthly = monthly.join(
+            hourly_dr.groupby(month_grouper)[self._dr_cols].sum())
+        self._monthly_sum.append(monthly)
+
+        is_expensive = analyze_lib.is_expensive_hour_vectorized(
+            features, self.calendar_cols, self.analysis_params.contract_type)
+        self._daily_max.append(data[is_expensive].groupby(
+            pd.Grouper(key=cols.time_col, freq="D"))[[
+                cols.usage_col, cols.usage_with_battery_col
+            ]].max())
+
+    def monthly_data(self):
+        """
+        合併各批次的月度加總，格式與 group_monthly_data 相同
+        :return: 月度數據
+        """
+        cols = self.meter_usage_cols
+        monthly = pd.concat(self._monthly_sum)
+        component_cols = [
+            col for col in cols.component_cols if col in monthly.columns
+        ]
+        monthly = monthly.groupby(level=0).sum(min_count=1)
+        monthly = monthly.reindex(
+            pd.date_range(monthly.index.min(), monthly.index.max(),
+                          freq="ME"))
+        for col in self._mean_cols:
+            monthly[col] = monthly[col] / monthly[col + "_count"]
+        monthly[self._sum_cols + self._dr_cols + component_cols] = monthly[
+            self._sum_cols + self._dr_cols + component_cols].fillna(0.0)
+        monthly.index.name = cols.time_col
+        return monthly[[
+            cols.usage_col,
+            cols.battery_kw_col,
+            cols.battery_kwh_col,
+            cols.usage_with_battery_col,
+            cols.charge_kwh_col,
+            cols.release_kwh_col,
+            self.elec_price_cols.elec_charge_price_col,
+            self.elec_price_cols.elec_charge_price_with_battery_col,
+            *component_cols,
+            cols.dr_volume_col,
+            self.elec_price_cols.demand_price_col,
+        ]].reset_index()
+
+    def daily_max_data(self):
+        """
+        每日尖峰時段的15分鐘最大用電量
+        :return: 每日最大值數據
+        """
+        daily_max = pd.concat(self._daily_max)
+        return daily_max.groupby(level=0).max().reset_index()
+
+    def result(self):
+        """
+        由累計結果計算新合約容量與年度效益
+        :return: 分析結果
+        """
+        max_semi_peak = self.max_semi_peak
+        if (self.analysis_params.contract_type ==
+                ec_lib.ContractType.HIGH_PRESSURE_BATCH):
+            max_semi_peak = 0.0
+        new_contract_volume = analyze_lib.cal_new_contract_volume_from_max(
+            self.max_peak,
+            max_semi_peak,
+            self.max_nonexpensive,
+            self.analysis_params.contract_type,
+            self.raw_contract,
+            self.analysis_params.new_contract_buffer,
+            self.interval_hours,
+        )
+        if self.tariff_schedule is None:
+            contract_monthly_basic_price = analyze_lib.cal_monthly_basic_price(
+                self.raw_contract,
+                self.elec_price_params.raw_contract_price_dict)
+            new_monthly_basic_price = analyze_lib.cal_monthly_basic_price(
+                new_contract_volume, self.elec_price_params.contract_price_dict)
+        else:
+            # 依各月份適用的電價表版本計算基本電費
+            contract_monthly_basic_price = (
+                self.tariff_schedule.cal_monthly_basic_price(
+                    self.raw_contract,
+                    self.analysis_params.raw_contract_type,
+                    edition_count=self.edition_count))
+            new_monthly_basic_price = (
+                self.tariff_schedule.cal_monthly_basic_price(
+                    new_contract_volume,
+                    self.analysis_params.contract_type,
+                    edition_count=self.edition_count))
+        monthly_data = self.monthly_data()
+        return AnalysisResult(
+            raw_contract_volume=self.raw_contract,
+            new_contract_volume=new_contract_volume,
+            contract_monthly_basic_price=contract_monthly_basic_price,
+            new_monthly_basic_price=new_monthly_basic_price,
+            monthly_data=monthly_data,
+            yearly_profit=analyze_lib.cal_year_profit_vectorized(
+                monthly_data,
+                contract_monthly_basic_price,
+                new_monthly_basic_price,
+                self.elec_price_cols,
+                self.yearly_profit_cols,
+                self.analysis_params,
+            ),
+        )
+
+
+def run_streaming_analysis(
+    meter_data_path,
+    meter_contract_path,
+    analysis_params: analyze_lib.AnalysisParameters = None,
+    chunk_rows=CHUNK_ROWS,
+    tariff_schedule=None,
+):
+    """
+    以分批方式執行完整分析，記憶體用量取決於每批大小而非資料長度
+    :param meter_data_path: 電表資料路徑 (CSV/Parquet)
+    :param meter_contract_path: 合約資料路徑
+    :param analysis_params: 分析參數
+    :param chunk_rows: 每次讀取的列數
+    :param tariff_schedule: tariff_lib.TariffSchedule，None 表示使用內建電價
+    :return: (分析結果, 每日最大值數據)
+    """
+    meter_usage_cols = analyze_lib.MeterUsageColumns()
+    # 整個檔案只判斷一次資料間隔，之後的每一批都使用相同間隔
+    interval_hours, raw_chunks = detect_chunk_interval_hours(
+        read_meter_file_in_chunks(meter_data_path, chunk_rows),
+        meter_usage_cols)
+    streaming = StreamingAnalysis(
+        analyze_lib.load_meter_contract(meter_contract_path),
+        analysis_params,
+        meter_usage_cols,
+        interval_hours=interval_hours,
+        tariff_schedule=tariff_schedule)
+    for month_data in regularize_months(
+            split_chunks_by_month(raw_chunks, meter_usage_cols,
+                                  interval_hours),
+            meter_usage_cols,
+            interval_hours=interval_hours):
+        streaming.update(month_data)
+    return streaming.result(), streaming.daily_max_data()
@@ -0,0 +1,449 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import json
+import os
+import time
+
+# 預設輸出資料夾與執行紀錄檔名
+OUTPUT_FOLDER = "./output/"
+MANIFEST_FILE_NAME = "run_manifest.json"
+# 情境檔中對應列舉型別的參數
+ENUM_PARAMS = {
+    "raw_contract_type": "ContractType",
+    "contract_type": "ContractType",
+    "release_type": "ReleaseType",
+    "charge_type": "ChargeType",
+}
+
+
+def load_scenarios(file_path):
+    """
+    讀取 JSON 或 YAML 情境檔，格式為 {"scenarios": [{"name": ..., 參數...}]}，
+    參數名稱與 AnalysisParameters 欄位相同，未指定者使用預設值
+    :param file_path: 情境檔路徑
+    :return: [(情境名稱, 參數字典)]
+    """
+    with open(file_path, encoding="utf-8") as f:
+        if str(file_path).endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError as e:
+                raise ImportError("讀取 YAML 情境檔需要安裝 PyYAML") from e
+            content = yaml.safe_load(f)
+        else:
+            content = json.load(f)
+    scenario_list = content.get("scenarios", []) if isinstance(
+        content, dict) else content
+    result = []
+    for i, scenario in enumerate(scenario_list):
+        scenario = dict(scenario)
+        name = str(scenario.pop("name", f"scenario_{i + 1}"))
+        # 情境名稱作為輸出資料夾名稱，不可包含路徑
+        if name in ("", ".") or any(text in name
+                                    for text in ("/", "\\", "..")):
+            raise ValueError(f"情境名稱不可包含路徑: {name}")
+        result.append((name, scenario))
+    names = [name for name, _ in result]
+    if len(set(names)) != len(names):
+        raise ValueError("情境名稱不可重複")
+    return result
+
+
+def build_analysis_params(scenario: dict):
+    """
+    將情境參數轉為 AnalysisParameters
+    :param scenario: 情境參數字典
+    :return: 分析參數
+    """
+    from dataclasses import fields
+    import electricity_lib as ec_lib
+    import taipower_analyze_lib as analyze_lib
+
+    field_names = {
+        field.name
+        for field in fields(analyze_lib.AnalysisParameters)
+    }
+    unknown = set(scenario) - field_names
+    if unknown:
+        raise ValueError(f"未知的情境參數: {sorted(unknown)}")
+    params = dict(scenario)
+    for name, enum_name in ENUM_PARAMS.items():
+        if name in params:
+            params[name] = getattr(ec_lib, enum_name)(params[name])
+    return analyze_lib.AnalysisParameters(**params)
+
+
+def get_meter_no(meter_data_path):
+    """
+    由電表資料檔名取得電表編號，例如 meter_123_data.xlsx -> 123
+    """
+    name = os.path.splitext(os.path.basename(meter_data_path))[0]
+    if name.startswith("meter_"):
+        name = name[len("meter_"):]
+    if name.endswith("_data"):
+        name = name[:-len("_data")]
+    return name
+
+
+def get_contract_path(meter_data_path):
+    """
+    取得與電表資料同資料夾的合約資料路徑 info_<電表編號>_data.xlsx
+    """
+    return os.path.join(os.path.dirname(meter_data_path),
+                        f"info_{get_meter_no(meter_data_path)}_data.xlsx")
+
+
+def contract_to_df(contract_dict_map: dict):
+    """
+    將多個合約容量字典轉為表格，每個合約一列
+    :param contract_dict_map: 合約名稱對應合約容量字典
+    :return: 合約容量表
+    """
+    import pandas as pd
+    import electricity_lib as ec_lib
+
+    return pd.DataFrame([{
+        "合約": name,
+        **{
+            usage_type.value: float(contract_dict.get(usage_type, 0.0))
+            for usage_type in ec_lib.UsageType
+        },
+    } for name, contract_dict in contract_dict_map.items()])
+
+
+def write_report(result, output_folder):
+    """
+    輸出月度流動電費與累計效益圖，只有需要報表時才載入 matplotlib
+    :param result: 分析結果
+    :param output_folder: 輸出資料夾
+    :return: 圖檔路徑列表
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import numpy as np
+    import pandas as pd
+    import taipower_analyze_lib as analyze_lib
+
+    meter_usage_cols = analyze_lib.MeterUsageColumns()
+    elec_price_cols = analyze_lib.ElectricPriceColumns()
+    yearly_profit_cols = analyze_lib.YearlyProfitColumns()
+    path_list = []
+
+    monthly_data = result.monthly_data
+    x = np.arange(len(monthly_data))
+    fig, ax = plt.subplots(figsize=(25, 10))
+    ax.bar(x - 0.125,
+           monthly_data[elec_price_cols.elec_charge_price_col],
+           width=0.25,
+           color="skyblue",
+           label="原月度流動電費")
+    ax.bar(x + 0.125,
+           monthly_data[elec_price_cols.elec_charge_price_with_battery_col],
+           width=0.25,
+           color="orange",
+           label="新月度流動電費")
+    ax.set_xticks(x)
+    ax.set_xticklabels(monthly_data[meter_usage_cols.time_col].map(
+        lambda x: analyze_lib.MONTH_LIST[x.month - 1]))
+    ax.set_title("流動電費比較表")
+    ax.legend(loc="upper right")
+    path_list.append(os.path.join(output_folder, "流動電費比較表.png"))
+    fig.savefig(path_list[-1])
+    plt.close(fig)
+
+    yearly_profit = result.yearly_profit
+    fig, ax = plt.subplots(figsize=(25, 10))
+    ax.plot(yearly_profit[yearly_profit_cols.year_col],
+            pd.to_numeric(
+                yearly_profit[yearly_profit_cols.cumulative_profit_col]),
+            color="royalblue",
+            marker="o")
+    ax.axhline(0, color="gray", linewidth=0.8)
+    ax.set_title("累計效益")
+    path_list.append(os.path.join(output_folder, "累計效益.png"))
+    fig.savefig(path_list[-1])
+    plt.close(fig)
+    return path_list
+
+
+def run_meter_scenario(task: dict):
+    """
+    執行單一電表與情境的分析並輸出結果，供程序池呼叫
+    :param task: 任務內容 (電表路徑、合約路徑、情境、輸出設定)
+    :return: 任務執行紀錄
+    """
+    start = time.perf_counter()
+    record = {
+        "meter_no": task["meter_no"],
+        "scenario": task["scenario_name"],
+        "meter_data_path": task["meter_data_path"],
+        "meter_contract_path": task["meter_contract_path"],
+        "output_folder": task["output_folder"],
+    }
+    try:
+        import analysis_pipeline_lib as pipeline_lib
+        import taipower_analyze_lib as analyze_lib
+        from result_cache_lib import ResultCache
+
+        analysis_params = build_analysis_params(task["scenario"])
+        cache = (ResultCache(task["cache_folder"])
+                 if task["cache_folder"] else None)
+        tariff_schedule = None
+        if task["tariff_folder"]:
+            import tariff_lib
+            tariff_schedule = tariff_lib.load_default_tariff_schedule(
+                task["tariff_folder"])
+        meter_data, calendar_features, meter_data_key = None, None, None
+        shared_data = task.get("shared_data")
+        if shared_data:
+            import shared_data_lib
+            meter_data = shared_data_lib.attach_frame(shared_data["data"])
+            meter_data_key = shared_data["key"]
+            calendar_folder = shared_data["calendar"].get(
+                shared_data_lib.calendar_key(analysis_params,
+                                             tariff_schedule))
+            if calendar_folder:
+                calendar_features = shared_data_lib.attach_frame(
+                    calendar_folder)
+        result = pipeline_lib.run_analysis(task["meter_data_path"],
+                                           task["meter_contract_path"],
+                                           analysis_params,
+                                           cache,
+                                           tariff_schedule=tariff_schedule,
+                                           meter_data=meter_data,
+                                           calendar_features=calendar_features,
+                                           meter_data_key=meter_data_key)
+
+        output_folder = task["output_folder"]
+        os.makedirs(output_folder, exist_ok=True)
+        file_list = [
+            os.path.join(output_folder, "年度效益.csv"),
+            os.path.join(output_folder, "月度數據.csv"),
+            os.path.join(output_folder, "合約容量.csv"),
+        ]
+        result.yearly_profit.to_csv(file_list[0],
+                                    index=False,
+                                    encoding="utf-8-sig")
+        result.monthly_data.to_csv(file_list[1],
+                                   index=False,
+                                   encoding="utf-8-sig")
+        contract_to_df({
+            "原合約": result.raw_contract_volume,
+            "新合約": result.new_contract_volume,
+        }).to_csv(file_list[2], index=False, encoding="utf-8-sig")
+        if task["report"]:
+            file_list += write_report(result, output_folder)
+
+        record.update({
+            "status": "ok",
+            "files": file_list,
+            "total_profit": float(result.yearly_profit[
+                analyze_lib.YearlyProfitColumns().cumulative_profit_col].iloc[
+                    -1]),
+        })
+    except Exception as e:
+        record.update({
+            "status": "failed",
+            "error": f"{type(e).__name__}: {e}"
+        })
+    record["seconds"] = time.perf_counter() - start
+    return record
+
+
+def publish_meter_task(task: dict):
+    """
+    讀取一個電表的資料並發布為共享陣列，供程序池呼叫，
+    失敗時回傳 None，由各情境任務自行讀取電表資料並記錄錯誤
+    :param task: 任務內容 (電表路徑、情境列表、輸出資料夾、電價表資料夾)
+    :return: shared_data_lib.publish_meter_arrays 的結果
+    """
+    try:
+        import shared_data_lib
+
+        tariff_schedule = None
+        if task["tariff_folder"]:
+            import tariff_lib
+            tariff_schedule = tariff_lib.load_default_tariff_schedule(
+                task["tariff_folder"])
+        analysis_params_list = []
+        for _, scenario in task["scenario_list"]:
+            try:
+                analysis_params_list.append(build_analysis_params(scenario))
+            except ValueError:
+                continue
+        return shared_data_lib.publish_meter_arrays(task["meter_data_path"],
+                                                    analysis_params_list,
+                                                    task["folder"],
+                                                    tariff_schedule)
+    except Exception:
+        import traceback
+
+        print(f"{task['meter_data_path']}\t共享陣列發布失敗，"
+              "改由各情境讀取電表資料")
+        traceback.print_exc()
+        return None
+
+
+def build_tasks(meter_path_list, scenario_list, output_folder, cache_folder,
+                tariff_folder, report):
+    """
+    建立電表 × 情境的任務列表
+    """
+    task_list = []
+    for meter_data_path in meter_path_list:
+        meter_no = get_meter_no(meter_data_path)
+        for scenario_name, scenario in scenario_list:
+            task_list.append({
+                "meter_no": meter_no,
+                "meter_data_path": meter_data_path,
+                "meter_contract_path": get_contract_path(meter_data_path),
+                "scenario_name": scenario_name,
+                "scenario": scenario,
+                "output_folder": os.path.join(output_folder, meter_no,
+                                              scenario_name),
+                "cache_folder": cache_folder,
+                "tariff_folder": tariff_folder,
+                "report": report,
+            })
+    return task_list
+
+
+def run(args):
+    """
+    執行 run 子命令，回傳失敗任務數
+    """
+    from result_cache_lib import hash_file
+
+    started_at = datetime.now().isoformat(timespec="seconds")
+    scenario_list = load_scenarios(args.scenario)
+    task_list = build_tasks(args.meters, scenario_list, args.output,
+                            args.cache, args.tariff_folder, args.report)
+    if args.jobs > 1 and len(task_list) > 1:
+        import shared_data_lib
+
+        # 每個電表只讀取一次，數據與日曆特徵以共享陣列傳給各情境任務
+        shared_folder = shared_data_lib.create_shared_folder()
+        try:
+            with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+                shared_data_list = list(
+                    executor.map(publish_meter_task, [{
+                        "meter_data_path": meter_data_path,
+                        "scenario_list": scenario_list,
+                        "folder": os.path.join(shared_folder, str(i)),
+                        "tariff_folder": args.tariff_folder,
+                    } for i, meter_data_path in enumerate(args.meters)]))
+                shared_data_map = dict(zip(args.meters, shared_data_list))
+                for task in task_list:
+                    task["shared_data"] = shared_data_map[
+                        task["meter_data_path"]]
+                record_list = list(executor.map(run_meter_scenario,
+                                                task_list))
+        finally:
+            shared_data_lib.remove_shared_folder(shared_folder)
+    else:
+        record_list = [run_meter_scenario(task) for task in task_list]
+
+    input_files = {
+        path: hash_file(path)
+        for path in [args.scenario, *args.meters] + [
+            task["meter_contract_path"] for task in task_list
+        ] if os.path.exists(path)
+    }
+    manifest = {
+        "started_at": started_at,
+        "finished_at": datetime.now().isoformat(timespec="seconds"),
+        "arguments": {
+            key: value
+            for key, value in vars(args).items() if key != "func"
+        },
+        "input_files": input_files,
+        "scenarios": dict(scenario_list),
+        "tasks": record_list,
+    }
+    os.makedirs(args.output, exist_ok=True)
+    with open(os.path.join(args.output, MANIFEST_FILE_NAME),
+              "w",
+              encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    failed_list = [
+        record for record in record_list if record["status"] != "ok"
+    ]
+    for record in record_list:
+        print(f"{record['meter_no']}\t{record['scenario']}\t"
+              f"{record['status']}\t{record['seconds']:.1f}s\t"
+              f"{record.get('total_profit', record.get('error', ''))}")
+    return len(failed_list)
+
+
+def check(args):
+    """
+    執行 check 子命令，輸出每個電表的資料間隔、重複時間與缺漏時段，回傳讀取失敗的電表數
+    """
+    import pandas as pd
+    import taipower_analyze_lib as analyze_lib
+
+    meter_usage_cols = analyze_lib.MeterUsageColumns()
+    summary_list, failed_count = [], 0
+    for meter_data_path in args.meters:
+        meter_no = get_meter_no(meter_data_path)
+        try:
+            _, report = analyze_lib.load_meter_data_with_report(
+                meter_data_path, meter_usage_cols)
+        except Exception as e:
+            failed_count += 1
+            print(f"{meter_no}\tfailed\t{type(e).__name__}: {e}")
+            continue
+        summary_list.append({"電表編號": meter_no, **report.summary()})
+        if len(report.gaps) > 0:
+            print(f"{meter_no} 缺漏時段:")
+            print(report.gaps.to_string(index=False))
+    if summary_list:
+        print(pd.DataFrame(summary_list).to_string(index=False))
+    return failed_count
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m taipower_analyze",
+                                     description="台電電表儲能效益分析")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run", help="執行電表 × 情境分析")
+    run_parser.add_argument("--meters",
+                            nargs="+",
+                            required=True,
+                            help="電表資料路徑 (meter_<編號>_data.xlsx)，"
+                            "合約資料需在同資料夾 (info_<編號>_data.xlsx)")
+    run_parser.add_argument("--scenario",
+                            required=True,
+                            help="情境檔 (YAML/JSON)")
+    run_parser.add_argument("--jobs", type=int, default=1, help="平行程序數")
+    run_parser.add_argument("--output",
+                            default=OUTPUT_FOLDER,
+                            help="輸出資料夾")
+    run_parser.add_argument("--cache", default=None, help="結果快取資料夾")
+    run_parser.add_argument("--tariff-folder",
+                            default=None,
+                            help="電價表資料夾，未指定時使用內建電價")
+    run_parser.add_argument("--report",
+                            action="store_true",
+                            help="輸出圖表 (需要 matplotlib)")
+    run_parser.set_defaults(func=run)
+    check_parser = subparsers.add_parser("check",
+                                         help="檢查電表資料間隔、重複時間與缺漏")
+    check_parser.add_argument("--meters",
+                              nargs="+",
+                              required=True,
+                              help="電表資料路徑 (meter_<編號>_data.xlsx)")
+    check_parser.set_defaults(func=check)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return 1 if args.func(args) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,10 +1,6 @@
-import importlib
-import pandas as pd
 from dataclasses import dataclass
 import electricity_lib as ec_lib
 
-importlib.reload(ec_lib)
-
 # 設定合約類型與釋放類型
 RAW_CONTRACT_TYPE = ec_lib.ContractType.HIGH_PRESSURE_THREE_PHASE
 CONTRACT_TYPE = ec_lib.ContractType.HIGH_PRESSURE_BATCH
@@ -22,8 +18,10 @@ BATTERY_DOD = 0.2
 
 # 設定電池容量
 DEVICE_NUMBER = 8
-BATTERY_KWH = 261 * DEVICE_NUMBER * BATTERY_BUFFER
-BATTERY_KW = 125 * DEVICE_NUMBER * BATTERY_BUFFER
+DEVICE_KWH = 261
+DEVICE_KW = 125
+BATTERY_KWH = DEVICE_KWH * DEVICE_NUMBER * BATTERY_BUFFER
+BATTERY_KW = DEVICE_KW * DEVICE_NUMBER * BATTERY_BUFFER
 
 # 設定輸出資料夾
 OUTPUT_FOLDER = f"./output/{METER_NO}/{CONTRACT_TYPE.value}/{DEVICE_NUMBER}台設備/"
@@ -34,6 +32,10 @@ DR_REACTION_FREQ = 1 / 24 / 30
 DR_ENERGY_PRICE = 4
 NEW_CONTRACT_BUFFER = 1.1
 CHARGE_LOSS = 0.85
+# 預設資料間隔 (小時)，無法由時間欄位判斷時使用
+INTERVAL_HOURS = 0.25
+# 太陽光電餘電是否優先充入電池
+ABSORB_PV_SURPLUS = True
 
 MONTH_LIST = [
     "一月",
@@ -52,8 +54,11 @@ MONTH_LIST = [
 
 # columns define
 # 預設資訊欄位
-DEFAULT_DROP_COLS = ["經常", "儲冷尖峰", "儲冷半尖峰", "儲冷週六半尖峰", "儲冷離峰", "太陽光電"]
+DEFAULT_DROP_COLS = ["經常"]
 SUM_COLS = ["尖峰", "半尖峰", "週六半尖峰", "離峰"]
+# 儲冷空調與太陽光電欄位，與用電需量一起換算為淨負載
+COLD_STORAGE_COLS = ["儲冷尖峰", "儲冷半尖峰", "儲冷週六半尖峰", "儲冷離峰"]
+PV_COL = "太陽光電"
 
 
 # 基本用電資訊欄位名稱
@@ -67,6 +72,24 @@ class MeterUsageColumns:
     battery_kwh_col: str = "電池容量"
     usage_with_battery_col: str = "增加電池後用電量"
     dr_volume_col: str = "需量反應投標量"
+    site_usage_col: str = "場域用電量"
+    cold_storage_col: str = "儲冷用電量"
+    pv_col: str = "太陽光電發電量"
+    pv_surplus_col: str = "太陽光電餘電"
+    pv_charge_kwh_col: str = "太陽光電充電量"
+
+    @property
+    def component_cols(self):
+        """
+        淨負載的組成欄位，月度加總時一併輸出
+        """
+        return [
+            self.site_usage_col,
+            self.cold_storage_col,
+            self.pv_col,
+            self.pv_surplus_col,
+            self.pv_charge_kwh_col,
+        ]
 
 
 @dataclass
@@ -82,7 +105,7 @@ class ElectricParameters:
     elec_type_dict: dict
     release_hour_dict: dict
     charge_hour_dict: dict
-    raw_contract_type = ec_lib.ContractType = RAW_CONTRACT_TYPE
+    raw_contract_type: ec_lib.ContractType = RAW_CONTRACT_TYPE
     contract_type: ec_lib.ContractType = CONTRACT_TYPE
     release_type: ec_lib.ReleaseType = RELEASE_TYPE
     CHARGE_TYPE: ec_lib.ChargeType = CHARGE_TYPE
@@ -96,6 +119,80 @@ class ElecetricPriceParameters:
     contract_price_dict: dict
 
 
+# 向量化計算使用的日曆特徵欄位名稱
+@dataclass
+class CalendarColumns:
+    season_col: str = "季節"
+    day_type_col: str = "日期類型"
+    raw_usage_type_col: str = "原用電類型"
+    usage_type_col: str = "用電類型"
+    charge_hours_col: str = "充電時段時數"
+    release_hours_col: str = "放電時段時數"
+
+
+@dataclass
+class AnalysisParameters:
+    raw_contract_type: ec_lib.ContractType = RAW_CONTRACT_TYPE
+    contract_type: ec_lib.ContractType = CONTRACT_TYPE
+    release_type: ec_lib.ReleaseType = RELEASE_TYPE
+    charge_type: ec_lib.ChargeType = CHARGE_TYPE
+    device_number: int = DEVICE_NUMBER
+    battery_buffer: float = BATTERY_BUFFER
+    battery_decay: float = BATTERY_DECAY
+    battery_dod: float = BATTERY_DOD
+    charge_loss: float = CHARGE_LOSS
+    kwh_price: float = KWH_PRICE
+    dr_avg_price: float = DR_AVG_PRICE
+    dr_reaction_freq: float = DR_REACTION_FREQ
+    dr_energy_price: float = DR_ENERGY_PRICE
+    new_contract_buffer: float = NEW_CONTRACT_BUFFER
+    absorb_pv_surplus: bool = ABSORB_PV_SURPLUS
+
+    @property
+    def battery_kwh(self):
+        return DEVICE_KWH * self.device_number * self.battery_buffer
+
+    @property
+    def battery_kw(self):
+        return DEVICE_KW * self.device_number * self.battery_buffer
+
+    def build_electric_parameters(self):
+        return ElectricParameters(
+            raw_elec_type_dict=ec_lib.get_elec_type_dict(
+                self.raw_contract_type),
+            elec_type_dict=ec_lib.get_elec_type_dict(self.contract_type),
+            release_hour_dict=ec_lib.get_release_hour_dict(
+                self.contract_type, self.release_type),
+            charge_hour_dict=ec_lib.get_charege_hour_dict(
+                self.contract_type, self.charge_type),
+            raw_contract_type=self.raw_contract_type,
+            contract_type=self.contract_type,
+            release_type=self.release_type,
+            CHARGE_TYPE=self.charge_type,
+        )
+
+    def build_electric_price_parameters(self):
+        return ElecetricPriceParameters(
+            raw_charge_price_dict=ec_lib.get_charge_price_dict(
+                self.raw_contract_type),
+            new_charge_price_dict=ec_lib.get_charge_price_dict(
+                self.contract_type),
+            raw_contract_price_dict=ec_lib.get_contract_price_dict(
+                self.raw_contract_type),
+            contract_price_dict=ec_lib.get_contract_price_dict(
+                self.contract_type),
+        )
+
+
+@dataclass
+class BatteryState:
+    """
+    跨批次延續的電池狀態
+    """
+    battery_kwh: float = 0.0
+    remain_kw: float = 0.0
+
+
 @dataclass
 class YearlyProfitColumns:
     year_col: str = "年度"
@@ -115,6 +212,124 @@ def build_output_folder():
         os.makedirs(OUTPUT_FOLDER)
 
 
+def cal_usage_from_sum_cols(data, sum_cols=SUM_COLS):
+    """
+    向量化取得 SUM_COLS 的眾數 (同數量時取最小值)，等同逐筆的 row.mode().iloc[0]
+    :param data: 原始數據
+    :param sum_cols: 各時段的需量欄位
+    :return: 每筆的用電需量
+    """
+    import numpy as np
+    values = data[sum_cols].to_numpy(dtype=float)
+    counts = (values[:, :, None] == values[:, None, :]).sum(axis=2)
+    best = counts.max(axis=1, keepdims=True)
+    candidates = (counts == best) & ~np.isnan(values)
+    usage = np.where(candidates, values, np.inf).min(axis=1)
+    return np.where(np.isinf(usage), np.nan, usage)
+
+
+def load_meter_data(file_path,
+                    meter_usage_cols: MeterUsageColumns,
+                    fill_policy=None):
+    """
+    讀取電表資料並轉換為規則間隔的每期用電量
+    :param file_path: 電表資料路徑
+    :param meter_usage_cols: 用電欄位名稱
+    :param fill_policy: 缺漏時段的補值方式，None 表示 data_quality_lib.FILL_POLICY
+    :return: 整理後的數據
+    """
+    return load_meter_data_with_report(file_path, meter_usage_cols,
+                                       fill_policy)[0]
+
+
+def load_meter_data_with_report(file_path,
+                                meter_usage_cols: MeterUsageColumns,
+                                fill_policy=None):
+    """
+    讀取電表資料，檢查間隔、重複時間與缺漏後整理為規則間隔的時間序列
+    :param file_path: 電表資料路徑
+    :param meter_usage_cols: 用電欄位名稱
+    :param fill_policy: 缺漏時段的補值方式，None 表示 data_quality_lib.FILL_POLICY
+    :return: (整理後的數據, data_quality_lib.DataQualityReport)
+    """
+    import pandas as pd
+    import data_quality_lib
+    return data_quality_lib.regularize_meter_data(
+        normalize_meter_data(pd.read_excel(file_path), meter_usage_cols),
+        meter_usage_cols.time_col,
+        fill_policy=fill_policy or data_quality_lib.FILL_POLICY,
+    )
+
+
+def get_interval_hours(data, meter_usage_cols: MeterUsageColumns):
+    """
+    由時間欄位判斷資料間隔，只計算一次相鄰時間差，不逐筆檢查
+    :param data: 數據集
+    :param meter_usage_cols: 用電欄位名稱
+    :return: 資料間隔 (小時)，不足兩筆時為 INTERVAL_HOURS
+    """
+    import data_quality_lib
+    interval = data_quality_lib.detect_interval(
+        data[meter_usage_cols.time_col])
+    return INTERVAL_HOURS if interval is None else interval.total_seconds(
+    ) / 3600
+
+
+def normalize_meter_data(raw_data,
+                         meter_usage_cols: MeterUsageColumns,
+                         interval_hours=None):
+    """
+    將原始電表欄位 (需量 kW) 轉換為時間排序的每期用電量，
+    用電總量為場域用電加上儲冷用電再扣除太陽光電的淨負載，
+    太陽光電超過用電的部分另存為餘電
+    :param raw_data: 原始電表數據
+    :param meter_usage_cols: 用電欄位名稱
+    :param interval_hours: 資料間隔 (小時)，None 表示由時間欄位判斷
+    :return: 整理後的數據
+    """
+    import numpy as np
+    import pandas as pd
+    raw_data = raw_data.drop(columns=DEFAULT_DROP_COLS, errors="ignore")
+    raw_data[meter_usage_cols.time_col] = pd.to_datetime(
+        raw_data[meter_usage_cols.time_col])
+    if interval_hours is None:
+        interval_hours = get_interval_hours(raw_data, meter_usage_cols)
+    site_usage = cal_usage_from_sum_cols(raw_data) * interval_hours
+    cold_storage_cols = [
+        col for col in COLD_STORAGE_COLS if col in raw_data.columns
+    ]
+    cold_storage = (np.nan_to_num(
+        cal_usage_from_sum_cols(raw_data, cold_storage_cols)) *
+                    interval_hours if cold_storage_cols else np.zeros(len(raw_data)))
+    pv = (np.nan_to_num(raw_data[PV_COL].to_numpy(dtype=float)) *
+          interval_hours if PV_COL in raw_data.columns else np.zeros(len(raw_data)))
+    net_usage = site_usage + cold_storage - pv
+    raw_data[meter_usage_cols.usage_col] = np.where(net_usage > 0, net_usage,
+                                                    np.where(
+                                                        np.isnan(net_usage),
+                                                        np.nan, 0.0))
+    raw_data[meter_usage_cols.site_usage_col] = site_usage
+    raw_data[meter_usage_cols.cold_storage_col] = cold_storage
+    raw_data[meter_usage_cols.pv_col] = pv
+    raw_data[meter_usage_cols.pv_surplus_col] = np.where(
+        net_usage < 0, -net_usage, 0.0)
+    raw_data = raw_data.drop(columns=SUM_COLS + cold_storage_cols + [PV_COL],
+                             errors="ignore")
+    raw_data = raw_data.sort_values(by=[meter_usage_cols.time_col],
+                                    ascending=True)
+    return raw_data.reset_index(drop=True)
+
+
+def load_meter_contract(file_path):
+    """
+    讀取電表合約容量
+    :param file_path: 合約資料路徑
+    :return: 合約容量
+    """
+    import pandas as pd
+    return contract_df_to_dict(pd.read_excel(file_path))
+
+
 def contract_df_to_dict(df):
     return {
         ec_lib.UsageType.PEAK: df["UsuallyContract"].values[0],
@@ -131,6 +346,7 @@ def group_all_data_withour_dr_in_freq(
     usage_cols: MeterUsageColumns,
     elec_price_cols: ElectricPriceColumns,
 ):
+    import pandas as pd
     # 按日期統計用電總量
     return (data.groupby(pd.Grouper(key=usage_cols.time_col, freq=freq)).agg({
         usage_cols.usage_col:
@@ -149,6 +365,10 @@ def group_all_data_withour_dr_in_freq(
         "sum",
         elec_price_cols.elec_charge_price_with_battery_col:
         "sum",
+        **{
+            col: "sum"
+            for col in usage_cols.component_cols if col in data.columns
+        },
     }).reset_index())
 
 
@@ -158,6 +378,7 @@ def group_all_data_in_freq(
     usage_cols: MeterUsageColumns,
     elec_price_cols: ElectricPriceColumns,
 ):
+    import pandas as pd
     # 按日期統計用電總量
     return (data.groupby(pd.Grouper(key=usage_cols.time_col, freq=freq)).agg({
         usage_cols.usage_col:
@@ -180,6 +401,10 @@ def group_all_data_in_freq(
         "sum",
         elec_price_cols.demand_price_col:
         "sum",
+        **{
+            col: "sum"
+            for col in usage_cols.component_cols if col in data.columns
+        },
     }).reset_index())
 
 
@@ -189,6 +414,7 @@ def group_max_data_in_freq(
     usage_cols: MeterUsageColumns,
     elec_price_cols: ElectricPriceColumns,
 ):
+    import pandas as pd
     # 按日期統計用電總量
     return (data.groupby(pd.Grouper(key=usage_cols.time_col, freq=freq)).agg({
         usage_cols.usage_col:
@@ -220,6 +446,7 @@ def group_max_data_without_dr_in_freq(
     usage_cols: MeterUsageColumns,
     elec_price_cols: ElectricPriceColumns,
 ):
+    import pandas as pd
     # 按日期統計用電總量
     return (data.groupby(pd.Grouper(key=usage_cols.time_col, freq=freq)).agg({
         usage_cols.usage_col:
@@ -296,6 +523,7 @@ def filter_expensive_usage_in_freq(
 
 def cal_default_charge_kw(date, charge_hour_dict,
                           charge_type: ec_lib.ChargeType):
+    import pandas as pd
     charge_hour_list = []
     if ec_lib.is_summer(date):
         charge_hour_list = charge_hour_dict.get(ec_lib.SeasonType.SUMMER)
@@ -325,6 +553,7 @@ def cal_default_charge_kw(date, charge_hour_dict,
 
 
 def cal_default_release_kw(date, release_hour_dict, release_type):
+    import pandas as pd
     release_hour_list = []
     if ec_lib.is_summer(date):
         release_hour_list = release_hour_dict.get(ec_lib.SeasonType.SUMMER)
@@ -347,10 +576,13 @@ def cal_default_release_kw(date, release_hour_dict, release_type):
     return release_power
 
 
-def cal_actual_release_power(usage, default_release_kw, last_remain_kw,
-                             last_battery_kwh):
+def cal_actual_release_power(usage,
+                             default_release_kw,
+                             last_remain_kw,
+                             last_battery_kwh,
+                             interval_hours=INTERVAL_HOURS):
     release_kw = 0.0
-    usage_kw = usage * 4
+    usage_kw = usage / interval_hours
     if last_battery_kwh > BATTERY_KWH * BATTERY_DOD:
         if usage_kw > default_release_kw:
             sum_kw = default_release_kw + last_remain_kw
@@ -366,8 +598,10 @@ def cal_actual_release_power(usage, default_release_kw, last_remain_kw,
                     release_kw = usage_kw
         else:
             release_kw = usage_kw
-        if release_kw / 4 > (last_battery_kwh - BATTERY_KWH * BATTERY_DOD):
-            release_kw = (last_battery_kwh - BATTERY_KWH * BATTERY_DOD) * 4
+        if release_kw * interval_hours > (last_battery_kwh -
+                                          BATTERY_KWH * BATTERY_DOD):
+            release_kw = (last_battery_kwh -
+                          BATTERY_KWH * BATTERY_DOD) / interval_hours
     return release_kw
 
 
@@ -377,6 +611,7 @@ def process_battery_usage(
     elec_parameters: ElectricParameters,
     remain_battery_kw_list,
     battery_kwh_list,
+    interval_hours=INTERVAL_HOURS,
 ):
     date_time = row[meter_usage_col.time_col]
     origin_usage = row[meter_usage_col.usage_col]
@@ -399,7 +634,8 @@ def process_battery_usage(
                 battery_kw = cal_actual_release_power(origin_usage,
                                                       default_release_kw,
                                                       last_remain_kw,
-                                                      last_battery_kwh)
+                                                      last_battery_kwh,
+                                                      interval_hours)
                 if battery_kw < (default_release_kw + last_remain_kw):
                     remain_battery_kw_list.append((default_release_kw +
                                                    last_remain_kw) -
@@ -409,12 +645,12 @@ def process_battery_usage(
             else:
                 battery_kw = 0.0
         else:
-            if (BATTERY_KWH - last_battery_kwh) > charge_kw / 4:
+            if (BATTERY_KWH - last_battery_kwh) > charge_kw * interval_hours:
                 battery_kw = -charge_kw
             else:
-                battery_kw = -(BATTERY_KWH - last_battery_kwh) * 4
+                battery_kw = -(BATTERY_KWH - last_battery_kwh) / interval_hours
             remain_battery_kw_list.append(0.0)
-    battery_kwh = battery_kw / 4
+    battery_kwh = battery_kw * interval_hours
     battery_kwh_list.append(last_battery_kwh - battery_kwh)
     return (
         battery_kw,
@@ -425,6 +661,408 @@ def process_battery_usage(
     )
 
 
+def _get_window_hours(hour_list, merge_wrap):
+    """
+    計算每個時段的起訖 (當日奈秒) 與時數，等同逐筆版本的時段長度計算
+    :param hour_list: 時段列表
+    :param merge_wrap: 是否合併跨日相連的時段 (充電時段)
+    :return: [(起, 訖, 時數)]
+    """
+    bounds = ec_lib.time_list_to_ns(hour_list)
+    day_ns = 24 * 3600 * 10**9
+    window_list = []
+    for i in range(0, len(bounds), 2):
+        time_duration = (bounds[i + 1] - bounds[i]) // 10**9 + 1
+        if merge_wrap and i > 1:
+            if bounds[i + 1] == (bounds[0] - 10**9) % day_ns:
+                time_duration += (bounds[1] - bounds[0]) // 10**9 + 1
+        window_list.append((bounds[i], bounds[i + 1], time_duration / 3600.0))
+    return window_list
+
+
+def cal_window_hours_vectorized(date_times, hour_dict, merge_wrap,
+                                is_summer=None):
+    """
+    向量化計算每筆時間所在充/放電時段的時數，不在時段內為 0
+    :param date_times: 日期時間序列
+    :param hour_dict: 充/放電時段
+    :param merge_wrap: 是否合併跨日相連的時段
+    :param is_summer: 預先計算的夏月布林陣列
+    :return: 時數陣列
+    """
+    import numpy as np
+    if is_summer is None:
+        is_summer = ec_lib.is_summer_vectorized(date_times)
+    time_of_day_ns = ec_lib.get_time_of_day_ns(date_times)
+    window_hours = np.zeros(len(time_of_day_ns))
+    for season in (ec_lib.SeasonType.SUMMER, ec_lib.SeasonType.NONSUMMER):
+        unmatched = is_summer if season == ec_lib.SeasonType.SUMMER else ~is_summer
+        for start_ns, end_ns, hours in _get_window_hours(
+                hour_dict.get(season), merge_wrap):
+            # 與逐筆版本相同，只取第一個符合的時段
+            mask = unmatched & (start_ns <= time_of_day_ns) & (time_of_day_ns
+                                                               <= end_ns)
+            window_hours[mask] = hours
+            unmatched = unmatched & ~mask
+    return window_hours
+
+
+def cal_calendar_features(data, meter_usage_cols: MeterUsageColumns,
+                          calendar_cols: CalendarColumns,
+                          elec_params: ElectricParameters):
+    """
+    一次計算季節、日期類型、用電類型與充放電時段等日曆特徵
+    :param data: 數據集
+    :param meter_usage_cols: 用電欄位名稱
+    :param calendar_cols: 日曆特徵欄位名稱
+    :param elec_params: 用電參數
+    :return: 日曆特徵
+    """
+    import numpy as np
+    import pandas as pd
+    date_times = pd.DatetimeIndex(data[meter_usage_cols.time_col])
+    is_summer = ec_lib.is_summer_vectorized(date_times)
+    season_codes = ec_lib.get_season_codes(date_times)
+    day_type_codes = ec_lib.get_day_type_codes(date_times)
+    is_workday = day_type_codes == ec_lib.DAY_TYPE_LIST.index(
+        ec_lib.DayType.WORKDAY)
+    return pd.DataFrame(
+        {
+            calendar_cols.season_col:
+            season_codes,
+            calendar_cols.day_type_col:
+            day_type_codes,
+            calendar_cols.raw_usage_type_col:
+            ec_lib.get_usage_type_codes(date_times,
+                                        elec_params.raw_elec_type_dict,
+                                        season_codes, day_type_codes),
+            calendar_cols.usage_type_col:
+            ec_lib.get_usage_type_codes(date_times,
+                                        elec_params.elec_type_dict,
+                                        season_codes, day_type_codes),
+            calendar_cols.charge_hours_col:
+            np.where(
+                is_workday,
+                cal_window_hours_vectorized(date_times,
+                                            elec_params.charge_hour_dict,
+                                            True, is_summer),
+                0.0,
+            ),
+            calendar_cols.release_hours_col:
+            np.where(
+                is_workday,
+                cal_window_hours_vectorized(date_times,
+                                            elec_params.release_hour_dict,
+                                            False, is_summer),
+                0.0,
+            ),
+        },
+        index=data.index,
+    )
+
+
+def cal_default_charge_kw_vectorized(charge_hours, charge_type,
+                                     battery_kwh, battery_kw, battery_dod):
+    """
+    向量化版 cal_default_charge_kw，電池容量可為陣列以批次模擬
+    :param charge_hours: 充電時段時數 (T,)
+    :return: 預設充電功率 (T,) 或 (T, B)
+    """
+    import numpy as np
+    charge_hours = np.asarray(charge_hours, dtype=float)[:, None]
+    battery_kwh = np.atleast_1d(np.asarray(battery_kwh, dtype=float))
+    battery_kw = np.atleast_1d(np.asarray(battery_kw, dtype=float))
+    in_window = charge_hours > 0
+    if charge_type == ec_lib.ChargeType.MAX:
+        charge_power = np.where(in_window, battery_kw, 0.0)
+    else:
+        with np.errstate(divide="ignore"):
+            charge_power = np.where(
+                in_window, (battery_kwh * (1 - battery_dod)) / charge_hours,
+                0.0)
+    return charge_power
+
+
+def cal_default_release_kw_vectorized(release_hours, release_type,
+                                      battery_kwh, battery_kw, battery_dod):
+    """
+    向量化版 cal_default_release_kw，電池容量可為陣列以批次模擬
+    :param release_hours: 放電時段時數 (T,)
+    :return: 預設放電功率 (T, B)
+    """
+    import numpy as np
+    release_hours = np.asarray(release_hours, dtype=float)[:, None]
+    battery_kwh = np.atleast_1d(np.asarray(battery_kwh, dtype=float))
+    battery_kw = np.atleast_1d(np.asarray(battery_kw, dtype=float))
+    in_window = release_hours > 0
+    if release_type == ec_lib.ReleaseType.MAX:
+        release_power = np.where(in_window, battery_kw, 0.0)
+    else:
+        with np.errstate(divide="ignore"):
+            average_power = battery_kwh * (1 - battery_dod) / release_hours
+        release_power = np.where(
+            in_window,
+            np.where(average_power <= battery_kw, average_power, battery_kw),
+            0.0)
+    return release_power
+
+
+def cal_default_power_vectorized(calendar_features,
+                                 calendar_cols: CalendarColumns,
+                                 analysis_params: AnalysisParameters,
+                                 battery_kwh, battery_kw):
+    """
+    由日曆特徵計算預設充/放電功率
+    :param calendar_features: cal_calendar_features 的結果
+    :param calendar_cols: 日曆特徵欄位名稱
+    :param analysis_params: 分析參數
+    :param battery_kwh: 電池容量，純量或 (B,)
+    :param battery_kw: 電池功率，純量或 (B,)
+    :return: (預設充電功率, 預設放電功率)，皆為 (T, B)
+    """
+    charge_kw = cal_default_charge_kw_vectorized(
+        calendar_features[calendar_cols.charge_hours_col].to_numpy(),
+        analysis_params.charge_type, battery_kwh, battery_kw,
+        analysis_params.battery_dod)
+    release_kw = cal_default_release_kw_vectorized(
+        calendar_features[calendar_cols.release_hours_col].to_numpy(),
+        analysis_params.release_type, battery_kwh, battery_kw,
+        analysis_params.battery_dod)
+    return charge_kw, release_kw
+
+
+def _as_batch_columns(values):
+    import numpy as np
+    values = np.asarray(values, dtype=float)
+    return values[:, None] if values.ndim == 1 else values
+
+
+def simulate_battery_dispatch(
+    usage_kwh,
+    charge_kw,
+    release_kw,
+    battery_kwh,
+    battery_kw,
+    battery_dod=BATTERY_DOD,
+    charge_loss=CHARGE_LOSS,
+    initial_state: BatteryState = None,
+    event_kw=None,
+    surplus_kwh=None,
+    interval_hours=INTERVAL_HOURS,
+):
+    """
+    向量化狀態引擎，逐時間步推進，同時模擬 B 組電池設定
+    :param usage_kwh: 每期用電量 (T,) 或 (T, B)
+    :param charge_kw: 預設充電功率 (T, B)，非充電時段為 0
+    :param release_kw: 預設放電功率 (T, B)，非放電時段為 0
+    :param battery_kwh: 電池容量，純量或 (B,)
+    :param battery_kw: 電池功率，純量或 (B,)
+    :param initial_state: 前一批次結束時的電池狀態
+    :param event_kw: 需量反應事件要求的放電功率 (T, B)，非事件時段為 0
+    :param surplus_kwh: 每期太陽光電餘電 (T,) 或 (T, B)，優先充入電池且不計入電網用電
+    :param interval_hours: 每期的時數，用於 kW 與 kWh 換算
+    :return: (電池放電功率, 電池容量, 增加電池後用電量, 電池充電量, 電池放電量, 電池狀態)，
+             電池充電量只含電網充電
+    """
+    import numpy as np
+    usage_kwh = _as_batch_columns(usage_kwh)
+    charge_kw = _as_batch_columns(charge_kw)
+    release_kw = _as_batch_columns(release_kw)
+    event_kw = _as_batch_columns(
+        np.zeros(len(usage_kwh)) if event_kw is None else event_kw)
+    surplus_kwh = _as_batch_columns(
+        np.zeros(len(usage_kwh)) if surplus_kwh is None else surplus_kwh)
+    batch_size = max(usage_kwh.shape[1], charge_kw.shape[1],
+                     release_kw.shape[1], event_kw.shape[1],
+                     surplus_kwh.shape[1], np.size(battery_kwh),
+                     np.size(battery_kw))
+    shape = (usage_kwh.shape[0], batch_size)
+    usage_kwh = np.broadcast_to(usage_kwh, shape)
+    charge_kw = np.broadcast_to(charge_kw, shape)
+    release_kw = np.broadcast_to(release_kw, shape)
+    event_kw = np.broadcast_to(event_kw, shape)
+    surplus_kwh = np.broadcast_to(surplus_kwh, shape)
+    max_kwh = np.broadcast_to(np.asarray(battery_kwh, dtype=float),
+                              (batch_size, ))
+    max_kw = np.broadcast_to(np.asarray(battery_kw, dtype=float),
+                             (batch_size, ))
+    min_kwh = max_kwh * battery_dod
+
+    if initial_state is None:
+        initial_state = BatteryState()
+    soc = np.broadcast_to(np.asarray(initial_state.battery_kwh, dtype=float),
+                          (batch_size, )).copy()
+    remain = np.broadcast_to(np.asarray(initial_state.remain_kw, dtype=float),
+                             (batch_size, )).copy()
+
+    battery_kw_result = np.zeros(shape)
+    grid_kw_result = np.zeros(shape)
+    battery_kwh_result = np.empty(shape)
+    # 只有充放電時段的資料會改變電池狀態，其餘時間直接沿用
+    active_rows = np.flatnonzero(
+        ((charge_kw != 0) | (release_kw != 0) | (event_kw != 0)
+         | (surplus_kwh != 0)).any(axis=1))
+    last_row = 0
+    for row in active_rows:
+        battery_kwh_result[last_row:row] = soc
+        default_charge_kw = charge_kw[row]
+        default_release_kw = release_kw[row]
+        usage_kw = usage_kwh[row] / interval_hours
+
+        # 太陽光電餘電先充入電池，剩餘空間與功率才由電網充電
+        pv_power = np.minimum(
+            np.minimum(surplus_kwh[row] / interval_hours, max_kw),
+            np.maximum(max_kwh - soc, 0.0) / interval_hours)
+        soc = soc + pv_power * interval_hours
+
+        is_charge = default_charge_kw != 0.0
+        room_kwh = max_kwh - soc
+        charge_power = np.where(room_kwh > default_charge_kw * interval_hours,
+                                -default_charge_kw, -room_kwh / interval_hours)
+        charge_power = np.where(pv_power > 0.0,
+                                np.maximum(charge_power, pv_power - max_kw),
+                                charge_power)
+
+        is_release = (~is_charge) & (default_release_kw != 0.0) & (soc > 0.0)
+        sum_kw = default_release_kw + remain
+        release_power = np.where(
+            usage_kw > default_release_kw,
+            np.where(
+                sum_kw <= max_kw,
+                np.where(usage_kw > sum_kw, sum_kw, usage_kw),
+                np.where(usage_kw > max_kw, max_kw, usage_kw),
+            ),
+            usage_kw,
+        )
+        release_power = np.where(
+            release_power * interval_hours > (soc - min_kwh),
+            (soc - min_kwh) / interval_hours, release_power)
+        release_power = np.where(soc > min_kwh, release_power, 0.0)
+
+        power = np.where(is_charge, charge_power,
+                         np.where(is_release, release_power, 0.0))
+        # 需量反應事件期間依要求功率放電，取代預設充放電排程
+        is_event = event_kw[row] > 0.0
+        event_power = np.minimum(
+            np.minimum(event_kw[row], max_kw),
+            np.maximum((soc - min_kwh) / interval_hours, 0.0))
+        remain = np.where(
+            is_charge | is_event, np.where(is_event, remain, 0.0),
+            np.where(is_release,
+                     np.where(power < sum_kw, sum_kw - power, 0.0), remain))
+        power = np.where(is_event, event_power, power)
+        soc = soc - power * interval_hours
+        battery_kw_result[row] = power - pv_power
+        grid_kw_result[row] = power
+        battery_kwh_result[row] = soc
+        last_row = row + 1
+    battery_kwh_result[last_row:] = soc
+
+    step_kwh = grid_kw_result * interval_hours
+    result = (
+        battery_kw_result,
+        battery_kwh_result,
+        usage_kwh - step_kwh,
+        np.where(step_kwh < 0, step_kwh / charge_loss, 0.0),
+        np.where(step_kwh > 0, step_kwh, 0.0),
+    )
+    if batch_size == 1 and np.ndim(battery_kwh) == 0:
+        result = tuple(column[:, 0] for column in result)
+        final_state = BatteryState(float(soc[0]), float(remain[0]))
+    else:
+        final_state = BatteryState(soc, remain)
+    return result + (final_state, )
+
+
+def get_surplus_kwh(data, meter_usage_cols: MeterUsageColumns,
+                    analysis_params: AnalysisParameters):
+    """
+    取得充放電模擬使用的太陽光電餘電
+    :param data: 數據集
+    :param meter_usage_cols: 用電欄位名稱
+    :param analysis_params: 分析參數
+    :return: 每期太陽光電餘電，沒有餘電欄位或不充入電池時為 None
+    """
+    import numpy as np
+    if (meter_usage_cols.pv_surplus_col not in data.columns
+            or not analysis_params.absorb_pv_surplus):
+        return None
+    return np.nan_to_num(
+        data[meter_usage_cols.pv_surplus_col].to_numpy(dtype=float))
+
+
+def add_pv_charge_kwh(data, meter_usage_cols: MeterUsageColumns,
+                      interval_hours):
+    """
+    有太陽光電餘電欄位時，於充放電結果加上太陽光電充電量欄位
+    :param data: 增加充放電欄位後的數據，直接修改
+    :param meter_usage_cols: 用電欄位名稱
+    :param interval_hours: 資料間隔 (小時)
+    """
+    if meter_usage_cols.pv_surplus_col in data.columns:
+        # 電池總充放電量扣除電網部分即為太陽光電充入的電量
+        data[meter_usage_cols.pv_charge_kwh_col] = (
+            data[meter_usage_cols.usage_col] -
+            data[meter_usage_cols.usage_with_battery_col] -
+            data[meter_usage_cols.battery_kw_col] * interval_hours)
+
+
+def process_battery_usage_vectorized(
+    data,
+    calendar_features,
+    meter_usage_cols: MeterUsageColumns,
+    calendar_cols: CalendarColumns,
+    analysis_params: AnalysisParameters,
+    initial_state: BatteryState = None,
+    interval_hours=None,
+):
+    """
+    向量化版 process_battery_usage，一次計算整段數據的充放電結果
+    :param data: 數據集
+    :param calendar_features: cal_calendar_features 的結果
+    :param meter_usage_cols: 用電欄位名稱
+    :param calendar_cols: 日曆特徵欄位名稱
+    :param analysis_params: 分析參數
+    :param initial_state: 前一批次結束時的電池狀態
+    :param interval_hours: 資料間隔 (小時)，None 表示由時間欄位判斷
+    :return: (增加充放電欄位後的數據, 電池狀態)
+    """
+    if interval_hours is None:
+        interval_hours = get_interval_hours(data, meter_usage_cols)
+    battery_kwh = analysis_params.battery_kwh
+    battery_kw = analysis_params.battery_kw
+    charge_kw, release_kw = cal_default_power_vectorized(
+        calendar_features, calendar_cols, analysis_params, battery_kwh,
+        battery_kw)
+    (*columns, final_state) = simulate_battery_dispatch(
+        data[meter_usage_cols.usage_col].to_numpy(),
+        charge_kw,
+        release_kw,
+        battery_kwh,
+        battery_kw,
+        analysis_params.battery_dod,
+        analysis_params.charge_loss,
+        initial_state,
+        surplus_kwh=get_surplus_kwh(data, meter_usage_cols, analysis_params),
+        interval_hours=interval_hours,
+    )
+    # 淺複製後只新增欄位，不複製原有欄位 (可能是共享的唯讀記憶體映射)
+    data = data.copy(deep=False)
+    for col, values in zip(
+        [
+            meter_usage_cols.battery_kw_col,
+            meter_usage_cols.battery_kwh_col,
+            meter_usage_cols.usage_with_battery_col,
+            meter_usage_cols.charge_kwh_col,
+            meter_usage_cols.release_kwh_col,
+        ],
+            columns,
+    ):
+        data[col] = values
+    add_pv_charge_kwh(data, meter_usage_cols, interval_hours)
+    return data, final_state
+
+
 def cal_dr_volume_and_price(usage_kwh, battery_kw, battery_kwh):
     """
     計算 DR 量&價錢
@@ -458,6 +1096,7 @@ def cal_hourly_dr_price(raw_data, meter_usage_cols: MeterUsageColumns,
     :param meter_usage_cols: 用電欄位名稱
     :return: 每小時的 DR 量&價格
     """
+    import pandas as pd
     hourly_data = group_all_data_withour_dr_in_freq(raw_data, "h",
                                                     meter_usage_cols,
                                                     elec_price_cols)
@@ -476,6 +1115,64 @@ def cal_hourly_dr_price(raw_data, meter_usage_cols: MeterUsageColumns,
     return hourly_data
 
 
+def cal_dr_volume_and_price_vectorized(usage_kwh,
+                                       battery_kw,
+                                       battery_kwh,
+                                       analysis_params: AnalysisParameters,
+                                       max_battery_kw=None):
+    """
+    向量化版 cal_dr_volume_and_price
+    :param usage_kwh: 用電量
+    :param battery_kw: 電池功率
+    :param battery_kwh: 電池容量
+    :param analysis_params: 分析參數
+    :param max_battery_kw: 電池最大功率，預設為 analysis_params.battery_kw
+    :return: DR 量&價錢
+    """
+    import numpy as np
+    usage_kwh = np.asarray(usage_kwh, dtype=float)
+    battery_kw = np.asarray(battery_kw, dtype=float)
+    battery_kwh = np.asarray(battery_kwh, dtype=float)
+    if max_battery_kw is None:
+        max_battery_kw = analysis_params.battery_kw
+    remain_kw = max_battery_kw - battery_kw
+    dr_volume = np.where(battery_kw < max_battery_kw,
+                         np.where(remain_kw > usage_kwh, usage_kwh, remain_kw),
+                         0.0)
+    dr_volume = np.where(dr_volume > battery_kwh, battery_kwh, dr_volume)
+    dr_mwh = dr_volume / 1000
+    dr_price = (dr_mwh * analysis_params.dr_avg_price +
+                dr_mwh * 1000 * analysis_params.dr_reaction_freq *
+                analysis_params.dr_energy_price)
+    return dr_mwh, dr_price
+
+
+def cal_hourly_dr_price_vectorized(raw_data,
+                                   meter_usage_cols: MeterUsageColumns,
+                                   elec_price_cols: ElectricPriceColumns,
+                                   analysis_params: AnalysisParameters):
+    """
+    向量化版 cal_hourly_dr_price
+    :param raw_data: 原始數據
+    :param meter_usage_cols: 用電欄位名稱
+    :param analysis_params: 分析參數
+    :return: 每小時的 DR 量&價格
+    """
+    hourly_data = group_all_data_withour_dr_in_freq(raw_data, "h",
+                                                    meter_usage_cols,
+                                                    elec_price_cols)
+    (
+        hourly_data[meter_usage_cols.dr_volume_col],
+        hourly_data[elec_price_cols.demand_price_col],
+    ) = cal_dr_volume_and_price_vectorized(
+        hourly_data[meter_usage_cols.usage_with_battery_col].to_numpy(),
+        hourly_data[meter_usage_cols.battery_kw_col].to_numpy(),
+        hourly_data[meter_usage_cols.battery_kwh_col].to_numpy(),
+        analysis_params,
+    )
+    return hourly_data
+
+
 def cal_elec_price(
     row,
     meter_usage_cols: MeterUsageColumns,
@@ -502,6 +1199,36 @@ def cal_elec_price(
     )
 
 
+def cal_elec_price_vectorized(
+    data,
+    calendar_features,
+    meter_usage_cols: MeterUsageColumns,
+    calendar_cols: CalendarColumns,
+    elec_price_params: ElecetricPriceParameters,
+):
+    """
+    向量化版 cal_elec_price，以 (季節, 用電類型) 價格矩陣查表
+    :param data: 含充放電欄位的數據
+    :param calendar_features: cal_calendar_features 的結果
+    :return: (原始流動電價, 增加電池後流動電價)
+    """
+    season_codes = calendar_features[calendar_cols.season_col].to_numpy()
+    raw_price = ec_lib.price_dict_to_matrix(
+        elec_price_params.raw_charge_price_dict)[
+            season_codes,
+            calendar_features[calendar_cols.raw_usage_type_col].to_numpy()]
+    new_price = ec_lib.price_dict_to_matrix(
+        elec_price_params.new_charge_price_dict)[
+            season_codes,
+            calendar_features[calendar_cols.usage_type_col].to_numpy()]
+    usage = data[meter_usage_cols.usage_col].to_numpy()
+    return (
+        usage * raw_price,
+        (usage - data[meter_usage_cols.charge_kwh_col].to_numpy() -
+         data[meter_usage_cols.release_kwh_col].to_numpy()) * new_price,
+    )
+
+
 def filter_season_data(raw_data, meter_usage_cols: MeterUsageColumns,
                        season_type: ec_lib.SeasonType):
     """
@@ -530,12 +1257,6 @@ def cal_new_contract_volume(expensive_15_usage, nonexpensive_15_usage,
     :param meter_usage_cols: 用電欄位名稱
     :return: 新合約的用電量
     """
-    (
-        max_usually_contract_volume,
-        max_semi_peak_contract_volume,
-        max_saturday_semi_peak_contract_volume,
-        max_off_peak_contract_volume,
-    ) = (0.0, 0.0, 0.0, 0.0)
     max_peak, max_semi_peak = 0.0, 0.0
     if contract_type == ec_lib.ContractType.HIGH_PRESSURE_THREE_PHASE:
         summer_expensive_15 = filter_season_data(expensive_15_usage,
@@ -550,11 +1271,43 @@ def cal_new_contract_volume(expensive_15_usage, nonexpensive_15_usage,
     elif contract_type == ec_lib.ContractType.HIGH_PRESSURE_BATCH:
         max_peak = expensive_15_usage[
             meter_usage_cols.usage_with_battery_col].max()
-    max_saturday_semi_peak_contract_volume = nonexpensive_15_usage[
-        meter_usage_cols.usage_with_battery_col].max() * 4
+    max_nonexpensive = nonexpensive_15_usage[
+        meter_usage_cols.usage_with_battery_col].max()
+    return cal_new_contract_volume_from_max(max_peak, max_semi_peak,
+                                            max_nonexpensive, contract_type,
+                                            raw_contract)
+
+
+def cal_new_contract_volume_from_max(
+        max_peak,
+        max_semi_peak,
+        max_nonexpensive,
+        contract_type: ec_lib.ContractType,
+        raw_contract: dict,
+        new_contract_buffer=NEW_CONTRACT_BUFFER,
+        interval_hours=INTERVAL_HOURS):
+    """
+    由尖峰/非尖峰的每期最大用電量計算新合約容量
+    :param max_peak: 尖峰 (三段式為夏月尖峰) 最大用電量
+    :param max_semi_peak: 三段式非夏月半尖峰最大用電量
+    :param max_nonexpensive: 非尖峰時段最大用電量
+    :param contract_type: 合約類型
+    :param raw_contract: 原合約容量
+    :param new_contract_buffer: 新合約容量緩衝
+    :param interval_hours: 資料間隔 (小時)，最大用電量除以時數即為最大需量
+    :return: 新合約的用電量
+    """
+    (
+        max_usually_contract_volume,
+        max_semi_peak_contract_volume,
+        max_saturday_semi_peak_contract_volume,
+        max_off_peak_contract_volume,
+    ) = (0.0, 0.0, 0.0, 0.0)
+    max_saturday_semi_peak_contract_volume = max_nonexpensive / interval_hours
     
-    max_usually_contract_volume = max_peak * 4
-    max_semi_peak_contract_volume = max_semi_peak * 4 - max_usually_contract_volume
+    max_usually_contract_volume = max_peak / interval_hours
+    max_semi_peak_contract_volume = (max_semi_peak / interval_hours -
+                                     max_usually_contract_volume)
     max_saturday_semi_peak_contract_volume = (
         max_saturday_semi_peak_contract_volume - max_usually_contract_volume -
         max_semi_peak_contract_volume)
@@ -564,12 +1317,12 @@ def cal_new_contract_volume(expensive_15_usage, nonexpensive_15_usage,
         return {
             ec_lib.UsageType.PEAK:
             max_usually_contract_volume *
-            NEW_CONTRACT_BUFFER if max_usually_contract_volume *
-            NEW_CONTRACT_BUFFER < raw_usually_contract_volume else
+            new_contract_buffer if max_usually_contract_volume *
+            new_contract_buffer < raw_usually_contract_volume else
             raw_usually_contract_volume,
             ec_lib.UsageType.SATURDAY_SEMI_PEAK:
             ((max_semi_peak_contract_volume +
-              max_saturday_semi_peak_contract_volume) * NEW_CONTRACT_BUFFER if
+              max_saturday_semi_peak_contract_volume) * new_contract_buffer if
              (max_semi_peak_contract_volume +
               max_saturday_semi_peak_contract_volume) > 0 else 0.0),
             ec_lib.UsageType.OFF_PEAK:
@@ -579,20 +1332,91 @@ def cal_new_contract_volume(expensive_15_usage, nonexpensive_15_usage,
         return {
             ec_lib.UsageType.PEAK:
             max_usually_contract_volume *
-            NEW_CONTRACT_BUFFER if max_usually_contract_volume *
-            NEW_CONTRACT_BUFFER < raw_usually_contract_volume else
+            new_contract_buffer if max_usually_contract_volume *
+            new_contract_buffer < raw_usually_contract_volume else
             raw_usually_contract_volume,
             ec_lib.UsageType.SEMI_PEAK:
-            (max_semi_peak_contract_volume * NEW_CONTRACT_BUFFER
+            (max_semi_peak_contract_volume * new_contract_buffer
              if max_semi_peak_contract_volume > 0 else 0.0),
             ec_lib.UsageType.SATURDAY_SEMI_PEAK:
-            (max_saturday_semi_peak_contract_volume * NEW_CONTRACT_BUFFER
+            (max_saturday_semi_peak_contract_volume * new_contract_buffer
              if max_saturday_semi_peak_contract_volume > 0 else 0.0),
             ec_lib.UsageType.OFF_PEAK:
             max_off_peak_contract_volume,
         }
 
 
+def is_expensive_hour_vectorized(calendar_features,
+                                 calendar_cols: CalendarColumns,
+                                 contract_type: ec_lib.ContractType):
+    """
+    向量化版 is_expensive_hour
+    :param calendar_features: cal_calendar_features 的結果
+    :param calendar_cols: 日曆特徵欄位名稱
+    :param contract_type: 合約類型
+    :return: 是否為尖峰時段的布林陣列
+    """
+    is_summer = calendar_features[calendar_cols.season_col].to_numpy(
+    ) == ec_lib.SEASON_TYPE_LIST.index(ec_lib.SeasonType.SUMMER)
+    usage_codes = calendar_features[calendar_cols.usage_type_col].to_numpy()
+    is_peak = usage_codes == ec_lib.USAGE_TYPE_LIST.index(ec_lib.UsageType.PEAK)
+    if contract_type == ec_lib.ContractType.HIGH_PRESSURE_THREE_PHASE:
+        is_semi_peak = usage_codes == ec_lib.USAGE_TYPE_LIST.index(
+            ec_lib.UsageType.SEMI_PEAK)
+        return (is_summer & is_peak) | (~is_summer & is_semi_peak)
+    return is_peak
+
+
+def cal_new_contract_volume_vectorized(
+    data,
+    calendar_features,
+    meter_usage_cols: MeterUsageColumns,
+    calendar_cols: CalendarColumns,
+    analysis_params: AnalysisParameters,
+    raw_contract: dict,
+):
+    """
+    向量化版 cal_new_contract_volume，不需先篩選尖峰/非尖峰數據
+    :param data: 含充放電欄位的數據
+    :param calendar_features: cal_calendar_features 的結果
+    :param raw_contract: 原合約容量
+    :return: 新合約的用電量
+    """
+    return cal_new_contract_volume_from_max(
+        *cal_contract_max_usage(data, calendar_features, meter_usage_cols,
+                                calendar_cols, analysis_params.contract_type),
+        analysis_params.contract_type,
+        raw_contract,
+        analysis_params.new_contract_buffer,
+        get_interval_hours(data, meter_usage_cols),
+    )
+
+
+def cal_contract_max_usage(data, calendar_features,
+                           meter_usage_cols: MeterUsageColumns,
+                           calendar_cols: CalendarColumns,
+                           contract_type: ec_lib.ContractType):
+    """
+    計算 cal_new_contract_volume_from_max 需要的尖峰/非尖峰最大用電量
+    :param data: 含充放電欄位的數據
+    :param calendar_features: cal_calendar_features 的結果
+    :param contract_type: 合約類型
+    :return: (尖峰最大用電量, 半尖峰最大用電量, 非尖峰最大用電量)
+    """
+    usage = data[meter_usage_cols.usage_with_battery_col]
+    is_expensive = is_expensive_hour_vectorized(calendar_features,
+                                                calendar_cols, contract_type)
+    max_peak, max_semi_peak = 0.0, 0.0
+    if contract_type == ec_lib.ContractType.HIGH_PRESSURE_THREE_PHASE:
+        is_summer = calendar_features[calendar_cols.season_col].to_numpy(
+        ) == ec_lib.SEASON_TYPE_LIST.index(ec_lib.SeasonType.SUMMER)
+        max_peak = usage[is_expensive & is_summer].max()
+        max_semi_peak = usage[is_expensive & ~is_summer].max()
+    elif contract_type == ec_lib.ContractType.HIGH_PRESSURE_BATCH:
+        max_peak = usage[is_expensive].max()
+    return max_peak, max_semi_peak, usage[~is_expensive].max()
+
+
 def cal_basic_price(contract_volume: dict, price_dict: dict):
     total_price = 0
     peak_volume = contract_volume.get(ec_lib.UsageType.PEAK,
@@ -608,10 +1432,52 @@ def cal_basic_price(contract_volume: dict, price_dict: dict):
     return total_price
 
 
+def cal_summer_month_ratio(summer_start=ec_lib.SUMMER_START,
+                           summer_end=ec_lib.SUMMER_END,
+                           prorate_days=False):
+    """
+    依夏月期間計算每個月份的夏月比例，以平年計算
+    :param summer_start: 夏月開始 (月-日)
+    :param summer_end: 夏月結束 (月-日)
+    :param prorate_days: 跨夏月與非夏月的月份是否依天數比例計算，否則以各半計算
+    :return: 一月至十二月的夏月比例陣列
+    """
+    import numpy as np
+    import pandas as pd
+
+    def to_month_day(month_day_text):
+        month, day = (int(value) for value in month_day_text.split("-"))
+        return month * 100 + day
+
+    days = pd.date_range("2001-01-01", "2001-12-31")
+    month_day = days.month * 100 + days.day
+    is_summer = (month_day >= to_month_day(summer_start)) & (
+        month_day <= to_month_day(summer_end))
+    month_index = days.month.to_numpy() - 1
+    summer_ratio = (np.bincount(month_index, weights=is_summer, minlength=12) /
+                    np.bincount(month_index, minlength=12))
+    if prorate_days:
+        return summer_ratio
+    return np.where((summer_ratio > 0) & (summer_ratio < 1), 0.5,
+                    summer_ratio)
+
+
 def cal_monthly_basic_price(
     contract_volume: dict,
     contract_price_dict: dict,
+    summer_start=ec_lib.SUMMER_START,
+    summer_end=ec_lib.SUMMER_END,
+    prorate_days=False,
 ):
+    """
+    計算每月基本電費，跨夏月與非夏月的月份預設以夏月與非夏月各半計算
+    :param contract_volume: 契約容量
+    :param contract_price_dict: 夏月與非夏月的基本電價
+    :param summer_start: 夏月開始 (月-日)
+    :param summer_end: 夏月結束 (月-日)
+    :param prorate_days: 跨夏月與非夏月的月份是否依天數比例計算
+    :return: 月份對應基本電費的字典
+    """
     summer_price = cal_basic_price(
         contract_volume,
         contract_price_dict.get(ec_lib.SeasonType.SUMMER),
@@ -620,15 +1486,22 @@ def cal_monthly_basic_price(
         contract_volume,
         contract_price_dict.get(ec_lib.SeasonType.NONSUMMER),
     )
+    summer_ratio = cal_summer_month_ratio(summer_start, summer_end,
+                                          prorate_days)
     month_price_dict = {}
-    for i in range(1, 13):
-        if i in [5, 10]:
+    for month, ratio in zip(MONTH_LIST, summer_ratio):
+        if ratio == 1:
+            month_price_dict.update({month: summer_price})
+        elif ratio == 0:
+            month_price_dict.update({month: non_summer_price})
+        elif ratio == 0.5:
             month_price_dict.update(
-                {MONTH_LIST[i - 1]: (summer_price + non_summer_price) / 2})
-        elif i in [6, 7, 8, 9]:
-            month_price_dict.update({MONTH_LIST[i - 1]: summer_price})
+                {month: (summer_price + non_summer_price) / 2})
         else:
-            month_price_dict.update({MONTH_LIST[i - 1]: non_summer_price})
+            month_price_dict.update({
+                month:
+                float(ratio * summer_price + (1 - ratio) * non_summer_price)
+            })
     return month_price_dict
 
 
@@ -647,6 +1520,7 @@ def cal_year_profit(
     :param elec_price_cols: 電價效益欄位名稱
     :return: 年度效益
     """
+    import pandas as pd
     building_cost = -(BATTERY_KWH / BATTERY_BUFFER * KWH_PRICE)
     result = pd.DataFrame(columns=yearly_profit_cols.__dict__.values())
     result.loc[0] = [
@@ -687,6 +1561,90 @@ def cal_year_profit(
     return result
 
 
+def cal_year_profit_vectorized(
+    monthly_data,
+    contract_monthly_basic_price: dict,
+    new_monthly_basic_price: dict,
+    elec_price_cols: ElectricPriceColumns,
+    yearly_profit_cols: YearlyProfitColumns,
+    analysis_params: AnalysisParameters,
+):
+    """
+    向量化版 cal_year_profit，以參數取代全域設定
+    :param monthly_data: 月度數據
+    :param contract_monthly_basic_price: 原始合約電價
+    :param new_monthly_basic_price: 新合約電價
+    :param elec_price_cols: 電價效益欄位名稱
+    :param analysis_params: 分析參數
+    :return: 年度效益
+    """
+    import numpy as np
+    building_cost = -(analysis_params.battery_kwh /
+                      analysis_params.battery_buffer * analysis_params.kwh_price)
+    charge_profit = (
+        monthly_data[elec_price_cols.elec_charge_price_col] -
+        monthly_data[elec_price_cols.elec_charge_price_with_battery_col]
+    ).sum()
+    contract_profit = sum(contract_monthly_basic_price[key] -
+                          new_monthly_basic_price[key]
+                          for key in contract_monthly_basic_price)
+    dr_profit = monthly_data[elec_price_cols.demand_price_col].sum()
+    return build_year_profit_table(
+        charge_profit * cal_decay_factors(analysis_params.battery_decay),
+        np.full(20, contract_profit),
+        dr_profit * cal_decay_factors(analysis_params.battery_decay),
+        building_cost,
+        yearly_profit_cols,
+    )
+
+
+def cal_decay_factors(battery_decay, years=20):
+    """
+    計算每年度的電池衰退係數，第一年為 1
+    :param battery_decay: 年衰退率
+    :param years: 年數
+    :return: 衰退係數陣列
+    """
+    import numpy as np
+    return np.cumprod(np.concatenate(([1.0], np.full(years - 1,
+                                                      battery_decay))))
+
+
+def build_year_profit_table(charge_profit, contract_profit, dr_profit,
+                            building_cost,
+                            yearly_profit_cols: YearlyProfitColumns):
+    """
+    由每年度的各項利潤建立年度效益表
+    :param charge_profit: 每年度尖離峰套利利潤
+    :param contract_profit: 每年度基本電價差利潤
+    :param dr_profit: 每年度需量反應價金
+    :param building_cost: 建置成本
+    :return: 年度效益
+    """
+    import numpy as np
+    import pandas as pd
+    total_profit = charge_profit + contract_profit + dr_profit
+    years = len(total_profit)
+    result = pd.DataFrame({
+        yearly_profit_cols.year_col: ["建置年"] +
+        [f"第 {i} 年" for i in range(1, years + 1)],
+        yearly_profit_cols.charge_profit_col:
+        np.concatenate(([0], charge_profit)),
+        yearly_profit_cols.contract_profit_col:
+        np.concatenate(([0], contract_profit)),
+        yearly_profit_cols.dr_profit_col:
+        np.concatenate(([0], dr_profit)),
+        yearly_profit_cols.total_profit_col:
+        np.concatenate(([0], total_profit)),
+        yearly_profit_cols.cumulative_profit_col:
+        np.cumsum(np.concatenate(([building_cost], total_profit))),
+    })
+    result[yearly_profit_cols.cumulative_profit_col] = result[
+        yearly_profit_cols.cumulative_profit_col].apply(
+            lambda x: "{:.0f}".format(x))
+    return result
+
+
 def sum_profit(row, elec_price_cols: ElectricPriceColumns):
     """
     計算每行利潤
@@ -0,0 +1,463 @@
+from dataclasses import dataclass, field
+import json
+import numpy as np
+import pandas as pd
+import electricity_lib as ec_lib
+
+# 內建電價表位置
+TARIFF_FOLDER = "./tariffs/"
+SECONDS_PER_DAY = 24 * 3600
+
+
+def _time_to_second(time_text):
+    hour, minute, second = (int(value) for value in time_text.split(":"))
+    return hour * 3600 + minute * 60 + second
+
+
+def _month_day_to_int(month_day_text):
+    month, day = (int(value) for value in month_day_text.split("-"))
+    return month * 100 + day
+
+
+def _enum_key_dict(raw_dict, key_enum, value_enum=None):
+    return {
+        key_enum(key): (_enum_key_dict(value, value_enum) if value_enum else
+                        value)
+        for key, value in raw_dict.items()
+    }
+
+
+@dataclass
+class TariffTable:
+    """
+    單一版本的電價表，內容為 JSON/YAML 讀入的字典
+    """
+    version: str
+    effective_from: pd.Timestamp
+    summer_start: str
+    summer_end: str
+    contracts: dict = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, table: dict):
+        return cls(
+            version=str(table["version"]),
+            effective_from=pd.Timestamp(table["effective_from"]),
+            summer_start=table["summer"]["start"],
+            summer_end=table["summer"]["end"],
+            contracts=table["contracts"],
+        )
+
+    def to_dict(self):
+        return {
+            "version": self.version,
+            "effective_from": self.effective_from.strftime("%Y-%m-%d"),
+            "summer": {
+                "start": self.summer_start,
+                "end": self.summer_end
+            },
+            "contracts": self.contracts,
+        }
+
+    def _contract(self, contract_type: ec_lib.ContractType):
+        return self.contracts[ec_lib.ContractType(contract_type).value]
+
+    def get_elec_type_dict(self, contract_type: ec_lib.ContractType):
+        return _enum_key_dict(
+            self._contract(contract_type)["usage_hours"], ec_lib.SeasonType,
+            ec_lib.UsageType)
+
+    def get_charge_price_dict(self, contract_type: ec_lib.ContractType):
+        return _enum_key_dict(
+            self._contract(contract_type)["charge_price"], ec_lib.SeasonType,
+            ec_lib.UsageType)
+
+    def get_contract_price_dict(self, contract_type: ec_lib.ContractType):
+        return _enum_key_dict(
+            self._contract(contract_type)["contract_price"],
+            ec_lib.SeasonType, ec_lib.UsageType)
+
+    def get_release_hour_dict(self, contract_type: ec_lib.ContractType,
+                              release_type: ec_lib.ReleaseType):
+        return _enum_key_dict(
+            self._contract(contract_type)["release_hours"][ec_lib.ReleaseType(
+                release_type).value], ec_lib.SeasonType)
+
+    def get_charege_hour_dict(self, contract_type: ec_lib.ContractType,
+                              charge_type: ec_lib.ChargeType):
+        return _enum_key_dict(
+            self._contract(contract_type)["charge_hours"][ec_lib.ChargeType(
+                charge_type).value], ec_lib.SeasonType)
+
+
+def build_default_tariff_table(version="default",
+                               effective_from="2000-01-01"):
+    """
+    將 electricity_lib 內建的電價設定轉為電價表
+    :param version: 版本名稱
+    :param effective_from: 生效日
+    :return: 電價表
+    """
+
+    def to_plain(value):
+        if isinstance(value, dict):
+            return {key.value: to_plain(item) for key, item in value.items()}
+        return value
+
+    contracts = {}
+    for contract_type in ec_lib.ContractType:
+        contracts[contract_type.value] = {
+            "usage_hours":
+            to_plain(ec_lib.get_elec_type_dict(contract_type)),
+            "charge_price":
+            to_plain(ec_lib.get_charge_price_dict(contract_type)),
+            "contract_price":
+            to_plain(ec_lib.get_contract_price_dict(contract_type)),
+            "release_hours": {
+                release_type.value:
+                to_plain(
+                    ec_lib.get_release_hour_dict(contract_type, release_type))
+                for release_type in ec_lib.ReleaseType
+            },
+            "charge_hours": {
+                charge_type.value:
+                to_plain(
+                    ec_lib.get_charege_hour_dict(contract_type, charge_type))
+                for charge_type in ec_lib.ChargeType
+            },
+        }
+    return TariffTable(
+        version=version,
+        effective_from=pd.Timestamp(effective_from),
+        summer_start=ec_lib.SUMMER_START,
+        summer_end=ec_lib.SUMMER_END,
+        contracts=contracts,
+    )
+
+
+def load_tariff_table(file_path):
+    """
+    讀取 JSON 或 YAML 電價表
+    :param file_path: 電價表路徑
+    :return: 電價表
+    """
+    with open(file_path, encoding="utf-8") as f:
+        if str(file_path).endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError as e:
+                raise ImportError("讀取 YAML 電價表需要安裝 PyYAML") from e
+            table = yaml.safe_load(f)
+        else:
+            table = json.load(f)
+    return TariffTable.from_dict(table)
+
+
+def save_tariff_table(tariff_table: TariffTable, file_path):
+    """
+    將電價表存為 JSON
+    :param tariff_table: 電價表
+    :param file_path: 輸出路徑
+    """
+    with open(file_path, "w", encoding="utf-8") as f:
+        json.dump(tariff_table.to_dict(), f, ensure_ascii=False, indent=2)
+
+
+def compile_usage_grid(elec_type_dict: dict):
+    """
+    將用電時段編譯為 (季節, 日期類型, 當日秒數) 的用電類型編碼查表，
+    判斷規則與 get_usage_type_from_dict 相同
+    :param elec_type_dict: 用電時段
+    :return: 用電類型編碼陣列
+    """
+    seconds = np.arange(SECONDS_PER_DAY)
+    grid = np.full(
+        (len(ec_lib.SEASON_TYPE_LIST), len(
+            ec_lib.DAY_TYPE_LIST), SECONDS_PER_DAY),
+        ec_lib.USAGE_TYPE_LIST.index(ec_lib.UsageType.OFF_PEAK),
+        dtype=np.int8,
+    )
+    workday_code = ec_lib.DAY_TYPE_LIST.index(ec_lib.DayType.WORKDAY)
+    saturday_code = ec_lib.DAY_TYPE_LIST.index(ec_lib.DayType.SATURDAY)
+    for season_code, season in enumerate(ec_lib.SEASON_TYPE_LIST):
+        for usage_type, time_list in elec_type_dict.get(season, {}).items():
+            in_window = np.zeros(SECONDS_PER_DAY, dtype=bool)
+            for i in range(0, len(time_list), 2):
+                in_window |= (_time_to_second(time_list[i]) <= seconds) & (
+                    seconds <= _time_to_second(time_list[i + 1]))
+            day_code = (saturday_code if usage_type
+                        == ec_lib.UsageType.SATURDAY_SEMI_PEAK else
+                        workday_code)
+            grid[season_code, day_code,
+                 in_window] = ec_lib.USAGE_TYPE_LIST.index(usage_type)
+    return grid
+
+
+def compile_window_grid(hour_dict: dict, merge_wrap):
+    """
+    將充/放電時段編譯為 (季節, 當日秒數) 的時段時數查表
+    :param hour_dict: 充/放電時段
+    :param merge_wrap: 是否合併跨日相連的時段
+    :return: 時數陣列
+    """
+    import taipower_analyze_lib as analyze_lib
+
+    one_day = pd.Timestamp("2000-01-01") + pd.to_timedelta(
+        np.arange(SECONDS_PER_DAY), unit="s")
+    return np.stack([
+        analyze_lib.cal_window_hours_vectorized(
+            one_day, hour_dict, merge_wrap,
+            np.full(SECONDS_PER_DAY, season == ec_lib.SeasonType.SUMMER))
+        for season in ec_lib.SEASON_TYPE_LIST
+    ])
+
+
+def scale_price_dict(price_dict: dict, price_scale=None):
+    """
+    依 (季節, 用電類型) 倍數調整價格字典
+    :param price_dict: {季節: {用電類型: 價格}}
+    :param price_scale: (季節, 用電類型) 倍數陣列，None 表示不調整
+    :return: 調整後的價格字典
+    """
+    if price_scale is None:
+        return price_dict
+    return {
+        season: {
+            usage_type: price *
+            price_scale[ec_lib.SEASON_TYPE_LIST.index(season),
+                        ec_lib.USAGE_TYPE_LIST.index(usage_type)]
+            for usage_type, price in season_price.items()
+        }
+        for season, season_price in price_dict.items()
+    }
+
+
+class TariffSchedule:
+    """
+    多個版本電價表依生效日排序後編譯為查表陣列，跨版本的數據可一次向量化計價
+    """
+
+    def __init__(self, tariff_tables: list):
+        self.tariff_tables = sorted(tariff_tables,
+                                    key=lambda table: table.effective_from)
+        self._effective_ns = np.array([
+            table.effective_from.value for table in self.tariff_tables
+        ])
+        self._summer_bounds = np.array([[
+            _month_day_to_int(table.summer_start),
+            _month_day_to_int(table.summer_end)
+        ] for table in self.tariff_tables])
+        self._compiled = {}
+
+    @classmethod
+    def from_files(cls, file_path_list):
+        return cls([load_tariff_table(path) for path in file_path_list])
+
+    def fingerprint(self):
+        """
+        電價表內容摘要，供快取鍵值使用
+        """
+        return [table.to_dict() for table in self.tariff_tables]
+
+    def _compile(self, name, build):
+        if name not in self._compiled:
+            self._compiled[name] = np.stack(
+                [build(table) for table in self.tariff_tables])
+        return self._compiled[name]
+
+    def edition_index(self, date_times):
+        """
+        取得每筆時間適用的電價表版本索引，早於第一版者使用第一版
+        """
+        times_ns = pd.DatetimeIndex(date_times).asi8
+        return np.clip(
+            np.searchsorted(self._effective_ns, times_ns, side="right") - 1,
+            0, None)
+
+    def season_codes(self, date_times, edition_index):
+        date_times = pd.DatetimeIndex(date_times)
+        month_day = date_times.month.to_numpy() * 100 + date_times.day.to_numpy()
+        bounds = self._summer_bounds[edition_index]
+        is_summer = (month_day >= bounds[:, 0]) & (month_day <= bounds[:, 1])
+        return np.where(is_summer,
+                        ec_lib.SEASON_TYPE_LIST.index(ec_lib.SeasonType.SUMMER),
+                        ec_lib.SEASON_TYPE_LIST.index(
+                            ec_lib.SeasonType.NONSUMMER)).astype(np.int8)
+
+    def usage_type_codes(self, date_times, contract_type, edition_index,
+                         season_codes, day_type_codes):
+        grid = self._compile(
+            ("usage", contract_type),
+            lambda table: compile_usage_grid(
+                table.get_elec_type_dict(contract_type)))
+        second = ec_lib.get_time_of_day_ns(date_times) // 10**9
+        return grid[edition_index, season_codes, day_type_codes, second]
+
+    def window_hours(self, date_times, hour_dict_name, contract_type,
+                     strategy_type, edition_index, season_codes):
+        merge_wrap = hour_dict_name == "charge_hours"
+        if merge_wrap:
+            get_hour_dict = TariffTable.get_charege_hour_dict
+        else:
+            get_hour_dict = TariffTable.get_release_hour_dict
+        grid = self._compile(
+            (hour_dict_name, contract_type, strategy_type),
+            lambda table: compile_window_grid(
+                get_hour_dict(table, contract_type, strategy_type),
+                merge_wrap))
+        second = ec_lib.get_time_of_day_ns(date_times) // 10**9
+        return grid[edition_index, season_codes, second]
+
+    def price_matrix(self, price_name, contract_type):
+        """
+        (版本, 季節, 用電類型) 的價格陣列
+        """
+        if price_name == "charge_price":
+            get_price_dict = TariffTable.get_charge_price_dict
+        else:
+            get_price_dict = TariffTable.get_contract_price_dict
+        return self._compile(
+            (price_name, contract_type), lambda table: ec_lib.
+            price_dict_to_matrix(get_price_dict(table, contract_type)))
+
+    def cal_month_edition_count(self, date_times):
+        """
+        每個月份各電價表版本的數據筆數，分批處理時可逐批加總
+        :param date_times: 數據時間欄位
+        :return: (月份, 版本) 筆數陣列
+        """
+        date_times = pd.DatetimeIndex(date_times)
+        edition_count = np.zeros((12, len(self.tariff_tables)))
+        np.add.at(edition_count, (date_times.month.to_numpy() - 1,
+                                  self.edition_index(date_times)), 1)
+        return edition_count
+
+    def cal_monthly_basic_price(self,
+                                contract_volume,
+                                contract_type,
+                                date_times=None,
+                                edition_count=None,
+                                price_scale=None):
+        """
+        依各月份數據適用的電價表版本計算每月基本電費，跨版本的月份依筆數比例加權，
+        多個版本時跨夏月與非夏月的月份依天數比例計算，單一版本與內建計價方式相同
+        :param contract_volume: 契約容量
+        :param contract_type: 合約類型
+        :param date_times: 數據時間欄位
+        :param edition_count: cal_month_edition_count 的結果，提供時不使用 date_times
+        :param price_scale: (季節, 用電類型) 的基本電價倍數，None 表示不調整
+        :return: 月份對應基本電費的字典，格式與 cal_monthly_basic_price 相同
+        """
+        import taipower_analyze_lib as analyze_lib
+
+        if edition_count is None:
+            edition_count = self.cal_month_edition_count(date_times)
+        edition_count = np.array(edition_count, dtype=float)
+        # 沒有數據的月份使用最新版本
+        edition_count[edition_count.sum(axis=1) == 0, -1] = 1
+        edition_weight = edition_count / edition_count.sum(axis=1,
+                                                           keepdims=True)
+        prorate_days = len(self.tariff_tables) > 1
+        edition_price = np.array([
+            list(
+                analyze_lib.cal_monthly_basic_price(
+                    contract_volume,
+                    scale_price_dict(
+                        table.get_contract_price_dict(contract_type),
+                        price_scale),
+                    table.summer_start,
+                    table.summer_end,
+                    prorate_days,
+                ).values()) for table in self.tariff_tables
+        ]).T
+        return {
+            month: float(price)
+            for month, price in zip(analyze_lib.MONTH_LIST, (
+                edition_weight * edition_price).sum(axis=1))
+        }
+
+    def cal_calendar_features(self, data, meter_usage_cols, calendar_cols,
+                              analysis_params):
+        """
+        依各時間適用的電價表版本計算日曆特徵，欄位與 cal_calendar_features 相同
+        """
+        date_times = pd.DatetimeIndex(data[meter_usage_cols.time_col])
+        edition_index = self.edition_index(date_times)
+        season_codes = self.season_codes(date_times, edition_index)
+        day_type_codes = ec_lib.get_day_type_codes(date_times)
+        is_workday = day_type_codes == ec_lib.DAY_TYPE_LIST.index(
+            ec_lib.DayType.WORKDAY)
+        return pd.DataFrame(
+            {
+                calendar_cols.season_col:
+                season_codes,
+                calendar_cols.day_type_col:
+                day_type_codes,
+                calendar_cols.raw_usage_type_col:
+                self.usage_type_codes(date_times,
+                                      analysis_params.raw_contract_type,
+                                      edition_index, season_codes,
+                                      day_type_codes),
+                calendar_cols.usage_type_col:
+                self.usage_type_codes(date_times,
+                                      analysis_params.contract_type,
+                                      edition_index, season_codes,
+                                      day_type_codes),
+                calendar_cols.charge_hours_col:
+                np.where(
+                    is_workday,
+                    self.window_hours(date_times, "charge_hours",
+                                      analysis_params.contract_type,
+                                      analysis_params.charge_type,
+                                      edition_index, season_codes),
+                    0.0,
+                ),
+                calendar_cols.release_hours_col:
+                np.where(
+                    is_workday,
+                    self.window_hours(date_times, "release_hours",
+                                      analysis_params.contract_type,
+                                      analysis_params.release_type,
+                                      edition_index, season_codes),
+                    0.0,
+                ),
+            },
+            index=data.index,
+        )
+
+    def cal_elec_price(self, data, calendar_features, meter_usage_cols,
+                       calendar_cols, analysis_params):
+        """
+        依各時間適用的電價表版本一次計算流動電價，回傳格式與
+        cal_elec_price_vectorized 相同
+        """
+        edition_index = self.edition_index(data[meter_usage_cols.time_col])
+        season_codes = calendar_features[calendar_cols.season_col].to_numpy()
+        raw_price = self.price_matrix(
+            "charge_price", analysis_params.raw_contract_type)[
+                edition_index, season_codes,
+                calendar_features[calendar_cols.raw_usage_type_col].to_numpy()]
+        new_price = self.price_matrix(
+            "charge_price", analysis_params.contract_type)[
+                edition_index, season_codes,
+                calendar_features[calendar_cols.usage_type_col].to_numpy()]
+        usage = data[meter_usage_cols.usage_col].to_numpy()
+        return (
+            usage * raw_price,
+            (usage - data[meter_usage_cols.charge_kwh_col].to_numpy() -
+             data[meter_usage_cols.release_kwh_col].to_numpy()) * new_price,
+        )
+
+
+def load_default_tariff_schedule(tariff_folder=TARIFF_FOLDER):
+    """
+    讀取電價表資料夾內所有 JSON/YAML 電價表
+    :param tariff_folder: 電價表資料夾
+    :return: 電價表排程
+    """
+    import os
+
+    file_path_list = sorted(
+        os.path.join(tariff_folder, name) for name in os.listdir(tariff_folder)
+        if name.endswith((".json", ".yaml", ".yml")))
+    return TariffSchedule.from_files(file_path_list)
@@ -0,0 +1,119 @@
+import os
+import numpy as np
+import pandas as pd
+import analysis_pipeline_lib as pipeline_lib
+import shared_data_lib
+import taipower_analyze_lib as analyze_lib
+from result_cache_lib import ResultCache
+
+
+def _assert_same_result(result, expected):
+    pd.testing.assert_frame_equal(result.monthly_data, expected.monthly_data)
+    pd.testing.assert_frame_equal(result.yearly_profit, expected.yearly_profit)
+    assert result.new_contract_volume == expected.new_contract_volume
+
+
+def test_cached_run_matches_and_skips_compute(monkeypatch, tmp_path,
+                                              meter_files):
+    meter_data_path, _, meter_contract_path = meter_files
+    cache = ResultCache(str(tmp_path / "cache"))
+    expected = pipeline_lib.run_analysis(meter_data_path, meter_contract_path,
+                                         cache=cache)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("命中快取時不應重新計算")
+
+    monkeypatch.setattr(analyze_lib, "load_meter_data", fail)
+    monkeypatch.setattr(analyze_lib, "process_battery_usage_vectorized",
+                        fail)
+    _assert_same_result(
+        pipeline_lib.run_analysis(meter_data_path,
+                                  meter_contract_path,
+                                  cache=cache), expected)
+
+
+def test_parameter_change_reruns_only_downstream(tmp_path, meter_files):
+    meter_data_path, _, meter_contract_path = meter_files
+    cache = ResultCache(str(tmp_path / "cache"))
+    analysis_params = analyze_lib.AnalysisParameters()
+    stages = pipeline_lib.build_analysis_stages(meter_data_path,
+                                                meter_contract_path,
+                                                analysis_params, cache)
+    changed = pipeline_lib.build_analysis_stages(
+        meter_data_path, meter_contract_path,
+        analyze_lib.AnalysisParameters(kwh_price=analysis_params.kwh_price +
+                                       1000), cache)
+    for name in ["ingest", "calendar", "dispatch", "pricing", "contract"]:
+        assert stages[name].key == changed[name].key
+    assert stages["yearly_profit"].key != changed["yearly_profit"].key
+
+
+def test_shared_arrays_match_file_run(monkeypatch, tmp_path, meter_files):
+    meter_data_path, _, meter_contract_path = meter_files
+    analysis_params = analyze_lib.AnalysisParameters()
+    expected = pipeline_lib.run_analysis(meter_data_path, meter_contract_path,
+                                         analysis_params)
+    shared_data = shared_data_lib.publish_meter_arrays(
+        meter_data_path, [analysis_params], str(tmp_path / "shared"))
+    meter_data = shared_data_lib.attach_frame(shared_data["data"])
+    calendar_features = shared_data_lib.attach_frame(
+        shared_data["calendar"][shared_data_lib.calendar_key(
+            analysis_params)])
+
+    hashed = []
+    hash_file = pipeline_lib.hash_file
+    monkeypatch.setattr(pipeline_lib, "hash_file",
+                        lambda path: hashed.append(path) or hash_file(path))
+    cache = ResultCache(str(tmp_path / "cache"))
+    stages = pipeline_lib.build_analysis_stages(
+        meter_data_path,
+        meter_contract_path,
+        analysis_params,
+        cache,
+        meter_data=meter_data,
+        calendar_features=calendar_features,
+        meter_data_key=shared_data["key"])
+    # 已發布的數據不重新計算電表檔案雜湊值，也不寫入快取
+    assert meter_data_path not in hashed
+    stages["ingest"].get()
+    stages["calendar"].get()
+    assert os.listdir(str(tmp_path / "cache")) == []
+    # 充放電結果沿用共享陣列，不複製原有欄位
+    battery_data = stages["dispatch"].get()
+    usage_col = analyze_lib.MeterUsageColumns().usage_col
+    assert np.shares_memory(battery_data[usage_col].to_numpy(),
+                            meter_data[usage_col].to_numpy())
+    assert np.shares_memory(stages["pricing"].get()[usage_col].to_numpy(),
+                            meter_data[usage_col].to_numpy())
+
+    _assert_same_result(
+        pipeline_lib.run_analysis(meter_data_path,
+                                  meter_contract_path,
+                                  analysis_params,
+                                  cache,
+                                  meter_data=meter_data,
+                                  calendar_features=calendar_features,
+                                  meter_data_key=shared_data["key"]),
+        expected)
+
+
+def test_shared_ingest_key(meter_files, meter_data):
+    meter_data_path, _, meter_contract_path = meter_files
+
+    def ingest_key(**kwargs):
+        return pipeline_lib.build_analysis_stages(
+            meter_data_path, meter_contract_path,
+            analyze_lib.AnalysisParameters(), **kwargs)["ingest"].key
+
+    assert ingest_key(meter_data=meter_data,
+                      meter_data_key="a") == ingest_key(meter_data=meter_data,
+                                                        meter_data_key="a")
+    assert ingest_key(meter_data=meter_data,
+                      meter_data_key="a") != ingest_key(meter_data=meter_data,
+                                                        meter_data_key="b")
+    # 沒有識別碼時以數據內容計算
+    changed = meter_data.copy()
+    changed.iloc[0, 1] += 1
+    assert ingest_key(meter_data=meter_data) == ingest_key(
+        meter_data=meter_data.copy())
+    assert ingest_key(meter_data=meter_data) != ingest_key(meter_data=changed)
@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+import pytest
+import data_quality_lib
+from data_quality_lib import FillPolicy
+
+TIME_COL = "時間"
+VALUE_COL = "用電總量"
+
+
+def _frame(times, values):
+    return pd.DataFrame({
+        TIME_COL: pd.to_datetime(times),
+        VALUE_COL: np.asarray(values, dtype=float),
+    })
+
+
+def _two_days_with_gap():
+    # 兩天每小時資料，第二天 03:00~04:00 缺漏
+    times = pd.date_range("2024-07-01", periods=48, freq="h")
+    values = np.arange(48, dtype=float)
+    keep = ~times.isin(pd.to_datetime(["2024-07-02 03:00", "2024-07-02 04:00"]))
+    return _frame(times[keep], values[keep])
+
+
+def test_detect_interval_ignores_duplicates_and_gaps():
+    times = pd.to_datetime([
+        "2024-07-01 00:00", "2024-07-01 00:15", "2024-07-01 00:15",
+        "2024-07-01 00:30", "2024-07-01 01:30", "2024-07-01 01:45"
+    ])
+    assert data_quality_lib.detect_interval(times) == pd.Timedelta("15min")
+    assert data_quality_lib.detect_interval(times[:1]) is None
+
+
+def test_check_data_quality_counts():
+    times = pd.to_datetime([
+        "2024-07-01 00:00", "2024-07-01 00:15", "2024-07-01 00:15",
+        "2024-07-01 00:31", "2024-07-01 01:15"
+    ])
+    report = data_quality_lib.check_data_quality(times, pd.Timedelta("15min"))
+    assert report.duplicate_count == 1
+    assert report.off_grid_count == 1
+    assert report.gap_count == 1
+    assert report.missing_count == 2
+    assert not report.is_regular
+
+
+def test_check_data_quality_needs_two_times():
+    with pytest.raises(ValueError):
+        data_quality_lib.check_data_quality(pd.to_datetime(["2024-07-01"]))
+
+
+def test_snap_to_grid_keeps_first_duplicate():
+    data = _frame(
+        ["2024-07-01 00:00:00", "2024-07-01 00:14:58", "2024-07-01 00:15:03",
+         "2024-07-01 00:30:00"], [1, 2, 3, 4])
+    result, report = data_quality_lib.regularize_meter_data(
+        data, TIME_COL, pd.Timedelta("15min"), FillPolicy.NONE)
+    assert report.off_grid_count == 2
+    assert list(result[TIME_COL]) == list(
+        pd.date_range("2024-07-01", periods=3, freq="15min"))
+    np.testing.assert_array_equal(result[VALUE_COL], [1, 2, 4])
+
+
+def test_snap_to_grid_anchors_at_floored_first_time():
+    data = _frame(["2024-07-01 00:07", "2024-07-01 00:15", "2024-07-01 00:30"],
+                  [1, 2, 3])
+    result, _ = data_quality_lib.regularize_meter_data(
+        data, TIME_COL, pd.Timedelta("15min"), FillPolicy.NONE)
+    assert list(result[TIME_COL]) == list(
+        pd.date_range("2024-07-01", periods=3, freq="15min"))
+
+
+def test_regular_data_is_returned_unchanged():
+    data = _frame(pd.date_range("2024-07-01", periods=4, freq="15min"),
+                  [1, 2, 3, 4])
+    result, report = data_quality_lib.regularize_meter_data(data, TIME_COL)
+    assert report.is_regular
+    assert result is data
+
+
+def test_fill_none_leaves_gap():
+    result, report = data_quality_lib.regularize_meter_data(
+        _two_days_with_gap(), TIME_COL, fill_policy=FillPolicy.NONE)
+    assert report.missing_count == 2
+    assert len(result) == 46
+
+
+@pytest.mark.parametrize("fill_policy, expected", [
+    (FillPolicy.ZERO, [0.0, 0.0]),
+    (FillPolicy.INTERPOLATE, [27.0, 28.0]),
+    (FillPolicy.PREVIOUS_DAY, [3.0, 4.0]),
+])
+def test_fill_policies(fill_policy, expected):
+    result, _ = data_quality_lib.regularize_meter_data(
+        _two_days_with_gap(), TIME_COL, fill_policy=fill_policy)
+    assert len(result) == 48
+    filled = result[TIME_COL].isin(
+        pd.to_datetime(["2024-07-02 03:00", "2024-07-02 04:00"]))
+    np.testing.assert_array_equal(result.loc[filled, VALUE_COL], expected)
+    # 只有補上的筆數會被修改
+    np.testing.assert_array_equal(result.loc[~filled, VALUE_COL],
+                                  _two_days_with_gap()[VALUE_COL])
+
+
+def test_previous_day_falls_back_to_interpolation():
+    # 第一天的缺漏沒有前一日資料，改用線性內插
+    times = pd.date_range("2024-07-01", periods=6, freq="h")
+    data = _frame(times.delete(2), [0, 1, 3, 4, 5])
+    result, _ = data_quality_lib.regularize_meter_data(
+        data, TIME_COL, fill_policy=FillPolicy.PREVIOUS_DAY)
+    np.testing.assert_array_equal(result[VALUE_COL], [0, 1, 2, 3, 4, 5])
+
+
+def test_previous_day_chains_over_multi_day_gap():
+    times = pd.date_range("2024-07-01", periods=72, freq="h")
+    values = np.arange(72, dtype=float)
+    # 第二天與第三天的 05:00 都缺漏，都以第一天 05:00 補上
+    keep = ~times.isin(pd.to_datetime(["2024-07-02 05:00", "2024-07-03 05:00"]))
+    result, _ = data_quality_lib.regularize_meter_data(
+        _frame(times[keep], values[keep]),
+        TIME_COL,
+        fill_policy=FillPolicy.PREVIOUS_DAY)
+    assert result.loc[result[TIME_COL] == "2024-07-02 05:00",
+                      VALUE_COL].item() == 5.0
+    assert result.loc[result[TIME_COL] == "2024-07-03 05:00",
+                      VALUE_COL].item() == 5.0
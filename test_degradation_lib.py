@@ -0,0 +1,107 @@
+import warnings
+import numpy as np
+import pytest
+import degradation_lib
+import electricity_lib as ec_lib
+import taipower_analyze_lib as analyze_lib
+
+
+def _cycles_by_range(series):
+    ranges, counts = degradation_lib.count_rainflow_cycles(series)
+    result = {}
+    for cycle_range, count in zip(ranges, counts):
+        result[float(cycle_range)] = result.get(float(cycle_range), 0) + count
+    return result
+
+
+def test_find_reversals_merges_flat_segments():
+    reversals = degradation_lib.find_reversals([0, 1, 1, 2, 2, 1, 0, 0, 3])
+    np.testing.assert_array_equal(reversals, [0, 2, 0, 3])
+
+
+def test_find_reversals_constant_series():
+    np.testing.assert_array_equal(degradation_lib.find_reversals([5, 5, 5]),
+                                  [5])
+
+
+def test_rainflow_astm_example():
+    # ASTM E1049 圖 6 的範例序列
+    assert _cycles_by_range([-2, 1, -3, 5, -1, 3, -4, 4, -2]) == {
+        3.0: 0.5,
+        4.0: 1.5,
+        6.0: 0.5,
+        8.0: 1.0,
+        9.0: 0.5,
+    }
+
+
+def test_rainflow_full_cycles():
+    # 每天充滿再放完兩次，頭尾各半個循環
+    assert _cycles_by_range([0, 10, 0, 10, 0]) == {10.0: 2.0}
+
+
+def test_cycle_damage_scales_with_depth():
+    damage, cycles = degradation_lib.cal_cycle_damage([0, 10, 0, 10, 0], 10)
+    assert cycles == pytest.approx(2.0)
+    assert damage == pytest.approx(2.0 / degradation_lib.CYCLE_LIFE)
+    half_damage, half_cycles = degradation_lib.cal_cycle_damage(
+        [0, 5, 0, 5, 0], 10)
+    assert half_cycles == pytest.approx(1.0)
+    assert half_damage == pytest.approx(
+        2.0 * 0.5**degradation_lib.CYCLE_LIFE_EXPONENT /
+        degradation_lib.CYCLE_LIFE)
+
+
+def test_capacity_ratio_calendar_fade_only():
+    ratio = degradation_lib.cal_capacity_ratio(0.0, 3)
+    np.testing.assert_allclose(
+        ratio, [1.0, 1 - degradation_lib.CALENDAR_FADE,
+                1 - 2 * degradation_lib.CALENDAR_FADE])
+
+
+def _simulate(meter_data, calendar_features, years=3):
+    cols = analyze_lib.MeterUsageColumns()
+    calendar_cols = analyze_lib.CalendarColumns()
+    analysis_params = analyze_lib.AnalysisParameters()
+    data, _ = analyze_lib.process_battery_usage_vectorized(
+        meter_data, calendar_features, cols, calendar_cols, analysis_params)
+    price_cols = analyze_lib.ElectricPriceColumns()
+    (
+        data[price_cols.elec_charge_price_col],
+        data[price_cols.elec_charge_price_with_battery_col],
+    ) = analyze_lib.cal_elec_price_vectorized(
+        data, calendar_features, cols, calendar_cols,
+        analysis_params.build_electric_price_parameters())
+    raw_contract = {usage_type: 0.0 for usage_type in ec_lib.USAGE_TYPE_LIST}
+    raw_contract[ec_lib.UsageType.PEAK] = 600.0
+    return degradation_lib.simulate_degradation(data,
+                                                calendar_features,
+                                                raw_contract,
+                                                analysis_params,
+                                                years=years)
+
+
+def test_simulate_degradation_is_consistent(meter_data, calendar_features):
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        _, capacity = _simulate(meter_data, calendar_features)
+    cols = degradation_lib.DegradationColumns()
+    ratio = degradation_lib.cal_capacity_ratio(capacity[cols.damage_col],
+                                               len(capacity))
+    np.testing.assert_allclose(ratio,
+                               capacity[cols.capacity_ratio_col],
+                               atol=degradation_lib.FADE_TOLERANCE)
+
+
+def test_simulate_degradation_warns_without_convergence(
+        monkeypatch, meter_data, calendar_features):
+    monkeypatch.setattr(degradation_lib, "MAX_FADE_PASSES", 1)
+    monkeypatch.setattr(degradation_lib, "FADE_TOLERANCE", 0.0)
+    with pytest.warns(RuntimeWarning):
+        _, capacity = _simulate(meter_data, calendar_features)
+    cols = degradation_lib.DegradationColumns()
+    # 回傳的容量為最後一次模擬使用的容量
+    np.testing.assert_allclose(
+        capacity[cols.battery_kwh_col],
+        analyze_lib.AnalysisParameters().battery_kwh *
+        capacity[cols.capacity_ratio_col])
@@ -0,0 +1,137 @@
+import numpy as np
+import pytest
+import electricity_lib as ec_lib
+import peak_shaving_lib
+import taipower_analyze_lib as analyze_lib
+
+PEAK = ec_lib.USAGE_TYPE_LIST.index(ec_lib.UsageType.PEAK)
+OFF_PEAK = ec_lib.USAGE_TYPE_LIST.index(ec_lib.UsageType.OFF_PEAK)
+BATTERY_DOD = 0.2
+
+# 一天四小時: 離峰 100 kW、尖峰 300 kW 兩小時、離峰 100 kW
+USAGE_KWH = np.array([100.0, 300.0, 300.0, 100.0])
+SEASON_CODES = np.zeros(4, dtype=int)
+USAGE_TYPE_CODES = np.array([OFF_PEAK, PEAK, PEAK, OFF_PEAK])
+# 目標 200 kW 需放電 100 kW 兩小時，共 200 kWh
+TARGET_KW = {ec_lib.UsageType.PEAK: 200.0}
+REQUIRED_KWH = 200.0
+REQUIRED_KW = 100.0
+
+
+def _is_feasible(battery_kwh,
+                 battery_kw,
+                 target_kw=TARGET_KW,
+                 usage_kwh=USAGE_KWH,
+                 season_codes=SEASON_CODES,
+                 usage_type_codes=USAGE_TYPE_CODES,
+                 day_starts=(0, )):
+    return peak_shaving_lib.check_target_feasibility(
+        usage_kwh,
+        season_codes,
+        usage_type_codes,
+        np.asarray(day_starts),
+        peak_shaving_lib.target_dict_to_matrix(target_kw),
+        battery_kwh,
+        battery_kw,
+        BATTERY_DOD,
+        interval_hours=1.0,
+    )
+
+
+def test_feasible_at_exact_capacity():
+    battery_kwh = REQUIRED_KWH / (1 - BATTERY_DOD)
+    assert _is_feasible(battery_kwh, REQUIRED_KW).all()
+
+
+def test_infeasible_below_capacity():
+    battery_kwh = REQUIRED_KWH / (1 - BATTERY_DOD)
+    assert not _is_feasible(battery_kwh - 1e-3, REQUIRED_KW).any()
+
+
+def test_infeasible_below_power():
+    assert not _is_feasible(1000.0, REQUIRED_KW - 1e-3).any()
+
+
+def test_candidate_batch_matches_single_checks():
+    targets = np.stack([
+        peak_shaving_lib.target_dict_to_matrix({ec_lib.UsageType.PEAK: kw})
+        for kw in (150.0, 200.0, 250.0)
+    ])
+    battery_kwh = REQUIRED_KWH / (1 - BATTERY_DOD)
+    result = peak_shaving_lib.check_target_feasibility(USAGE_KWH,
+                                                       SEASON_CODES,
+                                                       USAGE_TYPE_CODES,
+                                                       np.array([0]),
+                                                       targets,
+                                                       battery_kwh,
+                                                       REQUIRED_KW * 2,
+                                                       BATTERY_DOD,
+                                                       interval_hours=1.0)
+    np.testing.assert_array_equal(result, [[False, True, True]])
+
+
+def test_off_peak_charging_restores_next_day():
+    # 兩天相同，第一天用完的電量在第二天尖峰前的離峰充回
+    usage_kwh = np.tile(USAGE_KWH, 2)
+    battery_kwh = REQUIRED_KWH / (1 - BATTERY_DOD)
+    result = _is_feasible(battery_kwh,
+                          REQUIRED_KW * 2,
+                          usage_kwh=usage_kwh,
+                          season_codes=np.tile(SEASON_CODES, 2),
+                          usage_type_codes=np.tile(USAGE_TYPE_CODES, 2),
+                          day_starts=(0, 4))
+    np.testing.assert_array_equal(result, [True, True])
+
+
+def test_target_matrix_round_trip():
+    matrix = peak_shaving_lib.target_dict_to_matrix(TARGET_KW)
+    assert np.isinf(matrix[:, OFF_PEAK]).all()
+    assert peak_shaving_lib.target_matrix_to_dict(matrix) == {
+        season: {
+            ec_lib.UsageType.PEAK: 200.0
+        }
+        for season in ec_lib.SEASON_TYPE_LIST
+    }
+
+
+def test_min_peak_target_is_tight(meter_data, calendar_features):
+    cols = analyze_lib.MeterUsageColumns()
+    calendar_cols = analyze_lib.CalendarColumns()
+    analysis_params = analyze_lib.AnalysisParameters(device_number=4)
+    target_matrix, _ = peak_shaving_lib.find_min_peak_targets(
+        meter_data, calendar_features, cols, calendar_cols, analysis_params)
+    season_codes = calendar_features[calendar_cols.season_col].to_numpy()
+    usage_type_codes = calendar_features[
+        calendar_cols.usage_type_col].to_numpy()
+    searched = [(season, usage)
+                for season, usage in zip(*np.nonzero(np.isfinite(target_matrix)))
+                if usage != OFF_PEAK]
+    assert searched
+    battery_data, _ = peak_shaving_lib.process_peak_shaving_vectorized(
+        meter_data, calendar_features, cols, calendar_cols, analysis_params,
+        target_matrix)
+    for season_code, usage_code in searched:
+        mask = (season_codes == season_code) & (usage_type_codes
+                                                == usage_code)
+        max_kw = battery_data[cols.usage_with_battery_col].to_numpy()[
+            mask].max() / analyze_lib.INTERVAL_HOURS
+        assert max_kw <= target_matrix[season_code, usage_code] + 1e-6
+        # 比搜尋結果再低一個精度以上就無法維持
+        tighter = target_matrix.copy()
+        tighter[season_code, usage_code] -= (
+            2 * peak_shaving_lib.TARGET_TOLERANCE_KW)
+        tighter_data, _ = peak_shaving_lib.process_peak_shaving_vectorized(
+            meter_data, calendar_features, cols, calendar_cols,
+            analysis_params, tighter)
+        max_kw = tighter_data[cols.usage_with_battery_col].to_numpy()[
+            mask].max() / analyze_lib.INTERVAL_HOURS
+        assert max_kw > tighter[season_code, usage_code] + 1e-6
+
+
+def test_no_target_is_always_feasible():
+    assert _is_feasible(0.0, 0.0, target_kw={}).all()
+
+
+@pytest.mark.parametrize("battery_kw", [REQUIRED_KW, REQUIRED_KW * 10])
+def test_power_limit_boundary(battery_kw):
+    assert _is_feasible(1000.0, battery_kw).all()
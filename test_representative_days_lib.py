@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+import electricity_lib as ec_lib
+import representative_days_lib
+import taipower_analyze_lib as analyze_lib
+
+COLS = analyze_lib.MeterUsageColumns()
+CALENDAR_COLS = analyze_lib.CalendarColumns()
+
+
+def _features(data):
+    return analyze_lib.cal_calendar_features(
+        data, COLS, CALENDAR_COLS,
+        analyze_lib.AnalysisParameters().build_electric_parameters())
+
+
+@pytest.mark.parametrize("freq, intervals_per_day", [
+    ("15min", 96),
+    ("30min", 48),
+    ("1h", 24),
+])
+def test_profiles_follow_data_interval(meter_data_factory, freq,
+                                       intervals_per_day):
+    data = meter_data_factory(days=3, freq=freq)
+    profiles = representative_days_lib.build_daily_profiles(
+        data, _features(data), COLS, CALENDAR_COLS)
+    assert profiles.intervals_per_day == intervals_per_day
+    assert profiles.is_complete.all()
+    np.testing.assert_array_equal(profiles.profiles.ravel(),
+                                  data[COLS.usage_col])
+
+
+def test_missing_row_marks_day_incomplete(meter_data):
+    data = meter_data.drop(index=10).reset_index(drop=True)
+    profiles = representative_days_lib.build_daily_profiles(
+        data, _features(data), COLS, CALENDAR_COLS)
+    np.testing.assert_array_equal(profiles.is_complete, [False, True, True])
+
+
+def test_interval_must_divide_an_hour(meter_data_factory):
+    data = meter_data_factory(days=1, freq="7min")
+    with pytest.raises(ValueError):
+        representative_days_lib.build_daily_profiles(data, _features(data),
+                                                     COLS, CALENDAR_COLS)
+
+
+def test_no_complete_day_raises(meter_data):
+    data = meter_data.iloc[::2].reset_index(drop=True)
+    profiles = representative_days_lib.build_daily_profiles(
+        data, _features(data), COLS, CALENDAR_COLS, interval_hours=0.25)
+    with pytest.raises(ValueError):
+        representative_days_lib.select_representative_days(
+            profiles, CALENDAR_COLS)
+
+
+def test_weights_cover_all_rows(meter_data_factory):
+    data = meter_data_factory(start="2024-07-01", days=14, freq="30min")
+    profiles = representative_days_lib.build_daily_profiles(
+        data, _features(data), COLS, CALENDAR_COLS)
+    representative_days = representative_days_lib.select_representative_days(
+        profiles, CALENDAR_COLS, k=2)
+    weight_col = representative_days_lib.RepresentativeDayColumns().weight_col
+    assert representative_days[weight_col].sum() == pytest.approx(14)
+    assert pd.DatetimeIndex(representative_days[
+        representative_days_lib.RepresentativeDayColumns().day_col]).isin(
+            profiles.days).all()
+
+
+def test_simulate_half_hour_data(meter_data_factory):
+    data = meter_data_factory(start="2024-07-01", days=14, freq="30min")
+    raw_contract = {usage_type: 0.0 for usage_type in ec_lib.USAGE_TYPE_LIST}
+    raw_contract[ec_lib.UsageType.PEAK] = 600.0
+    sizing, representative_days = (
+        representative_days_lib.simulate_representative_days(
+            data, _features(data), raw_contract, device_numbers=[1, 2], k=2))
+    assert len(representative_days) > 0
+    assert np.isfinite(sizing.select_dtypes("number").to_numpy()).all()
@@ -0,0 +1,101 @@
+import os
+import pandas as pd
+import analysis_pipeline_lib as pipeline_lib
+import result_cache_lib
+from result_cache_lib import ResultCache, make_cache_key
+
+
+def _cache_files(cache):
+    return sorted(name for name in os.listdir(cache.cache_folder)
+                  if name.endswith(".pkl"))
+
+
+def test_cache_miss_then_hit(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    key = make_cache_key("stage", {"a": 1}, [])
+    assert cache.get(key) == (False, None)
+    cache.put(key, {"value": [1, 2, 3]})
+    assert cache.get(key) == (True, {"value": [1, 2, 3]})
+
+
+def test_truncated_file_is_a_miss(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    key = make_cache_key("stage", {}, [])
+    cache.put(key, list(range(1000)))
+    path = os.path.join(str(tmp_path), _cache_files(cache)[0])
+    with open(path, "r+b") as f:
+        f.truncate(10)
+    assert cache.get(key) == (False, None)
+
+
+def test_cache_key_depends_on_params_inputs_and_version(monkeypatch):
+    key = make_cache_key("stage", {"a": 1, "b": 2}, ["upstream"])
+    assert key == make_cache_key("stage", {"b": 2, "a": 1}, ["upstream"])
+    assert key != make_cache_key("stage", {"a": 1, "b": 3}, ["upstream"])
+    assert key != make_cache_key("stage", {"a": 1, "b": 2}, ["other"])
+    assert key != make_cache_key("other", {"a": 1, "b": 2}, ["upstream"])
+    monkeypatch.setattr(result_cache_lib, "CACHE_VERSION",
+                        result_cache_lib.CACHE_VERSION + 1)
+    assert key != make_cache_key("stage", {"a": 1, "b": 2}, ["upstream"])
+
+
+def test_evicts_least_recently_used(tmp_path):
+    payload = b"x" * 10_000
+    cache = ResultCache(str(tmp_path), max_bytes=25_000)
+    keys = [make_cache_key("stage", {"i": i}, []) for i in range(3)]
+    cache.put(keys[0], payload)
+    cache.put(keys[1], payload)
+    # 兩筆都設為較早使用，讀取第一筆後第二筆成為最久未使用
+    old_time = os.path.getmtime(cache._path(keys[1])) - 10
+    for key in keys[:2]:
+        os.utime(cache._path(key), (old_time, old_time))
+    assert cache.get(keys[0])[0]
+    cache.put(keys[2], payload)
+    assert cache.get(keys[0])[0]
+    assert not cache.get(keys[1])[0]
+    assert cache.get(keys[2])[0]
+
+
+def test_clear(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    cache.put(make_cache_key("stage", {}, []), 1)
+    cache.clear()
+    assert _cache_files(cache) == []
+
+
+def test_pipeline_stage_reuses_cached_result(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return pd.DataFrame({"a": [1, 2]})
+
+    upstream = pipeline_lib.PipelineStage(cache, "upstream", {"p": 1}, [],
+                                          compute)
+    downstream = pipeline_lib.PipelineStage(cache, "downstream", {}, [upstream],
+                                            lambda data: data["a"].sum())
+    assert downstream.get() == 3
+    # 新的階段物件命中快取，不會計算或讀取上游
+    upstream = pipeline_lib.PipelineStage(cache, "upstream", {"p": 1}, [],
+                                          compute)
+    downstream = pipeline_lib.PipelineStage(cache, "downstream", {}, [upstream],
+                                            lambda data: data["a"].sum())
+    assert downstream.get() == 3
+    assert len(calls) == 1
+    # 參數改變時上下游的鍵值都會改變
+    changed = pipeline_lib.PipelineStage(cache, "upstream", {"p": 2}, [],
+                                         compute)
+    assert changed.key != upstream.key
+    assert pipeline_lib.PipelineStage(cache, "downstream", {}, [changed],
+                                      lambda data: 0).key != downstream.key
+
+
+def test_pipeline_stage_without_cache_is_not_written(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    stage = pipeline_lib.PipelineStage(cache,
+                                       "shared_ingest", {}, [],
+                                       lambda: 1,
+                                       use_cache=False)
+    assert stage.get() == 1
+    assert _cache_files(cache) == []
@@ -0,0 +1,74 @@
+import pytest
+import electricity_lib as ec_lib
+import analysis_pipeline_lib as pipeline_lib
+import sensitivity_lib
+import taipower_analyze_lib as analyze_lib
+
+YEARLY_PROFIT_COLS = analyze_lib.YearlyProfitColumns()
+PROFIT_COLS = [
+    YEARLY_PROFIT_COLS.charge_profit_col,
+    YEARLY_PROFIT_COLS.contract_profit_col,
+    YEARLY_PROFIT_COLS.dr_profit_col,
+]
+
+
+@pytest.mark.parametrize("use_schedule", [False, True])
+def test_base_case_matches_pipeline(meter_files, two_edition_schedule,
+                                    use_schedule):
+    meter_data_path, _, meter_contract_path = meter_files
+    tariff_schedule = two_edition_schedule if use_schedule else None
+    expected = pipeline_lib.run_analysis(
+        meter_data_path, meter_contract_path,
+        tariff_schedule=tariff_schedule).yearly_profit
+    basis = sensitivity_lib.build_sensitivity_basis_from_pipeline(
+        meter_data_path,
+        meter_contract_path,
+        tariff_schedule=tariff_schedule)
+    result = sensitivity_lib.evaluate_sensitivity_cases(
+        basis, [sensitivity_lib.SensitivityCase()])
+    for col in PROFIT_COLS:
+        # 第一列為建置年，第二列為第一年效益
+        assert float(result[col].iloc[0]) == pytest.approx(
+            expected[col].iloc[1], abs=1)
+    # 年度效益表的累計效益已格式化為整數字串
+    cumulative_col = YEARLY_PROFIT_COLS.cumulative_profit_col
+    assert float(result[cumulative_col].iloc[0]) == pytest.approx(
+        float(expected[cumulative_col].iloc[-1]), abs=1)
+
+
+def test_schedule_raises_contract_price(meter_files, two_edition_schedule):
+    meter_data_path, _, meter_contract_path = meter_files
+    default_basis = sensitivity_lib.build_sensitivity_basis_from_pipeline(
+        meter_data_path, meter_contract_path)
+    schedule_basis = sensitivity_lib.build_sensitivity_basis_from_pipeline(
+        meter_data_path,
+        meter_contract_path,
+        tariff_schedule=two_edition_schedule)
+    # 新版本契約電價為兩倍，尖峰契約的有效單價應上升
+    peak = ec_lib.USAGE_TYPE_LIST.index(ec_lib.UsageType.PEAK)
+    assert (schedule_basis.raw_contract_price[:, peak] >
+            default_basis.raw_contract_price[:, peak]).all()
+
+
+def test_price_scale_is_linear(meter_files):
+    meter_data_path, _, meter_contract_path = meter_files
+    basis = sensitivity_lib.build_sensitivity_basis_from_pipeline(
+        meter_data_path, meter_contract_path)
+    peak = ec_lib.UsageType.PEAK
+    result = sensitivity_lib.evaluate_sensitivity_cases(basis, [
+        sensitivity_lib.SensitivityCase(),
+        sensitivity_lib.SensitivityCase(charge_price_scale={peak: 0.0}),
+        sensitivity_lib.SensitivityCase(charge_price_scale={peak: 2.0}),
+    ])[YEARLY_PROFIT_COLS.charge_profit_col].to_numpy()
+    assert result[2] - result[0] == pytest.approx(result[0] - result[1])
+
+
+def test_tornado_table_sorted_by_swing(meter_files):
+    meter_data_path, _, meter_contract_path = meter_files
+    basis = sensitivity_lib.build_sensitivity_basis_from_pipeline(
+        meter_data_path, meter_contract_path)
+    table = sensitivity_lib.build_tornado_table(basis)
+    swing = table[sensitivity_lib.SensitivityColumns().swing_col]
+    assert swing.is_monotonic_decreasing
+    assert len(table) == len(
+        sensitivity_lib.build_default_parameters(basis.analysis_params))
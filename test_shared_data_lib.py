@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+import shared_data_lib
+import taipower_analyze_lib as analyze_lib
+
+
+def test_publish_attach_round_trip(tmp_path, meter_data):
+    folder = shared_data_lib.publish_frame(meter_data, str(tmp_path / "data"))
+    attached = shared_data_lib.attach_frame(folder)
+    pd.testing.assert_frame_equal(attached, meter_data)
+    usage = attached[analyze_lib.MeterUsageColumns().usage_col].to_numpy()
+    assert isinstance(usage.base, np.memmap) or isinstance(usage, np.memmap)
+    assert not usage.flags.writeable
+
+
+def test_object_columns_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        shared_data_lib.publish_frame(pd.DataFrame({"a": ["x", "y"]}),
+                                      str(tmp_path / "data"))
+
+
+def test_dispatch_does_not_copy_shared_columns(tmp_path, meter_data,
+                                               calendar_features):
+    cols = analyze_lib.MeterUsageColumns()
+    attached = shared_data_lib.attach_frame(
+        shared_data_lib.publish_frame(meter_data, str(tmp_path / "data")))
+    battery_data, _ = analyze_lib.process_battery_usage_vectorized(
+        attached, calendar_features, cols, analyze_lib.CalendarColumns(),
+        analyze_lib.AnalysisParameters())
+    assert np.shares_memory(battery_data[cols.usage_col].to_numpy(),
+                            attached[cols.usage_col].to_numpy())
+    # 原本的共享表格不會多出欄位
+    assert list(attached.columns) == list(meter_data.columns)
+
+
+def test_calendar_key_shared_by_price_only_changes():
+    params = analyze_lib.AnalysisParameters()
+    assert shared_data_lib.calendar_key(params) == shared_data_lib.calendar_key(
+        analyze_lib.AnalysisParameters(kwh_price=params.kwh_price + 1))
+    assert shared_data_lib.calendar_key(params) != shared_data_lib.calendar_key(
+        analyze_lib.AnalysisParameters(
+            contract_type=analyze_lib.ec_lib.ContractType.
+            HIGH_PRESSURE_THREE_PHASE))
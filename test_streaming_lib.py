@@ -0,0 +1,74 @@
+import pandas as pd
+import pytest
+import analysis_pipeline_lib as pipeline_lib
+import streaming_lib
+import taipower_analyze_lib as analyze_lib
+
+
+def _chunks(raw_data, sizes):
+    start = 0
+    for size in sizes:
+        yield raw_data.iloc[start:start + size]
+        start += size
+    if start < len(raw_data):
+        yield raw_data.iloc[start:]
+
+
+def test_interval_detected_once_from_first_rows(raw_meter_data_factory):
+    cols = analyze_lib.MeterUsageColumns()
+    raw_data = raw_meter_data_factory(days=3, freq="1h")
+    # 第一批只有一筆，仍應判斷為一小時，且不遺漏已讀取的批次
+    interval_hours, raw_chunks = streaming_lib.detect_chunk_interval_hours(
+        _chunks(raw_data, [1, 1, 10]), cols)
+    assert interval_hours == 1.0
+    pd.testing.assert_frame_equal(pd.concat(list(raw_chunks)), raw_data)
+
+
+def test_single_row_chunk_uses_file_interval(raw_meter_data_factory):
+    cols = analyze_lib.MeterUsageColumns()
+    raw_data = raw_meter_data_factory(days=3, freq="1h")
+    months = list(
+        streaming_lib.split_chunks_by_month(_chunks(raw_data, [1, 1, 5]),
+                                            cols))
+    data = pd.concat(months, ignore_index=True)
+    expected = analyze_lib.normalize_meter_data(raw_data.copy(), cols)
+    pd.testing.assert_series_equal(data[cols.usage_col],
+                                   expected[cols.usage_col])
+
+
+def test_split_chunks_by_month_yields_whole_months(raw_meter_data_factory):
+    cols = analyze_lib.MeterUsageColumns()
+    months = list(
+        streaming_lib.split_chunks_by_month(
+            _chunks(raw_meter_data_factory(), [100] * 9), cols))
+    assert [month[cols.time_col].dt.month.unique().tolist()
+            for month in months] == [[6], [7]]
+
+
+def test_unsorted_chunks_are_rejected(raw_meter_data_factory):
+    cols = analyze_lib.MeterUsageColumns()
+    raw_data = raw_meter_data_factory(days=2)
+    with pytest.raises(ValueError):
+        list(
+            streaming_lib.split_chunks_by_month(
+                [raw_data.iloc[100:], raw_data.iloc[:100]], cols))
+
+
+@pytest.mark.parametrize("use_schedule", [False, True])
+def test_streaming_matches_full_run(meter_files, two_edition_schedule,
+                                    use_schedule):
+    meter_data_path, meter_csv_path, meter_contract_path = meter_files
+    tariff_schedule = two_edition_schedule if use_schedule else None
+    expected = pipeline_lib.run_analysis(meter_data_path,
+                                         meter_contract_path,
+                                         tariff_schedule=tariff_schedule)
+    result, daily_max = streaming_lib.run_streaming_analysis(
+        meter_csv_path,
+        meter_contract_path,
+        chunk_rows=97,
+        tariff_schedule=tariff_schedule)
+    pd.testing.assert_frame_equal(result.monthly_data, expected.monthly_data)
+    pd.testing.assert_frame_equal(result.yearly_profit,
+                                  expected.yearly_profit)
+    assert result.new_contract_volume == expected.new_contract_volume
+    assert len(daily_max) > 0
@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+import pytest
+import electricity_lib as ec_lib
+import taipower_analyze_lib as analyze_lib
+import tariff_lib
+
+CONTRACT_TYPE = ec_lib.ContractType.HIGH_PRESSURE_THREE_PHASE
+CONTRACT_VOLUME = {
+    ec_lib.UsageType.PEAK: 500.0,
+    ec_lib.UsageType.SEMI_PEAK: 100.0,
+    ec_lib.UsageType.SATURDAY_SEMI_PEAK: 0.0,
+    ec_lib.UsageType.OFF_PEAK: 50.0,
+}
+
+
+def test_summer_month_ratio_half_months():
+    # 5/16 ~ 10/15 為夏月，五月與十月以各半計算
+    np.testing.assert_array_equal(analyze_lib.cal_summer_month_ratio(),
+                                  [0, 0, 0, 0, 0.5, 1, 1, 1, 1, 0.5, 0, 0])
+
+
+def test_summer_month_ratio_prorate_days():
+    ratio = analyze_lib.cal_summer_month_ratio(prorate_days=True)
+    assert ratio[4] == pytest.approx(16 / 31)
+    assert ratio[9] == pytest.approx(15 / 31)
+
+
+def test_basic_price_half_month_rule():
+    price_dict = ec_lib.get_contract_price_dict(CONTRACT_TYPE)
+    monthly = analyze_lib.cal_monthly_basic_price(CONTRACT_VOLUME, price_dict)
+    summer = analyze_lib.cal_basic_price(CONTRACT_VOLUME,
+                                         price_dict[ec_lib.SeasonType.SUMMER])
+    non_summer = analyze_lib.cal_basic_price(
+        CONTRACT_VOLUME, price_dict[ec_lib.SeasonType.NONSUMMER])
+    assert monthly[analyze_lib.MONTH_LIST[0]] == non_summer
+    assert monthly[analyze_lib.MONTH_LIST[6]] == summer
+    assert monthly[analyze_lib.MONTH_LIST[4]] == (summer + non_summer) / 2
+
+
+def test_single_edition_matches_builtin_pricing(meter_data):
+    schedule = tariff_lib.TariffSchedule(
+        [tariff_lib.build_default_tariff_table()])
+    cols = analyze_lib.MeterUsageColumns()
+    assert schedule.cal_monthly_basic_price(
+        CONTRACT_VOLUME, CONTRACT_TYPE,
+        meter_data[cols.time_col]) == pytest.approx(
+            analyze_lib.cal_monthly_basic_price(
+                CONTRACT_VOLUME, ec_lib.get_contract_price_dict(CONTRACT_TYPE)))
+
+
+def test_single_edition_matches_builtin_calendar(meter_data,
+                                                 calendar_features):
+    schedule = tariff_lib.TariffSchedule(
+        [tariff_lib.build_default_tariff_table()])
+    features = schedule.cal_calendar_features(
+        meter_data, analyze_lib.MeterUsageColumns(),
+        analyze_lib.CalendarColumns(), analyze_lib.AnalysisParameters())
+    for col in calendar_features.columns:
+        np.testing.assert_array_equal(features[col], calendar_features[col])
+
+
+def test_edition_index_by_effective_date(two_edition_schedule):
+    np.testing.assert_array_equal(
+        two_edition_schedule.edition_index(
+            pd.to_datetime(
+                ["1999-01-01 00:00", "2024-06-30 23:45", "2024-07-01 00:00"])),
+        [0, 0, 1])
+
+
+def test_multi_edition_basic_price(two_edition_schedule):
+    date_times = pd.date_range("2024-06-16", "2024-07-15 23:45", freq="15min")
+    monthly = two_edition_schedule.cal_monthly_basic_price(
+        CONTRACT_VOLUME, CONTRACT_TYPE, date_times)
+    first, second = two_edition_schedule.tariff_tables
+    first_price = analyze_lib.cal_monthly_basic_price(
+        CONTRACT_VOLUME, first.get_contract_price_dict(CONTRACT_TYPE),
+        first.summer_start, first.summer_end, True)
+    second_price = analyze_lib.cal_monthly_basic_price(
+        CONTRACT_VOLUME, second.get_contract_price_dict(CONTRACT_TYPE),
+        second.summer_start, second.summer_end, True)
+    june, july = analyze_lib.MONTH_LIST[5], analyze_lib.MONTH_LIST[6]
+    assert monthly[june] == pytest.approx(first_price[june])
+    assert monthly[july] == pytest.approx(second_price[july])
+    # 沒有數據的月份使用最新版本，跨夏月的月份依天數比例計算
+    may = analyze_lib.MONTH_LIST[4]
+    assert monthly[may] == pytest.approx(second_price[may])
+
+
+def test_edition_count_matches_date_times(two_edition_schedule):
+    date_times = pd.date_range("2024-06-20", "2024-07-10", freq="15min")
+    middle = len(date_times) // 3
+    edition_count = (
+        two_edition_schedule.cal_month_edition_count(date_times[:middle]) +
+        two_edition_schedule.cal_month_edition_count(date_times[middle:]))
+    expected = two_edition_schedule.cal_monthly_basic_price(
+        CONTRACT_VOLUME, CONTRACT_TYPE, date_times)
+    assert two_edition_schedule.cal_monthly_basic_price(
+        CONTRACT_VOLUME, CONTRACT_TYPE,
+        edition_count=edition_count) == expected
+
+
+def test_price_scale_is_linear(two_edition_schedule):
+    date_times = pd.date_range("2024-06-20", "2024-07-10", freq="15min")
+    total = sum(
+        two_edition_schedule.cal_monthly_basic_price(
+            CONTRACT_VOLUME, CONTRACT_TYPE, date_times).values())
+    price_matrix = two_edition_schedule.price_matrix("contract_price",
+                                                     CONTRACT_TYPE)
+    parts = 0.0
+    for season_code, usage_code in zip(
+            *np.nonzero(np.isfinite(price_matrix).any(axis=0))):
+        price_scale = np.zeros(price_matrix.shape[1:])
+        price_scale[season_code, usage_code] = 1.0
+        parts += sum(
+            two_edition_schedule.cal_monthly_basic_price(
+                CONTRACT_VOLUME,
+                CONTRACT_TYPE,
+                date_times,
+                price_scale=price_scale).values())
+    assert parts == pytest.approx(total)
+
+
+def test_tariff_table_round_trip(tmp_path):
+    table = tariff_lib.build_default_tariff_table("v1", "2024-01-01")
+    file_path = str(tmp_path / "tariff.json")
+    tariff_lib.save_tariff_table(table, file_path)
+    loaded = tariff_lib.load_tariff_table(file_path)
+    assert loaded.to_dict() == table.to_dict()
+    assert loaded.get_contract_price_dict(
+        CONTRACT_TYPE) == ec_lib.get_contract_price_dict(CONTRACT_TYPE)